@@ -0,0 +1,202 @@
+from contextlib import contextmanager
+from process_info import process_start, process_alive
+import json
+import os
+import threading
+import time
+import uuid
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ============================================================
+# KABUL KONTROLÜ (ADMISSION CONTROL)
+# ============================================================
+# Aynı anda gelen fotoğraflı raporlar worker'ların toplam belleğini aşıp platformun
+# OOM ile öldürmesine yol açmasın diye her render'ın tepe bellek maliyeti upload
+# boyutları ve görsel header'larından tahmin edilir (bkz. estimate_report_memory).
+# Render'lar tahmini toplam ADMISSION_MEMORY_BUDGET_MB altında kaldıkça çalışır;
+# kalanlar sıralı (FIFO) bir kuyrukta bekler. Kuyruk doluysa veya bekleme süresi
+# dolarsa AdmissionRejected yükseltilir ve istek hemen 503 + Retry-After alır.
+# Rezervasyonlar tüm gunicorn worker'ları ve toplu render süreçleri için ortak bir
+# JSON defterinde (dosya kilidiyle) tutulur; sonlanan süreçlerin kayıtları düşülür.
+
+# Eşzamanlı render'ların tahmini toplam bellek bütçesi
+ADMISSION_MEMORY_BUDGET = int(os.environ.get("ADMISSION_MEMORY_BUDGET_MB", 256)) * 1024 * 1024
+# Bütçe boşalmasını bekleyebilecek en fazla etkileşimli istek sayısı
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 8))
+# Etkileşimli isteklerin kuyrukta en fazla bekleme süresi (saniye)
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT_SECONDS", 10))
+# Kuyruktan çıkan arka plan render'ına ayrılan süre (saniye)
+ADMISSION_RENDER_ALLOWANCE = float(os.environ.get("ADMISSION_RENDER_ALLOWANCE_SECONDS", 120))
+# Asenkron işler ve toplu render daha uzun bekler ve kuyruk sınırına takılmaz. Varsayılan,
+# iş zaman aşımından (jobs.REPORT_JOB_TIMEOUT; jobs bu modülü dolaylı import ettiği için
+# ortamdan okunur) render payı düşülerek bulunur (kısa zaman aşımında en az yarısı):
+# bekleyen iş, kaydı zaman aşımına düşmeden AdmissionRejected ile anlaşılır bir hatayla biter
+_JOB_TIMEOUT = int(os.environ.get("REPORT_JOB_TIMEOUT", 600))
+ADMISSION_BACKGROUND_WAIT = float(os.environ.get(
+    "ADMISSION_BACKGROUND_WAIT_SECONDS",
+    max(_JOB_TIMEOUT / 2, _JOB_TIMEOUT - ADMISSION_RENDER_ALLOWANCE)))
+# 503 yanıtındaki Retry-After (saniye)
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER_SECONDS", 5))
+# Bu süreden eski kayıtlar (ör. yeniden başlatmadan kalan, PID'i tekrar kullanılmış) silinir
+ADMISSION_STALE_SECONDS = 3600
+POLL_INTERVAL = 0.05
+
+ADMISSION_LEDGER = os.environ.get(
+    "ADMISSION_LEDGER",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "generated_pdfs", ".admission.json"))
+
+class AdmissionRejected(Exception):
+    """Bellek bütçesi dolu: kuyruk dolu veya bekleme süresi doldu"""
+
+    def __init__(self, message, retry_after=ADMISSION_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+_local_lock = threading.Lock()
+# fcntl olmayan platformlarda (Windows) defter yalnızca süreç içinde tutulur
+_memory_ledger = {}
+
+_PROCESS = {"pid": None, "start": None}
+
+def _owner():
+    """Kayıt sahibi: PID ve başlama zamanı (fork sonrası yeniden okunur)"""
+    if _PROCESS["pid"] != os.getpid():
+        _PROCESS["pid"] = os.getpid()
+        _PROCESS["start"] = process_start(os.getpid())
+    return dict(_PROCESS)
+
+def _owner_alive(entry):
+    return process_alive(entry["pid"], entry.get("start"))
+
+def _prune(ledger):
+    """Sonlanan süreçlerin ve bayatlamış kayıtların rezervasyonlarını düş"""
+    now = time.time()
+    for section in ("running", "waiting"):
+        entries = ledger[section]
+        for token, entry in list(entries.items()):
+            if now - entry["at"] > ADMISSION_STALE_SECONDS or (
+                    fcntl is not None and not _owner_alive(entry)):
+                del entries[token]
+
+@contextmanager
+def _ledger():
+    """Defteri kilitleyip oku; blok bitince (hata olsa da) değişiklikleri yaz"""
+    with _local_lock:
+        if fcntl is None:
+            _memory_ledger.setdefault("running", {})
+            _memory_ledger.setdefault("waiting", {})
+            _prune(_memory_ledger)
+            yield _memory_ledger
+            return
+        os.makedirs(os.path.dirname(ADMISSION_LEDGER), exist_ok=True)
+        with open(f"{ADMISSION_LEDGER}.lock", "a") as lock_file:
+            # Kilit dosya kapanınca bırakılır
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(ADMISSION_LEDGER, encoding="utf-8") as f:
+                    ledger = json.load(f)
+            except (OSError, ValueError):
+                ledger = {}
+            ledger.setdefault("running", {})
+            ledger.setdefault("waiting", {})
+            _prune(ledger)
+            try:
+                yield ledger
+            finally:
+                temp_path = f"{ADMISSION_LEDGER}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(ledger, f)
+                os.replace(temp_path, ADMISSION_LEDGER)
+
+def acquire(cost, timeout=None, background=False):
+    """
+    Tahmini bellek maliyeti bütçeye sığınca rezervasyon yap ve jetonu döndür.
+    Bütçe doluysa sıra gelene kadar bekler. Hiç render çalışmıyorsa bütçeden büyük
+    iş de kabul edilir (aksi halde hiç çalışamazdı).
+
+    Args:
+        cost: int - Tahmini tepe bellek (bayt)
+        timeout: float - En fazla bekleme (varsayılan ADMISSION_MAX_WAIT veya
+                 arka plan için ADMISSION_BACKGROUND_WAIT)
+        background: bool - Asenkron iş / toplu render (kuyruk sınırına takılmaz)
+
+    Returns:
+        str - release() ile bırakılacak jeton
+
+    Raises:
+        AdmissionRejected: Kuyruk dolu veya bekleme süresi doldu
+    """
+    if timeout is None:
+        timeout = ADMISSION_BACKGROUND_WAIT if background else ADMISSION_MAX_WAIT
+    token = uuid.uuid4().hex
+    start = time.monotonic()
+    queued_at = None
+    try:
+        while True:
+            with _ledger() as ledger:
+                running = ledger["running"]
+                waiting = ledger["waiting"]
+                # Sıra: kendinden önce kuyruğa girmiş bekleyen varsa önce onlar çalışır
+                ahead = [entry for key, entry in waiting.items()
+                         if key != token and (queued_at is None or entry["at"] < queued_at)]
+                in_use = sum(entry["bytes"] for entry in running.values())
+                if not ahead and (not running or in_use + cost <= ADMISSION_MEMORY_BUDGET):
+                    waiting.pop(token, None)
+                    running[token] = dict(_owner(), bytes=cost, at=time.time())
+                    break
+                if queued_at is None:
+                    if not background and len(waiting) >= ADMISSION_MAX_QUEUE:
+                        raise AdmissionRejected("Sunucu şu anda yoğun, lütfen biraz sonra tekrar deneyin")
+                    queued_at = time.time()
+                    waiting[token] = dict(_owner(), bytes=cost, at=queued_at)
+                elif time.monotonic() - start >= timeout:
+                    raise AdmissionRejected("Sunucu şu anda yoğun, bekleme süresi doldu; lütfen tekrar deneyin")
+            time.sleep(POLL_INTERVAL)
+    except BaseException as e:
+        # Reddedilen veya kesilen bekleyici kuyruğun başını tıkamasın
+        if queued_at is not None:
+            with _ledger() as ledger:
+                ledger["waiting"].pop(token, None)
+        if isinstance(e, AdmissionRejected):
+            metrics.count("admission_rejected")
+        raise
+    if queued_at is not None:
+        metrics.observe("queue", time.monotonic() - start)
+    return token
+
+def release(token):
+    """Rezervasyonu bırak"""
+    with _ledger() as ledger:
+        ledger["running"].pop(token, None)
+
+@contextmanager
+def admitted(cost, timeout=None, background=False):
+    """acquire/release bağlam yöneticisi (bkz. acquire)"""
+    token = acquire(cost, timeout=timeout, background=background)
+    try:
+        yield
+    finally:
+        release(token)
+
+def check_capacity():
+    """Kuyruk doluysa yeni arka plan işini (asenkron/toplu) kuyruklamadan hemen reddet"""
+    with _ledger() as ledger:
+        waiting = len(ledger["waiting"])
+    if waiting >= ADMISSION_MAX_QUEUE:
+        metrics.count("admission_rejected")
+        raise AdmissionRejected("Sunucu şu anda yoğun, lütfen biraz sonra tekrar deneyin")
+
+def admission_stats():
+    """Çalışan ve bekleyen render'lar ile kullanılan tahmini bellek"""
+    with _ledger() as ledger:
+        return {
+            "running": len(ledger["running"]),
+            "waiting": len(ledger["waiting"]),
+            "reserved_bytes": sum(entry["bytes"] for entry in ledger["running"].values()),
+            "budget_bytes": ADMISSION_MEMORY_BUDGET,
+        }
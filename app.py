@@ -1,12 +1,42 @@
-from flask import Flask, render_template, request, send_file, jsonify
-from pdf_generator import generate_report
+from flask import Flask, Response, render_template, request, send_file, jsonify, redirect, url_for
+from pdf_generator import generate_report, OUTPUT_DIR, MAX_PHOTOS
+from jobs import submit_report_job, get_job, JOB_DONE, JOB_ERROR, REPORT_JOB_TIMEOUT
+from batch import stream_zip, render_merged_pdf, BATCH_MAX_REPORTS
+from admission import AdmissionRejected, check_capacity
+import retention
+import metrics
+from werkzeug.exceptions import HTTPException
+from werkzeug.security import safe_join
+from datetime import datetime, timedelta
+import json
 import os
+import shutil
+import tempfile
+import traceback
+import warmup
 
 app = Flask(__name__)
 
+# Fontlar, logolar, Pillow eklentileri ve şablonlar import sırasında değil port
+# açılmadan önce yüklenir: gunicorn.conf.py on_starting kancası (--preload ile
+# fork'tan önce) veya doğrudan çalıştırmada __main__ (bkz. warmup.warm_up)
+
+@app.before_request
+def ensure_background_tasks():
+    # Süpürücü thread'i fork'tan sonra, her worker'da ilk istekte başlatılır
+    retention.start_sweeper(OUTPUT_DIR)
+
+@app.after_request
+def add_server_timing(response):
+    # Zamanlaması açılan isteklerde (rapor üretimi) aşama sürelerini header'a yaz
+    server_timing = metrics.end_request()
+    if server_timing:
+        response.headers["Server-Timing"] = server_timing
+    return response
+
 @app.route("/", methods=["GET"])
 def index():
-    return render_template("index.html")
+    return render_template("index.html", max_photos=MAX_PHOTOS)
 
 @app.route("/view-pdf/<filename>", methods=["GET"])
 def view_pdf(filename):
@@ -14,15 +44,44 @@ def view_pdf(filename):
     tarih = request.args.get("tarih", "")
     return render_template("view_pdf.html", filename=filename, tarih=tarih)
 
+# Oluşturulan PDF'ler değişmez (içerik adresli dosya adları), tarayıcı uzun süre önbelleğe alabilir
+PDF_MAX_AGE = 365 * 24 * 3600
+
+def send_pdf(filename, as_attachment, download_name=None):
+    """
+    OUTPUT_DIR'deki PDF'i koşullu GET (ETag / Last-Modified -> 304) ve
+    byte-range (206) desteğiyle gönder.
+    """
+    # Dizin dışına çıkan dosya adlarını reddet
+    filepath = safe_join(OUTPUT_DIR, filename)
+    if filepath is None or not os.path.isfile(filepath):
+        return jsonify({"error": "PDF bulunamadı"}), 404
+    
+    # ETag ve Last-Modified dosyanın mtime'ından türetilir; önbellek isabetleri
+    # mtime'ı değil atime'ı güncellediği için doğrulayıcılar sabit kalır
+    response = send_file(
+        filepath,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        mimetype="application/pdf",
+        conditional=True,
+        etag=True,
+        max_age=PDF_MAX_AGE,
+    )
+    response.cache_control.immutable = True
+    return response
+
+def busy_response(error):
+    """Bellek bütçesi doluyken hızlı 503; istemci Retry-After kadar sonra tekrar dener"""
+    response = jsonify({"error": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
 @app.route("/download-pdf/<filename>", methods=["GET"])
 def download_pdf(filename):
     """PDF indirme endpoint'i"""
     try:
-        from pdf_generator import OUTPUT_DIR
-        filepath = os.path.join(OUTPUT_DIR, filename)
-        if not os.path.exists(filepath):
-            return jsonify({"error": "PDF bulunamadı"}), 404
-        
         # İndirme dosya adını oluştur: Günlük_Rapor_{Tarih}.pdf
         tarih = request.args.get("tarih", "")
         if tarih:
@@ -33,12 +92,10 @@ def download_pdf(filename):
             # Tarih yoksa orijinal dosya adını kullan
             download_filename = filename
         
-        return send_file(
-            filepath,
-            as_attachment=True,  # İndirme
-            download_name=download_filename,
-            mimetype="application/pdf"
-        )
+        return send_pdf(filename, as_attachment=True, download_name=download_filename)  # İndirme
+    except HTTPException:
+        # 416 Range Not Satisfiable vb. olduğu gibi dönsün
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -46,125 +103,337 @@ def download_pdf(filename):
 def serve_pdf(filename):
     """PDF dosyasını tarayıcıda göster"""
     try:
-        from pdf_generator import OUTPUT_DIR
-        filepath = os.path.join(OUTPUT_DIR, filename)
-        if not os.path.exists(filepath):
-            return jsonify({"error": "PDF bulunamadı"}), 404
-        return send_file(
-            filepath,
-            as_attachment=False,  # Tarayıcıda görüntüle
-            mimetype="application/pdf"
-        )
+        return send_pdf(filename, as_attachment=False)  # Tarayıcıda görüntüle
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/generator-test", methods=["POST"])
-def generator_test():
+def parse_report_form(form):
+    """
+    Form alanlarını doğrula ve rapor verisini oluştur.
+    
+    Args:
+        form: request.form veya aynı alanlara sahip dict (toplu istekteki rapor)
+    
+    Returns:
+        (data, None) veya doğrulama hatasında (None, hata mesajı)
+    """
+    # Form alanlarından direkt al
+    proje = form.get("proje", "Fetihtepe")  # Varsayılan: Fetihtepe
+    tarih = form.get("tarih", "")
+    tarih_tipi = form.get("tarih_tipi", "gunluk")
+    rapor_no = form.get("rapor_no", "")
+    yapilan_isler_text = form.get("yapilan_isler", "")
+
+    # Validasyon
+    if not tarih:
+        return None, "Tarih boş olamaz"
+    if not rapor_no:
+        return None, "Rapor No boş olamaz"
+    if not yapilan_isler_text.strip():
+        return None, "Yapılan İşler boş olamaz"
+
+    # Tarihi işle
     try:
-        # Form alanlarından direkt al
-        proje = request.form.get("proje", "Fetihtepe")  # Varsayılan: Fetihtepe
-        tarih = request.form.get("tarih", "")
-        tarih_tipi = request.form.get("tarih_tipi", "gunluk")
-        rapor_no = request.form.get("rapor_no", "")
-        yapilan_isler_text = request.form.get("yapilan_isler", "")
-        photos = request.files.getlist("photos")
-
-        # Validasyon
-        if not tarih:
-            return jsonify({"error": "Tarih boş olamaz"}), 400
-        if not rapor_no:
-            return jsonify({"error": "Rapor No boş olamaz"}), 400
-        if not yapilan_isler_text.strip():
-            return jsonify({"error": "Yapılan İşler boş olamaz"}), 400
-
-        # Tarihi işle
-        from datetime import datetime, timedelta
-        try:
-            tarih_obj = datetime.strptime(tarih, "%Y-%m-%d")
+        tarih_obj = datetime.strptime(tarih, "%Y-%m-%d")
+        
+        if tarih_tipi == "3gunluk":
+            # 3 günlük format (Hafta sonunu atla): 12/13/14.01.2026
+            def get_next_workday(d):
+                next_d = d + timedelta(days=1)
+                while next_d.weekday() >= 5: # 5=Cumartesi, 6=Pazar
+                    next_d += timedelta(days=1)
+                return next_d
             
-            if tarih_tipi == "3gunluk":
-                # 3 günlük format (Hafta sonunu atla): 12/13/14.01.2026
-                def get_next_workday(d):
-                    next_d = d + timedelta(days=1)
-                    while next_d.weekday() >= 5: # 5=Cumartesi, 6=Pazar
-                        next_d += timedelta(days=1)
-                    return next_d
-                
-                t2 = get_next_workday(tarih_obj)
-                t3 = get_next_workday(t2)
-                tarih_formatted = f"{tarih_obj.strftime('%d')}/{t2.strftime('%d')}/{t3.strftime('%d.%m.%Y')}"
-            elif tarih_tipi == "3gunluk_ozel":
-                # Özel 3 günlük format: Kullanıcının seçtiği 3 tarih
-                tarih2 = request.form.get("tarih2", "")
-                tarih3 = request.form.get("tarih3", "")
-                if not tarih2 or not tarih3:
-                    return jsonify({"error": "Özel 3 günlük rapor için tüm tarihler seçilmelidir"}), 400
-                
-                t2_obj = datetime.strptime(tarih2, "%Y-%m-%d")
-                t3_obj = datetime.strptime(tarih3, "%Y-%m-%d")
-                tarih_formatted = f"{tarih_obj.strftime('%d')}/{t2_obj.strftime('%d')}/{t3_obj.strftime('%d.%m.%Y')}"
-            elif tarih_tipi == "aralik":
-                # Aralık format: 16.02.2026 - 09.03.2026
-                tarih_bitis = request.form.get("tarih_bitis", "")
-                if not tarih_bitis:
-                    return jsonify({"error": "Aralık raporu için bitiş tarihi seçilmelidir"}), 400
-                
-                tarih_bitis_obj = datetime.strptime(tarih_bitis, "%Y-%m-%d")
-                tarih_formatted = f"{tarih_obj.strftime('%d.%m.%Y')} - {tarih_bitis_obj.strftime('%d.%m.%Y')}"
+            t2 = get_next_workday(tarih_obj)
+            t3 = get_next_workday(t2)
+            tarih_formatted = f"{tarih_obj.strftime('%d')}/{t2.strftime('%d')}/{t3.strftime('%d.%m.%Y')}"
+        elif tarih_tipi == "3gunluk_ozel":
+            # Özel 3 günlük format: Kullanıcının seçtiği 3 tarih
+            tarih2 = form.get("tarih2", "")
+            tarih3 = form.get("tarih3", "")
+            if not tarih2 or not tarih3:
+                return None, "Özel 3 günlük rapor için tüm tarihler seçilmelidir"
+            
+            t2_obj = datetime.strptime(tarih2, "%Y-%m-%d")
+            t3_obj = datetime.strptime(tarih3, "%Y-%m-%d")
+            tarih_formatted = f"{tarih_obj.strftime('%d')}/{t2_obj.strftime('%d')}/{t3_obj.strftime('%d.%m.%Y')}"
+        elif tarih_tipi == "aralik":
+            # Aralık format: 16.02.2026 - 09.03.2026
+            tarih_bitis = form.get("tarih_bitis", "")
+            if not tarih_bitis:
+                return None, "Aralık raporu için bitiş tarihi seçilmelidir"
+            
+            tarih_bitis_obj = datetime.strptime(tarih_bitis, "%Y-%m-%d")
+            tarih_formatted = f"{tarih_obj.strftime('%d.%m.%Y')} - {tarih_bitis_obj.strftime('%d.%m.%Y')}"
+        else:
+            # Günlük format: 12.01.2026
+            tarih_formatted = tarih_obj.strftime("%d.%m.%Y")
+    except Exception as e:
+        print(f"Tarih işleme hatası: {e}")
+        tarih_formatted = tarih
+
+    # Yapılan işleri satırlara böl
+    yapilan_isler = []
+    for line in yapilan_isler_text.strip().split("\n"):
+        line = line.strip()
+        if line:
+            # Başında • varsa kaldır, yoksa ekle
+            if line.startswith("•"):
+                yapilan_isler.append(line[1:].strip())
             else:
-                # Günlük format: 12.01.2026
-                tarih_formatted = tarih_obj.strftime("%d.%m.%Y")
-        except Exception as e:
-            print(f"Tarih işleme hatası: {e}")
-            tarih_formatted = tarih
-
-        # Yapılan işleri satırlara böl
-        yapilan_isler = []
-        for line in yapilan_isler_text.strip().split("\n"):
-            line = line.strip()
-            if line:
-                # Başında • varsa kaldır, yoksa ekle
-                if line.startswith("•"):
-                    yapilan_isler.append(line[1:].strip())
-                else:
-                    yapilan_isler.append(line)
-
-        # Proje seçimine göre başlığı belirle
-        if proje == "Arap Camii":
-            proje_basligi = "Arap Camii Kuran Kursu Güçlendirme Projesi"
-        elif proje == "Abdusselam":
-            proje_basligi = "Abdüsselam Kuran Kursu Güçlendirme Projesi"
-        else:  # Fetihtepe (varsayılan)
-            proje_basligi = "FETİHTEPE MERKEZ CAMİ'İ GÜÇLENDİRME VE YENİLEME PROJESİ"
-
-        # Data dict oluştur
-        data = {
-            "tarih": tarih_formatted,
-            "rapor_no": rapor_no,
-            "yapilan_isler": yapilan_isler,
-            "proje_basligi": proje_basligi
-        }
-
-        filepath = generate_report(data, photos)
+                yapilan_isler.append(line)
+
+    # Proje seçimine göre başlığı belirle
+    if proje == "Arap Camii":
+        proje_basligi = "Arap Camii Kuran Kursu Güçlendirme Projesi"
+    elif proje == "Abdusselam":
+        proje_basligi = "Abdüsselam Kuran Kursu Güçlendirme Projesi"
+    else:  # Fetihtepe (varsayılan)
+        proje_basligi = "FETİHTEPE MERKEZ CAMİ'İ GÜÇLENDİRME VE YENİLEME PROJESİ"
+
+    # Data dict oluştur
+    data = {
+        "tarih": tarih_formatted,
+        "rapor_no": rapor_no,
+        "yapilan_isler": yapilan_isler,
+        "proje_basligi": proje_basligi,
+        "proje": proje
+    }
+    return data, None
+
+def parse_size_budget(value):
+    """
+    max_boyut_kb alanını bayta çevir.
+    
+    Returns:
+        (bayt veya boşsa None, None) veya doğrulama hatasında (None, hata mesajı)
+    """
+    if value is None or not str(value).strip():
+        return None, None
+    try:
+        max_kb = int(value)
+    except ValueError:
+        max_kb = 0
+    if max_kb <= 0:
+        return None, "max_boyut_kb pozitif bir tam sayı (KB) olmalı"
+    return max_kb * 1024, None
+
+def build_report_data():
+    """
+    Formu doğrula ve rapor verisini oluştur.
+    
+    Returns:
+        (data, None) veya doğrulama hatasında (None, hata yanıtı)
+    """
+    data, error = parse_report_form(request.form)
+    if error:
+        return None, (jsonify({"error": error}), 400)
+    return data, None
+
+@app.route("/generator-test", methods=["POST"])
+def generator_test():
+    metrics.begin_request()
+    stages = metrics.StageTimer()
+    try:
+        # Multipart gövde ilk form erişiminde okunur: upload alımı + doğrulama
+        data, error_response = build_report_data()
+        if error_response:
+            return error_response
+        photos = [photo for photo in request.files.getlist("photos") if photo and photo.filename]
+        if len(photos) > MAX_PHOTOS:
+            return jsonify({"error": f"En fazla {MAX_PHOTOS} fotoğraf yüklenebilir"}), 400
+        max_bytes, error = parse_size_budget(request.values.get("max_boyut_kb"))
+        if error:
+            return jsonify({"error": error}), 400
+        tarih_formatted = data["tarih"]
+        stages.lap("upload")
+        stages.close()
+
+        # Asenkron mod: render'ı kuyruğa ekle ve hemen iş kimliği döndür
+        if request.values.get("async") == "1":
+            check_capacity()
+            job_id = submit_report_job(data, photos, max_bytes=max_bytes)
+            return jsonify({
+                "job_id": job_id,
+                "status_url": url_for("job_status", job_id=job_id),
+                "result_url": url_for("job_result", job_id=job_id),
+                "view_url": url_for("view_job", job_id=job_id),
+            }), 202
+
+        filepath = generate_report(data, photos, max_bytes=max_bytes)
         
         # PDF dosya adını al (URL için)
         filename = os.path.basename(filepath)
         
         # PDF görüntüleme sayfasına yönlendir (tarih bilgisini de gönder)
-        from flask import redirect, url_for
-        return redirect(url_for('view_pdf', filename=filename, tarih=tarih_formatted))
+        response = redirect(url_for('view_pdf', filename=filename, tarih=tarih_formatted))
+        # Elde edilen boyut (boyut bütçesi istendiyse bütçeyle karşılaştırılabilir)
+        response.headers["X-PDF-Size"] = str(os.path.getsize(filepath))
+        return response
+    except AdmissionRejected as e:
+        return busy_response(e)
     except FileNotFoundError as e:
         return jsonify({"error": str(e)}), 404
     except Exception as e:
-        import traceback
         error_msg = str(e)
         traceback_str = traceback.format_exc()
         print(f"Error: {error_msg}\n{traceback_str}")
         return jsonify({"error": f"PDF oluşturulurken hata oluştu: {error_msg}"}), 500
 
+@app.route("/batch-reports", methods=["POST"])
+def batch_reports():
+    """
+    Toplu rapor üretimi: birçok rapor tek istekte paralel render edilir.
+    
+    Multipart form alanları:
+        reports: JSON listesi - her eleman /generator-test form alanlarını içerir;
+                 "photos" anahtarı bu istekte yüklenen dosyaların adlarına referans verir
+                 (aynı fotoğraf birden fazla raporda kullanılabilir, bir kez yüklenir)
+        photos: Fotoğraf dosyaları
+        format: "zip" (varsayılan, rapor başına bir PDF) veya "pdf" (birleştirilmiş tek PDF)
+    """
+    try:
+        payload = request.get_json(silent=True) if request.is_json else None
+        if payload is None:
+            payload = request.form
+            try:
+                reports = json.loads(payload.get("reports", ""))
+            except ValueError:
+                return jsonify({"error": "reports geçerli bir JSON listesi olmalı"}), 400
+        else:
+            reports = payload.get("reports")
+        
+        output_format = payload.get("format", "zip")
+        if output_format not in ("zip", "pdf"):
+            return jsonify({"error": "format 'zip' veya 'pdf' olmalı"}), 400
+        if not isinstance(reports, list) or not reports:
+            return jsonify({"error": "reports boş olmayan bir liste olmalı"}), 400
+        if len(reports) > BATCH_MAX_REPORTS:
+            return jsonify({"error": f"Tek istekte en fazla {BATCH_MAX_REPORTS} rapor üretilebilir"}), 400
+        check_capacity()
+        
+        # Yüklenen fotoğraflar dosya adıyla referans verilir. Bellekte tutulmak yerine
+        # geçici dizine yazılır; render süreçlerine yalnızca yolları gönderilir.
+        upload_dir = tempfile.mkdtemp(prefix="toplu-rapor-")
+        try:
+            uploads = {}
+            for photo in request.files.getlist("photos"):
+                if photo and photo.filename and photo.filename not in uploads:
+                    path = os.path.join(upload_dir, f"{len(uploads)}.foto")
+                    photo.save(path)
+                    photo.close()
+                    uploads[photo.filename] = path
+            
+            batch = []
+            for index, item in enumerate(reports, 1):
+                if not isinstance(item, dict):
+                    return jsonify({"error": f"Rapor {index}: geçersiz rapor tanımı"}), 400
+                # JSON'daki sayı ve liste değerlerini form alanı biçimine getir
+                form = {
+                    key: "\n".join(map(str, value)) if isinstance(value, list) else str(value)
+                    for key, value in item.items() if key != "photos"
+                }
+                data, error = parse_report_form(form)
+                if error:
+                    return jsonify({"error": f"Rapor {index}: {error}"}), 400
+                
+                photo_refs = item.get("photos") or []
+                if not isinstance(photo_refs, list) or not all(isinstance(ref, str) for ref in photo_refs):
+                    return jsonify({"error": f"Rapor {index}: photos dosya adlarından oluşan bir liste olmalı"}), 400
+                if len(photo_refs) > MAX_PHOTOS:
+                    return jsonify({"error": f"Rapor {index}: en fazla {MAX_PHOTOS} fotoğraf yüklenebilir"}), 400
+                missing = [ref for ref in photo_refs if ref not in uploads]
+                if missing:
+                    return jsonify({"error": f"Rapor {index}: yüklenmeyen fotoğraf: {', '.join(map(str, missing))}"}), 400
+                batch.append((data, [uploads[ref] for ref in photo_refs]))
+            
+            if output_format == "pdf":
+                filename = render_merged_pdf(batch)
+                return send_pdf(filename, as_attachment=True, download_name="Günlük_Raporlar.pdf")
+            
+            # ZIP her PDF tamamlandıkça istemciye akıtılır; geçici dizin akış bitince silinir
+            response = Response(stream_zip(batch), mimetype="application/zip")
+            response.headers["Content-Disposition"] = 'attachment; filename="Gunluk_Raporlar.zip"'
+            response.call_on_close(lambda path=upload_dir: shutil.rmtree(path, ignore_errors=True))
+            upload_dir = None
+            return response
+        finally:
+            if upload_dir:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+    except AdmissionRejected as e:
+        return busy_response(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error: {e}\n{traceback.format_exc()}")
+        return jsonify({"error": f"Toplu rapor oluşturulurken hata oluştu: {e}"}), 500
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Hazır olma kontrolü: ısınma başarıyla bittiyse 200, sürüyorsa veya bir adımı
+    başarısız olduysa 503 (hatalar yanıtta). Platform trafiği yalnızca 200'den sonra
+    yönlendirir. Isınma hiç başlamadıysa (gunicorn kancası dışında çalışan sunucu)
+    arka planda başlatılır; sorgu onu beklemez.
+    """
+    warmup.warm_up_in_background(app)
+    stats = warmup.startup_stats()
+    return jsonify(stats), 200 if stats["ready"] else 503
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus formatında aşama süresi histogramları ve sayaçlar"""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/view-job/<job_id>", methods=["GET"])
+def view_job(job_id):
+    """Asenkron iş için PDF görüntüleme sayfası (PDF hazır olana kadar bekler)"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "İş bulunamadı"}), 404
+    return render_template("view_pdf.html", filename=job["filename"] or "",
+                           tarih=job["tarih"], job_id=job_id, poll_timeout=REPORT_JOB_TIMEOUT)
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Asenkron rapor işinin durumunu döndür"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "İş bulunamadı"}), 404
+    
+    response = {"job_id": job_id, "status": job["status"], "tarih": job["tarih"]}
+    if job["status"] == JOB_DONE:
+        response["filename"] = job["filename"]
+        response["size"] = job.get("size")
+        response["max_bytes"] = job.get("max_bytes")
+        response["pdf_url"] = url_for("serve_pdf", filename=job["filename"])
+        response["download_url"] = url_for("download_pdf", filename=job["filename"], tarih=job["tarih"])
+    elif job["status"] == JOB_ERROR:
+        response["error"] = f"PDF oluşturulurken hata oluştu: {job['error']}"
+    response = jsonify(response)
+    # Render aşamaları arka planda ölçüldü: iş bitince bu sorgunun Server-Timing'inde görünür
+    if job["status"] == JOB_DONE and job.get("server_timing"):
+        response.headers["Server-Timing"] = job["server_timing"]
+    return response
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    """İş tamamlandıysa PDF görüntüleme sayfasına yönlendir"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "İş bulunamadı"}), 404
+    if job["status"] == JOB_DONE:
+        return redirect(url_for('view_pdf', filename=job["filename"], tarih=job["tarih"]))
+    if job["status"] == JOB_ERROR:
+        return jsonify({"error": f"PDF oluşturulurken hata oluştu: {job['error']}"}), 500
+    return jsonify({"job_id": job_id, "status": job["status"]}), 202
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     # Production için 0.0.0.0, development için 127.0.0.1
     host = "0.0.0.0" if os.environ.get("PORT") else "127.0.0.1"
     debug = os.environ.get("FLASK_ENV") != "production"
+    warmup.warm_up(app)
     app.run(host=host, port=port, debug=debug)
@@ -0,0 +1,227 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from pdf_generator import render_report, linearize_enabled, BASE_DIR, OUTPUT_DIR
+from pdf_layout import setup_fonts
+import io
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+import zipfile
+import pdf_cache
+import retention
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+# ============================================================
+# TOPLU RAPOR ÜRETİMİ
+# ============================================================
+# Bir hafta/ay boyunca raporların yeniden üretilmesi (ör. proje başlığı değişikliği)
+# tek istekte yapılır: raporlar süreç havuzunda paralel render edilir ve
+# tek tek PDF'lerden oluşan bir ZIP ya da birleştirilmiş tek PDF olarak döndürülür.
+# Her rapor render_report ile üretildiği için PDF önbelleğinden de faydalanır.
+
+# Paralel render eden süreç sayısı (varsayılan: en fazla 2). Her süreç tam bir
+# yorumlayıcıdır (ReportLab, Pillow, fontlar); kabul kontrolü bu belleği saymaz
+BATCH_WORKERS = max(1, int(os.environ.get("BATCH_WORKERS", min(2, os.cpu_count() or 1))))
+# Tek istekte kabul edilen en fazla rapor sayısı
+BATCH_MAX_REPORTS = int(os.environ.get("BATCH_MAX_REPORTS", 100))
+# Son toplu işten bu kadar sonra süreç havuzu kapatılır (saniye, 0 = iş biter bitmez)
+BATCH_POOL_IDLE_SECONDS = float(os.environ.get("BATCH_POOL_IDLE_SECONDS", 60))
+# İçerik özetiyle adlandırılan XObject'ler (sayfa iskeleti, logo): aynı ad aynı içerik demektir
+SHARED_XOBJECT_PREFIXES = ("/FormXob.iskelet-", "/FormXob.logo-")
+
+_executor = None
+_executor_lock = threading.Lock()
+_pool_state = {"active": 0, "idle_timer": None}
+
+def _acquire_executor():
+    """Süreç havuzunu (gerekirse oluşturup) bir toplu iş için kullanıma al"""
+    global _executor
+    with _executor_lock:
+        if _pool_state["idle_timer"] is not None:
+            _pool_state["idle_timer"].cancel()
+            _pool_state["idle_timer"] = None
+        if _executor is None:
+            # fork yerine spawn: worker'daki thread havuzları (fotoğraf hazırlama,
+            # saklama süpürücüsü) fork edilen çocukta çalışmaz ve render'ı kilitler
+            _executor = ProcessPoolExecutor(
+                max_workers=BATCH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=setup_fonts,
+                initargs=(BASE_DIR,),
+            )
+        _pool_state["active"] += 1
+        return _executor
+
+def _release_executor():
+    """
+    Toplu iş bitti: havuzu kullanan başka iş yoksa BATCH_POOL_IDLE_SECONDS sonra
+    kapat. Render süreçleri gunicorn worker'ı yaşadıkça bellekte kalmasın.
+    """
+    with _executor_lock:
+        _pool_state["active"] -= 1
+        if _pool_state["active"] > 0 or _executor is None:
+            return
+        if BATCH_POOL_IDLE_SECONDS <= 0:
+            _shutdown_executor_locked()
+            return
+        timer = threading.Timer(BATCH_POOL_IDLE_SECONDS, _shutdown_idle_executor)
+        timer.daemon = True
+        timer.start()
+        _pool_state["idle_timer"] = timer
+
+def _shutdown_executor_locked():
+    global _executor
+    executor, _executor = _executor, None
+    # Yarıda bırakılan (istemci bağlantısı kopan) işin kalan render'ları iptal edilir
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _shutdown_idle_executor():
+    with _executor_lock:
+        _pool_state["idle_timer"] = None
+        if _pool_state["active"] == 0 and _executor is not None:
+            _shutdown_executor_locked()
+
+def _reset_executor():
+    """Bozulan havuzu (ör. OOM ile öldürülen süreç) bırak; sonraki istek yenisini kurar"""
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+def render_batch(reports):
+    """
+    Raporları süreç havuzunda paralel render et.
+
+    Args:
+        reports: List - (data, fotoğraf kaynakları) ikilileri; kaynaklar bayt dizisi veya dosya yolu
+
+    Yields:
+        (sıra, PDF yolu, hata mesajı) - giriş sırasıyla, biri None
+    """
+    executor = _acquire_executor()
+    try:
+        futures = [executor.submit(render_report, data, photo_sources, background=True)
+                   for data, photo_sources in reports]
+        for index, future in enumerate(futures):
+            try:
+                yield index, future.result(), None
+            except BrokenProcessPool as e:
+                _reset_executor()
+                yield index, None, f"Render süreci beklenmedik şekilde sonlandı: {e}"
+            except Exception as e:
+                yield index, None, str(e)
+    finally:
+        _release_executor()
+
+def archive_name(index, data):
+    """ZIP içindeki dosya adı: sıra numarası + tarih (3 günlük formattaki / dahil temizlenir)"""
+    safe_date = re.sub(r"[^\d]+", "_", data.get("tarih", "")).strip("_")
+    return f"{index + 1:03d}_Günlük_Rapor_{safe_date}.pdf"
+
+class _ZipBuffer(io.RawIOBase):
+    """ZIP çıktısını parça parça toplayan, geri sarılamayan yazma tamponu"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_zip(reports):
+    """
+    Raporları render edip ZIP'i parça parça üret (her PDF bitince gönderilir).
+    Yanıt başladıktan sonra durum kodu değiştirilemediği için başarısız
+    raporlar arşivin sonuna HATALAR.txt olarak yazılır.
+    """
+    buffer = _ZipBuffer()
+    errors = []
+    # PDF akışları zaten sıkıştırılmış; tekrar deflate etmek yalnızca CPU harcar
+    # Arşiv bitene kadar toplu işin PDF'leri saklama politikasınca silinmez
+    with retention.hold(OUTPUT_DIR) as refresh_hold, \
+            zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for index, filepath, error in render_batch(reports):
+            refresh_hold()
+            if error:
+                errors.append(f"Rapor {index + 1}: {error}")
+                continue
+            archive.write(filepath, archive_name(index, reports[index][0]))
+            yield buffer.drain()
+        if errors:
+            archive.writestr("HATALAR.txt", "\n".join(errors))
+    yield buffer.drain()
+    retention.enforce(OUTPUT_DIR)
+
+def share_xobjects(pdf):
+    """
+    Birleştirilmiş belgede her raporun kendi kopyasını getirdiği iskelet ve logo
+    XObject'lerini tek kopyaya bağla; referanssız kalan kopyalar kayıtta yazılmaz.
+    """
+    shared = {}
+    for page in pdf.pages:
+        xobjects = page.Resources.get("/XObject")
+        if xobjects is None:
+            continue
+        for name in list(xobjects.keys()):
+            if name.startswith(SHARED_XOBJECT_PREFIXES):
+                xobjects[name] = shared.setdefault(name, xobjects[name])
+
+def render_merged_pdf(reports):
+    """
+    Raporları paralel render edip sırayla tek PDF'te birleştir.
+
+    Returns:
+        OUTPUT_DIR altındaki birleştirilmiş PDF'in dosya adı
+    """
+    if pikepdf is None:
+        raise RuntimeError("Birleştirilmiş PDF için pikepdf gerekli")
+
+    # Birleştirme bitene kadar bileşen PDF'ler saklama politikasınca silinmez
+    with retention.hold(OUTPUT_DIR) as refresh_hold:
+        filepaths = []
+        for index, filepath, error in render_batch(reports):
+            refresh_hold()
+            if error:
+                raise RuntimeError(f"Rapor {index + 1}: {error}")
+            filepaths.append(filepath)
+
+        # Bileşenler içerik adresli olduğu için birleşik dosya da onların adlarından türetilir
+        linearize = linearize_enabled()
+        pdf_filename = pdf_cache.merged_filename([os.path.basename(path) for path in filepaths],
+                                                 linearize=linearize)
+        if pdf_cache.lookup(OUTPUT_DIR, pdf_filename):
+            return pdf_filename
+
+        pdf_filepath = os.path.join(OUTPUT_DIR, pdf_filename)
+        temp_filepath = f"{pdf_filepath}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            # Kaynak PDF'ler kayıt bitene kadar açık kalmalı (sayfa içerikleri oradan kopyalanır)
+            with ExitStack() as stack:
+                merged = stack.enter_context(pikepdf.new())
+                for filepath in filepaths:
+                    source = stack.enter_context(pikepdf.open(filepath))
+                    merged.pages.extend(source.pages)
+                share_xobjects(merged)
+                merged.save(temp_filepath, linearize=linearize)
+            os.replace(temp_filepath, pdf_filepath)
+        finally:
+            if os.path.exists(temp_filepath):
+                os.remove(temp_filepath)
+
+    retention.enforce(OUTPUT_DIR, keep=pdf_filepath)
+    return pdf_filename
@@ -0,0 +1,343 @@
+"""
+Render hattı için tekrarlanabilir mikro benchmark.
+
+Girdiler yerelde sentetik olarak üretilir (0.3-48 MP fotoğraflar: JPEG, PNG, RGBA PNG,
+EXIF döndürülmüş JPEG; 0-40 fotoğraflı, kısa/uzun/çok uzun iş listeli raporlar).
+Her senaryo yeni bir süreçte çalışır; böylece setup_fonts soğuk ölçülür ve tepe RSS
+senaryoya özeldir. Aşamalar ayrı ayrı zamanlanır (setup_fonts, draw_image_fit, metin
+yerleşimi, fotoğraf hazırlama, c.save(), linearize, generate_report toplamı) ve sonuçlar
+kayıtlı bir baseline ile karşılaştırılır.
+
+Kullanım:
+    python benchmark.py                     # baseline ile karşılaştır (gerileme varsa çıkış kodu 1)
+    python benchmark.py --save-baseline     # mevcut sonuçları baseline olarak kaydet
+    python benchmark.py --quick -k rapor    # küçük matris, adında "rapor" geçen senaryolar
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BASE_DIR, "benchmark_baseline.json")
+INPUT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "gunluk-rapor-bench")
+
+IMAGE_SIZES_MP = [0.3, 2, 12, 48]
+IMAGE_KINDS = ["jpeg", "png", "rgba", "exif"]
+REPORT_PHOTO_COUNTS = [0, 8, 20, 40]
+REPORT_PHOTO_MP = 2
+# İş listesi uzunlukları: (madde sayısı, madde başına karakter)
+WORK_LISTS = {"kisa": (3, 40), "uzun": (15, 300), "cok_uzun": (15, 2000)}
+
+# Gürültü sınırları: bunların altındaki farklar gerileme sayılmaz
+NOISE_FLOOR = {"seconds": 0.005, "peak_rss_kb": 5 * 1024, "output_bytes": 1024}
+
+# ============================================================
+# SENTETİK GİRDİLER
+# ============================================================
+
+def photo_path(megapixels, kind, seed=0):
+    extension = "png" if kind in ("png", "rgba") else "jpg"
+    return os.path.join(INPUT_CACHE_DIR, f"{kind}-{megapixels}mp-{seed}.{extension}")
+
+def make_photo(megapixels, kind, seed=0):
+    """Sentetik fotoğrafı üret (diskte varsa tekrar üretme) ve yolunu döndür"""
+    from PIL import Image
+
+    path = photo_path(megapixels, kind, seed)
+    if os.path.exists(path):
+        return path
+    os.makedirs(INPUT_CACHE_DIR, exist_ok=True)
+
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = int(width * 3 / 4)
+    rng = random.Random(f"{kind}-{megapixels}-{seed}")
+    # Düşük çözünürlüklü rastgele renklerden büyütülmüş yumuşak görüntü + hafif gürültü:
+    # gerçek fotoğraflara yakın JPEG/PNG boyutları verir
+    small = Image.new("RGB", (16, 12))
+    small.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(16 * 12)])
+    image = small.resize((width, height), Image.BICUBIC)
+    noise = Image.effect_noise((width, height), 20).convert("RGB")
+    image = Image.blend(image, noise, 0.12)
+    del noise
+
+    temp_path = f"{path}.tmp"
+    if kind == "jpeg":
+        image.save(temp_path, "JPEG", quality=90)
+    elif kind == "exif":
+        exif = Image.Exif()
+        exif[0x0112] = 6  # 90 derece döndürülmüş (telefon dikey çekim)
+        image.save(temp_path, "JPEG", quality=90, exif=exif.tobytes())
+    elif kind == "png":
+        image.save(temp_path, "PNG", compress_level=1)
+    else:
+        image.putalpha(Image.linear_gradient("L").resize((width, height)))
+        image.save(temp_path, "PNG", compress_level=1)
+    os.replace(temp_path, path)
+    return path
+
+def make_work_items(count, length, seed=0):
+    """Türkçe kelimelerden (ve çok uzun listelerde bölünmesi gereken uzun kelimelerden) iş maddeleri üret"""
+    words = ["betonarme", "taşıyıcı", "sistemin", "güçlendirme", "çalışmaları", "kalıp", "donatı",
+             "kontrolü", "yapılmıştır", "iskele", "söküm", "şantiye", "ölçüm", "dış", "cephe"]
+    rng = random.Random(f"isler-{count}-{length}-{seed}")
+    items = []
+    for _ in range(count):
+        text = ""
+        while len(text) < length:
+            word = rng.choice(words)
+            if length >= 1000 and rng.random() < 0.05:
+                word = word.upper() * 20
+            text += word + " "
+        items.append(text[:length].strip())
+    return items
+
+def build_scenarios(quick=False):
+    """Senaryo matrisini oluştur"""
+    sizes = [mp for mp in IMAGE_SIZES_MP if not quick or mp <= 2]
+    counts = [count for count in REPORT_PHOTO_COUNTS if not quick or count <= 8]
+    scenarios = []
+    for megapixels in sizes:
+        for kind in IMAGE_KINDS:
+            scenarios.append({"name": f"foto-{kind}-{megapixels}mp", "type": "image",
+                              "kind": kind, "megapixels": megapixels})
+    for count in counts:
+        scenarios.append({"name": f"rapor-{count}foto-uzun", "type": "report",
+                          "photos": count, "work_list": "uzun"})
+    for work_list in WORK_LISTS:
+        if work_list != "uzun":
+            scenarios.append({"name": f"rapor-8foto-{work_list}", "type": "report",
+                              "photos": 8, "work_list": work_list})
+    return scenarios
+
+def prepare_inputs(scenario):
+    """Senaryonun girdi dosyalarını (ana süreçte, ölçümden önce) hazırla"""
+    if scenario["type"] == "image":
+        return [make_photo(scenario["megapixels"], scenario["kind"])]
+    return [make_photo(REPORT_PHOTO_MP, "jpeg", seed) for seed in range(scenario["photos"])]
+
+# ============================================================
+# ÖLÇÜM (her senaryo ayrı süreçte)
+# ============================================================
+
+def peak_rss_kb():
+    """Sürecin tepe RSS değeri (KB)"""
+    # ru_maxrss fork+exec boyunca ebeveynden devralınır (spawn edilen çocuk, girdileri
+    # üreten ana sürecin tepesini görür); VmHWM ise exec ile sıfırlanır
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _timed(owner, name, totals):
+    """owner.name çağrılarının toplam süresini totals[name]'e ekleyen sarmalayıcı kur"""
+    original = getattr(owner, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            totals[name] = totals.get(name, 0.0) + time.perf_counter() - start
+
+    setattr(owner, name, wrapper)
+
+def run_scenario(scenario, inputs, repeat):
+    """Senaryoyu çalıştır; aşama süreleri (medyan), tepe RSS ve çıktı boyutunu döndür"""
+    from pdf_layout import setup_fonts, draw_image_fit, wrap_text, current_rss_kb, FONT_SIZE_NORMAL
+    from reportlab.pdfgen import canvas
+    from werkzeug.datastructures import FileStorage
+    import pdf_generator
+
+    samples = {}
+
+    def record(stage, seconds):
+        samples.setdefault(stage, []).append(seconds)
+
+    start = time.perf_counter()
+    font_regular, _ = setup_fonts(BASE_DIR)
+    record("setup_fonts", time.perf_counter() - start)
+    rss_before_kb = current_rss_kb()
+    output_bytes = 0
+    drawn = True
+
+    if scenario["type"] == "image":
+        box_width, box_height = pdf_generator.photo_grid_geometry(pdf_generator.PAGE_HEIGHT / 2)[2:]
+        for _ in range(repeat):
+            buffer = io.BytesIO()
+            c = canvas.Canvas(buffer, pagesize=pdf_generator.A4)
+            start = time.perf_counter()
+            drawn = draw_image_fit(c, 0, 0, box_width, box_height, inputs[0])
+            record("draw_image_fit", time.perf_counter() - start)
+            start = time.perf_counter()
+            c.save()
+            record("save", time.perf_counter() - start)
+            output_bytes = buffer.tell()
+    else:
+        # Önbellek isabetleri ölçümü bozmasın: çıktılar geçici dizine, her tekrarda farklı veri
+        output_dir = tempfile.mkdtemp(prefix="bench-pdf-")
+        pdf_generator.OUTPUT_DIR = output_dir
+        items = make_work_items(*WORK_LISTS[scenario["work_list"]])
+        works_width = pdf_generator.PAGE_WIDTH - pdf_generator.MARGIN_LEFT - pdf_generator.MARGIN_RIGHT - 0.2 * pdf_generator.cm
+        photo_bytes = []
+        for path in inputs:
+            with open(path, "rb") as f:
+                photo_bytes.append(f.read())
+
+        totals = {}
+        _timed(pdf_generator, "wrap_text", totals)
+        _timed(pdf_generator, "prepare_images", totals)
+        _timed(pdf_generator, "linearize_pdf", totals)
+        _timed(pdf_generator.canvas.Canvas, "save", totals)
+
+        for iteration in range(repeat):
+            # Yalnızca metin yerleşimi (soğuk satır kırma önbelleğiyle)
+            wrap_text.cache_clear()
+            start = time.perf_counter()
+            for item in items:
+                wrap_text(f"• {item}", font_regular, FONT_SIZE_NORMAL, works_width)
+            record("text_layout", time.perf_counter() - start)
+
+            wrap_text.cache_clear()
+            totals.clear()
+            data = {"tarih": "12.01.2026", "rapor_no": f"bench-{iteration}",
+                    "yapilan_isler": items, "proje_basligi": "BENCHMARK PROJESİ"}
+            photos = [FileStorage(stream=io.BytesIO(content), filename=f"foto-{i}.jpg")
+                      for i, content in enumerate(photo_bytes)]
+            start = time.perf_counter()
+            filepath = pdf_generator.generate_report(data, photos)
+            record("generate_report", time.perf_counter() - start)
+            record("report_wrap_text", totals.get("wrap_text", 0.0))
+            record("prepare_images", totals.get("prepare_images", 0.0))
+            record("save", totals.get("save", 0.0))
+            record("linearize", totals.get("linearize_pdf", 0.0))
+            output_bytes = os.path.getsize(filepath)
+            os.remove(filepath)
+
+    peak_kb = peak_rss_kb()
+    return {
+        # setup_fonts yalnızca ilk çağrıda soğuktur; diğer aşamalar tekrarların medyanı
+        "seconds": {stage: round(statistics.median(values), 5) for stage, values in samples.items()},
+        "peak_rss_kb": peak_kb,
+        "rss_delta_kb": max(peak_kb - rss_before_kb, 0),
+        "output_bytes": output_bytes,
+        "drawn": drawn,
+    }
+
+# ============================================================
+# KARŞILAŞTIRMA
+# ============================================================
+
+def environment_info():
+    from PIL import __version__ as pillow_version
+    from reportlab import Version as reportlab_version
+    return {
+        "python": platform.python_version(),
+        "pillow": pillow_version,
+        "reportlab": reportlab_version,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def compare(results, baseline, tolerance):
+    """Sonuçları baseline ile karşılaştır, gerileme listesini döndür"""
+    regressions = []
+    print(f"\n{'Senaryo':<24} {'Ölçüm':<26} {'Baseline':>12} {'Şimdi':>12} {'Fark':>8}")
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<24} {'(baseline yok)':<26}")
+            continue
+        metrics = [(f"seconds.{stage}", "seconds", value, reference["seconds"].get(stage))
+                   for stage, value in result["seconds"].items()]
+        metrics.append(("peak_rss_kb", "peak_rss_kb", result["peak_rss_kb"], reference.get("peak_rss_kb")))
+        metrics.append(("output_bytes", "output_bytes", result["output_bytes"], reference.get("output_bytes")))
+        for label, kind, current, previous in metrics:
+            if previous is None:
+                continue
+            change = (current - previous) / previous if previous else 0.0
+            regressed = change > tolerance and current - previous > NOISE_FLOOR[kind]
+            marker = "  <-- GERİLEME" if regressed else ""
+            print(f"{name:<24} {label:<26} {previous:>12} {current:>12} {change:>+7.0%}{marker}")
+            if regressed:
+                regressions.append((name, label, previous, current))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PDF render hattı benchmark'ı")
+    parser.add_argument("-k", "--filter", help="Yalnızca adında bu metin geçen senaryolar")
+    parser.add_argument("--quick", action="store_true", help="Küçük matris (<=2 MP, <=8 fotoğraf)")
+    parser.add_argument("--repeat", type=int, default=3, help="Senaryo başına tekrar (medyan alınır)")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Gerileme eşiği (0.2 = baseline'dan %%20 kötü)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON dosyası")
+    parser.add_argument("--save-baseline", action="store_true", help="Sonuçları baseline olarak kaydet")
+    parser.add_argument("--output", help="Sonuçları ayrıca bu JSON dosyasına yaz")
+    args = parser.parse_args(argv)
+
+    # Türev önbelleği ölçümü bozmasın, metrikler canlı sayaçlara karışmasın
+    # (alt süreçler ortamı devralır)
+    os.environ["PHOTO_CACHE_MAX_MB"] = "0"
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="bench-metrics-")
+
+    scenarios = [s for s in build_scenarios(args.quick) if not args.filter or args.filter in s["name"]]
+    results = {}
+    for scenario in scenarios:
+        inputs = prepare_inputs(scenario)
+        # Her senaryo temiz bir süreçte: soğuk font yükleme ve senaryoya özel tepe RSS
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(run_scenario, scenario, inputs, max(1, args.repeat)).result()
+        results[scenario["name"]] = result
+        stages = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in result["seconds"].items())
+        note = "" if result["drawn"] else " (bütçe aşıldı, çizilmedi)"
+        print(f"{scenario['name']}: {stages}, tepe RSS {result['peak_rss_kb'] / 1024:.0f} MB, "
+              f"çıktı {result['output_bytes'] / 1024:.0f} KB{note}", flush=True)
+
+    report = {"environment": environment_info(), "repeat": args.repeat, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f).get("results", {})
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": report["environment"], "repeat": args.repeat, "results": baseline},
+                      f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline kaydedildi: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("\nBaseline bulunamadı; --save-baseline ile oluşturun")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        stored = json.load(f)
+    if stored.get("environment") != report["environment"]:
+        print(f"\nUyarı: baseline farklı bir ortamda alınmış: {stored.get('environment')}")
+    regressions = compare(results, stored.get("results", {}), args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} ölçümde gerileme (> %{args.tolerance * 100:.0f})")
+        return 1
+    print("\nGerileme yok")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Toplu (çevrimdışı) rapor render aracı.
+
+Metin (parse_text formatı) veya JSON rapor tanımlarını fotoğraf klasörleriyle birlikte
+generate_pdf ile N süreçte paralel render eder. Arşivin yeniden üretimi için web
+yolunu (form, upload, önbellek) atlar.
+
+Kullanım:
+    python bulk_render.py raporlar/ -o arsiv/ -j 8
+    python bulk_render.py "raporlar/2026-01-*.txt" --photos fotograflar/ --force
+    python bulk_render.py raporlar/ --max-kb 10000   # e-posta eki sınırı
+
+Fotoğraflar: tanım dosyasıyla aynı adlı klasörden okunur (raporlar/12-01.txt ->
+raporlar/12-01/ veya --photos verildiyse <photos>/12-01/). JSON tanımlarındaki
+"photos" listesi (JSON dosyasına göreli yollar) bu kuralı geçersiz kılar.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pdf_generator import generate_pdf, generate_pdf_within_budget, BASE_DIR, MAX_PHOTOS
+from pdf_layout import setup_fonts
+from pdf_cache import report_cache_key
+from report_generator import parse_text
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import uuid
+
+DEFINITION_EXTENSIONS = (".txt", ".json")
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff")
+# Çıktı dizininde her PDF'in hangi veri ve seçeneklerle üretildiği (bkz. render_key)
+MANIFEST_NAME = ".bulk_render.json"
+
+def find_definitions(patterns):
+    """Dizin, glob veya dosya yollarından rapor tanımlarını (sıralı, tekrarsız) topla"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern)
+        paths.extend(path for path in matches
+                     if os.path.isfile(path) and path.lower().endswith(DEFINITION_EXTENSIONS))
+    return sorted(set(os.path.abspath(path) for path in paths))
+
+def list_photos(photo_dir):
+    """Klasördeki fotoğrafları ada göre sıralı döndür"""
+    if not photo_dir or not os.path.isdir(photo_dir):
+        return []
+    return [os.path.join(photo_dir, name) for name in sorted(os.listdir(photo_dir))
+            if name.lower().endswith(PHOTO_EXTENSIONS)]
+
+def work_items(value):
+    """
+    yapilan_isler: liste veya satırlara bölünen metin (/batch-reports ve form ile aynı:
+    boş satırlar atlanır, baştaki • kaldırılır)
+    """
+    if isinstance(value, str):
+        lines = value.strip().split("\n")
+    elif isinstance(value, list):
+        lines = [str(item) for item in value]
+    else:
+        raise ValueError("yapilan_isler liste veya metin olmalı")
+    items = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            items.append(line[1:].strip() if line.startswith("•") else line)
+    return items
+
+def load_definition(path, photos_root=None, proje_basligi=None):
+    """
+    Rapor tanımını oku.
+
+    Returns:
+        (data, fotoğraf yolları)
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    base_dir = os.path.dirname(path)
+    photo_dir = os.path.join(photos_root or base_dir, stem)
+
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("JSON tanımı bir nesne olmalı")
+            photo_refs = data.pop("photos", None)
+            if photo_refs is not None:
+                photos = [os.path.join(base_dir, ref) for ref in photo_refs]
+            else:
+                photos = list_photos(photo_dir)
+            data["rapor_no"] = str(data.get("rapor_no", ""))
+            data["yapilan_isler"] = work_items(data.get("yapilan_isler", []))
+        else:
+            # Eksik tarih bugünle doldurulmaz: hem hatalıdır hem de devam anahtarını günlük değiştirir
+            data = parse_text(f.read(), default_date=False)
+            photos = list_photos(photo_dir)
+
+    if proje_basligi and not data.get("proje_basligi"):
+        data["proje_basligi"] = proje_basligi
+    if not data.get("tarih"):
+        raise ValueError("tarih boş")
+    if len(photos) > MAX_PHOTOS:
+        print(f"Uyarı: {path}: {len(photos)} fotoğraftan ilk {MAX_PHOTOS} tanesi kullanılacak")
+    return data, photos[:MAX_PHOTOS]
+
+def render_key(data, photos, target_dpi=None, max_bytes=None):
+    """
+    Çıktıyı belirleyen her şeyin özeti: tanım verisi (--proje-basligi dahil),
+    fotoğraf listesi, --dpi, --max-kb ve render kodu sürümü (CACHE_VERSION)
+    """
+    return report_cache_key(data, photos, target_dpi=target_dpi, max_bytes=max_bytes)
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(output_dir, manifest):
+    """Manifesti atomik yaz (yarıda kesilen çalıştırma onu bozmasın)"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+def is_up_to_date(output_path, inputs, key, manifest):
+    """
+    Çıktı güncel mi: aynı veri ve seçeneklerle üretilmiş (manifest) ve tanım
+    dosyasından ve fotoğraflardan daha yeni (make benzeri)
+    """
+    if manifest.get(os.path.basename(output_path)) != key:
+        return False
+    try:
+        output_mtime = os.path.getmtime(output_path)
+        return all(os.path.getmtime(path) <= output_mtime for path in inputs)
+    except OSError:
+        return False
+
+def output_path_for(path, output_dir):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir, f"{name}.pdf")
+
+def find_collisions(definitions, output_dir):
+    """Aynı çıktı adına düşen tanımlar ({çıktı yolu: [tanımlar]}, ör. a.txt ve a.json)"""
+    outputs = {}
+    for path in definitions:
+        output_path = output_path_for(path, output_dir)
+        outputs.setdefault(os.path.normcase(output_path), []).append(path)
+    return {output_path: paths for output_path, paths in outputs.items() if len(paths) > 1}
+
+def render_one(data, photos, output_path, target_dpi=None, max_bytes=None):
+    """
+    Tek raporu render et (worker sürecinde çalışır).
+
+    Returns:
+        (başarılı mı, süre saniye, çıktı boyutu bayt)
+    """
+    start = time.perf_counter()
+    # Yarım dosya "güncel" sayılmasın diye önce geçici ada yaz
+    temp_path = f"{output_path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        if max_bytes:
+            ok = generate_pdf_within_budget(data, photos, temp_path, max_bytes,
+                                            target_dpi=target_dpi) is not None
+        else:
+            ok = generate_pdf(data, photos, temp_path, target_dpi=target_dpi)
+        if ok:
+            os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    size = os.path.getsize(output_path) if ok else 0
+    return ok, time.perf_counter() - start, size
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rapor tanımlarından toplu PDF üret")
+    parser.add_argument("definitions", nargs="+",
+                        help="Tanım dosyaları (.txt/.json), dizinler veya glob desenleri")
+    parser.add_argument("-o", "--output", default="arsiv",
+                        help="Çıktı dizini")
+    parser.add_argument("-p", "--photos", help="Fotoğraf klasörlerinin kök dizini")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Paralel worker süreç sayısı")
+    parser.add_argument("--dpi", type=int, help="Fotoğraf çözünürlüğü (varsayılan PHOTO_TARGET_DPI)")
+    parser.add_argument("--max-kb", type=int,
+                        help="En büyük PDF boyutu (KB); aşılırsa fotoğraf kalitesi/çözünürlüğü düşürülür")
+    parser.add_argument("--proje-basligi", help="Tanımda proje başlığı yoksa kullanılacak başlık")
+    parser.add_argument("--force", action="store_true", help="Güncel çıktıları da yeniden üret")
+    args = parser.parse_args(argv)
+
+    definitions = find_definitions(args.definitions)
+    if not definitions:
+        print("Rapor tanımı bulunamadı")
+        return 1
+    # Çıktılar tanımın dosya adıyla adlandırılır: çakışanlar birbirinin üzerine yazardı
+    collisions = find_collisions(definitions, args.output)
+    if collisions:
+        for output_path, paths in sorted(collisions.items()):
+            print(f"HATA çıktı adı çakışıyor: {output_path} <- {', '.join(paths)}")
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+
+    max_bytes = args.max_kb * 1024 if args.max_kb else None
+    manifest = load_manifest(args.output)
+    tasks = []
+    failures = []
+    skipped = 0
+    for path in definitions:
+        name = os.path.splitext(os.path.basename(path))[0]
+        output_path = output_path_for(path, args.output)
+        try:
+            data, photos = load_definition(path, args.photos, args.proje_basligi)
+        except (OSError, ValueError) as e:
+            failures.append((name, f"tanım okunamadı: {e}"))
+            continue
+        key = render_key(data, photos, args.dpi, max_bytes)
+        if not args.force and is_up_to_date(output_path, [path] + photos, key, manifest):
+            skipped += 1
+            continue
+        tasks.append((name, data, photos, output_path, key))
+
+    total = len(tasks)
+    print(f"{len(definitions)} tanım: {total} render edilecek, {skipped} güncel, {len(failures)} hatalı")
+
+    timings = []
+    wall_start = time.perf_counter()
+    if tasks:
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs), initializer=setup_fonts,
+                                 initargs=(BASE_DIR,)) as executor:
+            futures = {
+                executor.submit(render_one, data, photos, output_path, args.dpi, max_bytes):
+                    (name, len(photos), os.path.basename(output_path), key)
+                for name, data, photos, output_path, key in tasks
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                name, photo_count, output_name, key = futures[future]
+                try:
+                    ok, seconds, size = future.result()
+                except Exception as e:
+                    ok, seconds, size = False, 0.0, 0
+                    failures.append((name, str(e)))
+                else:
+                    if not ok:
+                        failures.append((name, "PDF oluşturulamadı"))
+                status = "tamam" if ok else "HATA"
+                print(f"[{done}/{total}] {name}: {status} {seconds:.2f}s, {photo_count} foto, {size / 1024:.0f} KB")
+                if ok:
+                    timings.append((name, seconds, photo_count, size))
+                    # Her başarıdan sonra yazılır: yarıda kesilen çalıştırma kaldığı yerden devam eder
+                    manifest[output_name] = key
+                    save_manifest(args.output, manifest)
+    wall_seconds = time.perf_counter() - wall_start
+
+    # Rapor başına süre özeti (en yavaştan hızlıya)
+    if timings:
+        print("\nRapor              Süre(s)  Foto  Boyut(KB)")
+        for name, seconds, photo_count, size in sorted(timings, key=lambda t: t[1], reverse=True):
+            print(f"{name[:18]:<18} {seconds:>7.2f}  {photo_count:>4}  {size / 1024:>9.0f}")
+        render_seconds = sum(t[1] for t in timings)
+        print(f"\n{len(timings)} rapor: toplam render {render_seconds:.2f}s, "
+              f"ortalama {render_seconds / len(timings):.2f}s, duvar saati {wall_seconds:.2f}s")
+    for name, error in failures:
+        print(f"HATA {name}: {error}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
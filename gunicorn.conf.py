@@ -0,0 +1,57 @@
+import gc
+import os
+import time
+
+# Yapılandırma uygulama import'undan önce okunur: on_starting'e kadar geçen süre
+# --preload ile app import süresidir
+_CONFIG_LOADED_AT = time.perf_counter()
+
+# ============================================================
+# GUNICORN AYARLARI
+# ============================================================
+# Varsayılan model: tek süreçte thread'li worker (gthread). Fontlar, logo, sayfa
+# iskeletleri ve paragraf stilleri süreç genelinde bir kez hazırlanıp istek
+# thread'leri arasında salt okunur paylaşılır; her istek yalnızca kendi canvas'ını
+# ve tamponlarını kullanır. Böylece eşzamanlı her kullanıcı ayrı bir süreç
+# (ReportLab, Pillow ve font kopyası) yerine yalnızca bir thread maliyeti getirir.
+# Render'ın Python kısmı GIL'i tutar; Pillow decode/resize/encode ve zlib ise
+# GIL'i bırakır. Çok çekirdekte WEB_CONCURRENCY ile süreç sayısı artırılabilir.
+# Ölçüm: python worker_benchmark.py (bkz. README "Worker Modeli").
+
+# Fontlar ve logo fork'tan önce yüklenir; worker'lar bu sayfaları copy-on-write paylaşır
+preload_app = True
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Büyük fotoğraflı raporlar ve bütçe modu birkaç render sürebilir
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+
+# PORT ortam değişkeni varsa (Render/Heroku) gunicorn onu kendisi kullanır
+if "PORT" not in os.environ:
+    bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# ============================================================
+# ISINMA KANCALARI
+# ============================================================
+# on_starting port açılmadan (ve --preload ile fork'tan) önce master'da çalışır:
+# fontlar, logolar, Pillow eklentileri, şablonlar ve örnek bir render ısıtılır;
+# worker'lar sonucu copy-on-write devralır ve ilk istek soğuk maliyet ödemez.
+
+def on_starting(server):
+    if not server.cfg.preload_app:
+        return
+    import warmup
+    warmup.warm_up(server.app.wsgi(), import_seconds=time.perf_counter() - _CONFIG_LOADED_AT)
+    # Isınmadan kalan nesneleri kalıcı nesil yap: GC worker'larda bu sayfalara
+    # yazmaz (referans sayımı dışında), copy-on-write paylaşımı korunur
+    gc.collect()
+    gc.freeze()
+
+def post_worker_init(worker):
+    # preload kapalıysa her worker kendi uygulamasını yükler ve ısınmayı burada yapar
+    # (worker istek kabul etmeden önce); preload ile ısınma zaten yapılmıştır
+    import warmup
+    warmup.warm_up(worker.wsgi)
@@ -0,0 +1,203 @@
+from concurrent.futures import ThreadPoolExecutor
+from pdf_generator import render_report, OUTPUT_DIR, MAX_PHOTOS
+from process_info import process_start, process_alive
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import metrics
+
+# ============================================================
+# ASENKRON RAPOR İŞLERİ
+# ============================================================
+# /generator-test "async" modunda formu doğrular, render'ı yerel bir
+# worker havuzuna kuyruklar ve hemen bir iş kimliği döndürür.
+# view_pdf.html durum endpoint'ini sorgulayarak PDF hazır olunca gösterir.
+# İş durumları küçük JSON dosyalarında tutulur; böylece birden fazla gunicorn
+# worker'ı varken durum sorgusu hangi worker'a düşerse düşsün cevaplanır.
+
+# Aynı anda render edilen rapor sayısı (kalanlar kuyrukta bekler)
+REPORT_JOB_WORKERS = max(1, int(os.environ.get("REPORT_JOB_WORKERS", 2)))
+# Tamamlanan işlerin kayıtlarının (JOBS_DIR altındaki JSON dosyaları) saklanma süresi (saniye)
+REPORT_JOB_TTL = int(os.environ.get("REPORT_JOB_TTL", 3600))
+# Bu süreden uzun süren (kuyrukta veya render'da) iş başarısız sayılır (saniye)
+REPORT_JOB_TIMEOUT = int(os.environ.get("REPORT_JOB_TIMEOUT", 600))
+# Kuyruktaki işin fotoğrafı bu boyuta kadar bellekte, üstünde geçici dosyada tutulur
+JOB_PHOTO_SPOOL_BYTES = int(os.environ.get("JOB_PHOTO_SPOOL_KB", 512)) * 1024
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+
+JOBS_DIR = os.path.join(OUTPUT_DIR, ".jobs")
+os.makedirs(JOBS_DIR, exist_ok=True)
+
+_jobs_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """İş havuzunu ilk kullanımda oluştur (gunicorn --preload fork'undan sonra)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS,
+                                               thread_name_prefix="report-job")
+    return _executor
+
+def _job_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def _read_job(job_id):
+    try:
+        with open(_job_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_job(job_id, job):
+    """İş durumunu atomik olarak yaz (okuyan worker yarım dosya görmez)"""
+    temp_path = f"{_job_path(job_id)}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(temp_path, _job_path(job_id))
+
+def _update_job(job_id, **fields):
+    """
+    İş kaydını güncelle. Biten iş (done/error) kesindir: örneğin zaman aşımıyla
+    error olarak işaretlenen işin sonradan biten render'ı onu done yapmaz.
+
+    Returns:
+        bool - Güncelleme yapıldı mı
+    """
+    with _jobs_lock:
+        job = _read_job(job_id)
+        if job is None or job["status"] in (JOB_DONE, JOB_ERROR):
+            return False
+        job.update(fields)
+        _write_job(job_id, job)
+        return True
+
+def _stale_reason(job):
+    """
+    Bitmemiş iş artık bitemeyecekse nedenini döndür: işi kuyruklayan worker
+    süreci yeniden başlatıldı/öldürüldü ya da iş REPORT_JOB_TIMEOUT'u aştı.
+    """
+    owner_pid = job.get("owner_pid")
+    if owner_pid is not None and not process_alive(owner_pid, job.get("owner_started")):
+        return "İşi çalıştıran sunucu süreci sonlandı"
+    if time.time() - job.get("created_at", 0) > REPORT_JOB_TIMEOUT:
+        return "İş zaman aşımına uğradı"
+    return None
+
+def _purge_expired_jobs():
+    """Süresi dolan iş kayıtlarını sil"""
+    now = time.time()
+    try:
+        entries = list(os.scandir(JOBS_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if now - entry.stat().st_mtime > REPORT_JOB_TTL:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+def _run_job(job_id, data, photo_sources, max_bytes=None):
+    try:
+        job = _read_job(job_id)
+        if job is not None and time.time() - job["created_at"] > REPORT_JOB_TIMEOUT:
+            # Kuyrukta zaman aşımına uğradı: istemci artık beklemiyor, render edilmez
+            _update_job(job_id, status=JOB_ERROR, error="İş zaman aşımına uğradı",
+                        finished_at=time.time())
+            return
+        started_at = time.time()
+        if not _update_job(job_id, status=JOB_RUNNING, started_at=started_at):
+            # Sorgulanırken zaten error olarak işaretlenmiş
+            return
+        # Aşama süreleri iş kaydına yazılır; /jobs/<id> iş bitince Server-Timing olarak döndürür
+        metrics.begin_request()
+        try:
+            metrics.observe("job_queue", started_at - job["created_at"] if job else 0.0)
+            filepath = render_report(data, photo_sources, max_bytes=max_bytes, background=True)
+        finally:
+            server_timing = metrics.end_request(observe_total=False)
+        _update_job(job_id, status=JOB_DONE, filename=os.path.basename(filepath),
+                    size=os.path.getsize(filepath), finished_at=time.time(),
+                    server_timing=server_timing)
+    except Exception as e:
+        import traceback
+        print(f"Rapor işi başarısız {job_id}: {e}\n{traceback.format_exc()}")
+        _update_job(job_id, status=JOB_ERROR, error=str(e), finished_at=time.time())
+    finally:
+        for source in photo_sources:
+            source.close()
+
+def submit_report_job(data, photos, max_bytes=None):
+    """
+    Rapor render'ını kuyruğa ekle ve iş kimliğini döndür.
+    Upload stream'leri istek bitince kapandığı için fotoğraflar önce geçici
+    dosyalara kopyalanır (küçükler bellekte kalır, büyükler diske taşar).
+    
+    Args:
+        data: Dict - generate_report ile aynı rapor verisi
+        photos: Flask FileStorage listesi (fotoğraflar)
+        max_bytes: int - En büyük PDF boyutu (opsiyonel, bkz. render_report)
+    
+    Returns:
+        str - İş kimliği
+    """
+    _purge_expired_jobs()
+    
+    photo_sources = []
+    for photo in photos[:MAX_PHOTOS]:
+        if photo and photo.filename:
+            spooled = tempfile.SpooledTemporaryFile(max_size=JOB_PHOTO_SPOOL_BYTES)
+            shutil.copyfileobj(photo.stream, spooled)
+            spooled.seek(0)
+            photo_sources.append(spooled)
+            photo.close()
+    
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _write_job(job_id, {
+            "status": JOB_QUEUED,
+            "tarih": data.get("tarih", ""),
+            "filename": None,
+            "size": None,
+            "max_bytes": max_bytes,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            # İşin sahibi: bu süreç ölürse iş sorgulandığında hataya çevrilir
+            "owner_pid": os.getpid(),
+            "owner_started": process_start(os.getpid()),
+        })
+    _get_executor().submit(_run_job, job_id, data, photo_sources, max_bytes)
+    return job_id
+
+def get_job(job_id):
+    """İşin durum sözlüğünü döndür (bilinmiyorsa None)"""
+    # Kimlik dosya adı olarak kullanıldığı için yalnızca uuid hex kabul edilir
+    if not job_id.isalnum():
+        return None
+    job = _read_job(job_id)
+    if job is None or job["status"] not in (JOB_QUEUED, JOB_RUNNING):
+        return job
+    reason = _stale_reason(job)
+    if reason is None:
+        return job
+    with _jobs_lock:
+        job = _read_job(job_id)
+        # Kilit beklenirken iş bitmiş olabilir
+        if job is not None and job["status"] in (JOB_QUEUED, JOB_RUNNING):
+            job.update(status=JOB_ERROR, error=reason, finished_at=time.time())
+            _write_job(job_id, job)
+    return job
@@ -0,0 +1,266 @@
+from process_info import process_start, process_alive
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ============================================================
+# AŞAMA ZAMANLAYICILARI VE METRİKLER
+# ============================================================
+# Rapor üretiminin aşamaları (upload, özet, fotoğraf hazırlama, metin yerleşimi,
+# çizim, kayıt, linearize) perf_counter turlarıyla ölçülür. Süreler:
+#   - istek thread'inde bir zamanlama açıksa Server-Timing header'ına,
+#   - her durumda süreç içi histogramlara yazılır.
+# Histogramlar süreç başına bir JSON dosyasına (METRICS_DIR/<pid>-<başlama>.json)
+# aktarılır; /metrics tüm dosyaları toplar, böylece hangi gunicorn worker'ı veya
+# toplu render süreci cevap verirse versin sayılar tüm süreçleri kapsar.
+# Sonlanan süreçlerin sayıları silinmeden önce kalıcı bir toplam dosyasına
+# (retired.json) eklenir: Prometheus sayaçları worker yeniden başlasa da azalmaz.
+
+METRICS_DIR = os.environ.get(
+    "METRICS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "generated_pdfs", ".metrics"))
+
+# Süreç canlılığı bilinemeyen platformlarda (POSIX dışı) bu süre boyunca
+# güncellenmeyen süreç dosyaları sonlanmış sayılır
+METRICS_STALE_SECONDS = int(os.environ.get("METRICS_STALE_SECONDS", 7 * 24 * 3600))
+RETIRED_FILENAME = "retired.json"
+
+# Histogram sınırları (saniye)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "gunluk_rapor"
+COUNTER_HELP = {
+    "reports": "Üretilen (veya önbellekten dönen) rapor sayısı",
+    "cache_hits": "PDF önbelleğinden dönen rapor sayısı",
+    "photos": "Render edilen fotoğraf sayısı",
+    "photos_failed": "İşlenemeyen (bozuk veya bütçeyi aşan) fotoğraf sayısı",
+    "pages": "Üretilen PDF sayfa sayısı",
+    "output_bytes": "Üretilen PDF bayt sayısı",
+    "budget_rerenders": "Boyut bütçesine sığdırmak için yapılan ek render sayısı",
+    "admission_rejected": "Bellek bütçesi dolu olduğu için 503 ile reddedilen render sayısı",
+    "retention_evictions": "Saklama politikasınca silinen dosya sayısı (yaş, sayı/boyut sınırı, eski .tmp)",
+    "retention_evicted_bytes": "Saklama politikasınca silinen bayt",
+    "retention_sweeps": "Arka plan saklama süpürücüsünün çalışma sayısı",
+    "pdf_cache_hits": "PDF önbelleği isabeti (tek rapor ve birleştirilmiş PDF aramaları)",
+    "pdf_cache_misses": "PDF önbelleğinde bulunamayan arama sayısı",
+    "photo_cache_hits": "Fotoğraf türev önbelleğinden alınan fotoğraf sayısı",
+    "photo_cache_misses": "Fotoğraf türev önbelleğinde bulunamayan fotoğraf sayısı",
+    "photo_cache_stores": "Fotoğraf türev önbelleğine yazılan türev sayısı",
+    "photo_cache_evictions": "Boyut sınırı nedeniyle silinen fotoğraf türevi sayısı",
+    "photo_cache_evicted_bytes": "Boyut sınırı nedeniyle silinen fotoğraf türevi baytı",
+    "released_bytes": "Render sonrası bırakılan görsel bitmap baytı",
+    "released_images": "Render sonrası kapatılan görsel sayısı",
+    "gc_collections": "Bırakılan bayt GC_THRESHOLD_MB eşiğini aşınca yapılan gc.collect() sayısı",
+}
+
+_metrics_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_HISTOGRAMS = {}  # aşama -> {"buckets": [...], "sum": float, "count": int}
+_COUNTERS = {}  # ad -> değer
+_request = threading.local()
+_PROCESS = {"pid": None, "start": None}
+
+def observe(stage, seconds, request=True):
+    """Aşama süresini histograma ve (açıksa) isteğin zamanlamasına ekle"""
+    with _metrics_lock:
+        histogram = _HISTOGRAMS.get(stage)
+        if histogram is None:
+            histogram = _HISTOGRAMS[stage] = {"buckets": [0] * len(STAGE_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+    timings = getattr(_request, "timings", None) if request else None
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def count(name, value=1):
+    """Sayacı artır"""
+    with _metrics_lock:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+def reset():
+    """Süreç içi histogram ve sayaçları sıfırla (ör. ısınma render'ı sayılmasın)"""
+    with _metrics_lock:
+        _HISTOGRAMS.clear()
+        _COUNTERS.clear()
+
+class StageTimer:
+    """
+    Ardışık aşamaları tur (lap) ile ölçer: her lap önceki lap'ten bu yana geçen süredir.
+    Aynı aşama birden çok kez ölçülebilir (ör. sayfa başına fotoğraf hazırlama);
+    süreler toplanır ve close() ile aşama başına tek gözlem olarak kaydedilir.
+    """
+
+    def __init__(self):
+        self._last = time.perf_counter()
+        self._totals = {}
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self._totals[stage] = self._totals.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def close(self):
+        for stage, seconds in self._totals.items():
+            observe(stage, seconds)
+        self._totals = {}
+
+def begin_request():
+    """Bu thread'deki isteğin aşama sürelerini toplamaya başla"""
+    _request.timings = {}
+    _request.started = time.perf_counter()
+
+def end_request(observe_total=True):
+    """
+    İsteğin zamanlamasını kapat ve Server-Timing header değerini döndür.
+    observe_total=False: toplam süre header'a yazılır ama "total" histogramına girmez
+    (asenkron iş: isteğin kendisi zaten ölçülmüştür)
+    """
+    timings = getattr(_request, "timings", None)
+    if timings is None:
+        return ""
+    total = time.perf_counter() - _request.started
+    _request.timings = None
+    if observe_total:
+        observe("total", total)
+    else:
+        timings["total"] = total
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+def _snapshot_path():
+    """Bu sürecin dosyası; ad başlama zamanını içerir, tekrar kullanılan PID eskisinin üzerine yazmaz"""
+    # fork sonrası (gunicorn worker'ı) yeniden okunur
+    if _PROCESS["pid"] != os.getpid():
+        _PROCESS["pid"] = os.getpid()
+        _PROCESS["start"] = process_start(os.getpid())
+    name = f"{_PROCESS['pid']}-{_PROCESS['start']}" if _PROCESS["start"] is not None else str(_PROCESS["pid"])
+    return os.path.join(METRICS_DIR, f"{name}.json")
+
+def flush():
+    """Bu sürecin metriklerini diske yaz (/metrics tüm süreçleri toplar)"""
+    # Aynı süreçteki istek thread'leri (gthread) sırayla yazar: ortak geçici dosya
+    # çakışmaz ve eski bir anlık görüntü yenisinin üstüne yazılmaz
+    with _flush_lock:
+        with _metrics_lock:
+            snapshot = {"histograms": _HISTOGRAMS, "counters": _COUNTERS}
+            encoded = json.dumps(snapshot)
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            path = _snapshot_path()
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "w") as f:
+                f.write(encoded)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Metrikler yazılamadı: {e}")
+
+def _merge(histograms, counters, snapshot):
+    """Anlık görüntüyü toplamlara ekle"""
+    for stage, histogram in snapshot.get("histograms", {}).items():
+        total = histograms.setdefault(stage, {"buckets": [0] * len(STAGE_BUCKETS), "sum": 0.0, "count": 0})
+        total["buckets"] = [a + b for a, b in zip(total["buckets"], histogram["buckets"])]
+        total["sum"] += histogram["sum"]
+        total["count"] += histogram["count"]
+    for name, value in snapshot.get("counters", {}).items():
+        counters[name] = counters.get(name, 0) + value
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _snapshot_alive(entry, now):
+    """Dosyayı yazan süreç çalışıyor mu (ad: <pid>-<başlama> veya <pid>)"""
+    pid, _, start = entry.name[:-len(".json")].partition("-")
+    try:
+        pid = int(pid)
+        start = int(start) if start else None
+    except ValueError:
+        return True
+    if os.name != "posix":
+        try:
+            return now - entry.stat().st_mtime <= METRICS_STALE_SECONDS
+        except OSError:
+            return True
+    return process_alive(pid, start)
+
+def _collect():
+    """Tüm süreçlerin metriklerini topla; sonlanan süreçlerinkini kalıcı toplama aktar"""
+    flush()
+    retired_path = os.path.join(METRICS_DIR, RETIRED_FILENAME)
+    now = time.time()
+    lock_file = None
+    try:
+        if fcntl is not None:
+            # Aynı dosyayı iki worker toplama eklemesin (sayaç iki kez sayılırdı)
+            lock_file = open(os.path.join(METRICS_DIR, ".lock"), "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        entries = [entry for entry in os.scandir(METRICS_DIR)
+                   if entry.name.endswith(".json") and entry.name != RETIRED_FILENAME]
+
+        retired = _read_json(retired_path) or {}
+        retired_histograms = retired.setdefault("histograms", {})
+        retired_counters = retired.setdefault("counters", {})
+        histograms = {}
+        counters = {}
+        dead = []
+        for entry in entries:
+            snapshot = _read_json(entry.path)
+            if snapshot is None:
+                continue
+            if _snapshot_alive(entry, now):
+                _merge(histograms, counters, snapshot)
+            else:
+                _merge(retired_histograms, retired_counters, snapshot)
+                dead.append(entry.path)
+
+        if dead:
+            # Önce toplam yazılır, sonra dosyalar silinir: arada kesilirse sayaç azalmaz
+            temp_path = f"{retired_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(retired, f)
+            os.replace(temp_path, retired_path)
+            for path in dead:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    except OSError:
+        return {}, {}
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+
+    _merge(histograms, counters, retired)
+    return histograms, counters
+
+def render_prometheus():
+    """Prometheus metin formatında metrikler"""
+    histograms, counters = _collect()
+    name = f"{METRIC_PREFIX}_stage_seconds"
+    lines = [f"# HELP {name} Rapor üretim aşamalarının süresi",
+             f"# TYPE {name} histogram"]
+    for stage in sorted(histograms):
+        histogram = histograms[stage]
+        for bound, value in zip(STAGE_BUCKETS, histogram["buckets"]):
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {value}')
+        lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {histogram["count"]}')
+    for counter, help_text in COUNTER_HELP.items():
+        metric = f"{METRIC_PREFIX}_{counter}_total"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {counters.get(counter, 0)}")
+    return "\n".join(lines) + "\n"
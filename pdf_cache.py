@@ -0,0 +1,77 @@
+from pdf_layout import PHOTO_TARGET_DPI
+import hashlib
+import json
+import os
+import re
+import time
+import metrics
+
+# ============================================================
+# PDF ÖNBELLEĞİ (içerik adresli)
+# ============================================================
+# Aynı veri ve bayt bayt aynı fotoğraflarla gelen istekler (ağ kopması sonrası
+# tekrar gönderim, tekrar indirme vb.) yeniden render edilmez: anahtar, normalize
+# edilmiş verinin ve fotoğraf özetlerinin hash'idir, dosya adı bu anahtardan türetilir.
+
+# Layout/render kodu çıktıyı değiştirecek şekilde güncellenirse artırılmalı.
+# Dosya adları bu sürümden türetildiği ve PDF'ler "immutable" servis edildiği için
+# artırılmazsa eski kodun ürettiği PDF'ler aynı URL'den sunulmaya devam eder.
+#   2: linearize, kayıpsız logo XObject'i, sayfa iskeleti form XObject'leri, useA85 = 0
+#   3: boyut bütçesi modunda PNG fotoğraflar artık düşmüyor
+CACHE_VERSION = 3
+
+# Disk kullanımı sınırı ve silme politikası retention.py'dedir; isabetlerde atime
+# güncellendiği için orada en eski erişilen dosya en az yakın kullanılan dosyadır.
+
+
+def _normalize(value):
+    """Anahtar için veriyi normalize et (baştaki/sondaki boşluklar önemsiz)"""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    return value
+
+def report_cache_key(data, photo_digests, target_dpi=None, **render_options):
+    """
+    Rapor verisi, fotoğraf özetleri ve render parametrelerinden önbellek anahtarı üret.
+    render_options: Çıktıyı değiştiren diğer seçenekler (ör. linearize)
+    """
+    payload = {
+        "version": CACHE_VERSION,
+        "data": _normalize(data),
+        "photos": list(photo_digests),
+        "target_dpi": target_dpi or PHOTO_TARGET_DPI,
+        "options": _normalize(render_options),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def cached_filename(data, cache_key):
+    """Anahtara karşılık gelen PDF dosya adı"""
+    safe_date = re.sub(r"[^\d.]", "", data["tarih"])
+    return f"rapor-{safe_date}-{cache_key[:16]}.pdf"
+
+def merged_filename(filenames, **render_options):
+    """Birleştirilmiş PDF'in dosya adı (bileşen PDF'lerin içerik adresli adlarından)"""
+    payload = {
+        "version": CACHE_VERSION,
+        "parts": list(filenames),
+        "options": _normalize(render_options),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return f"raporlar-{hashlib.sha256(encoded).hexdigest()[:16]}.pdf"
+
+def lookup(output_dir, filename):
+    """Önbellekte varsa PDF yolunu döndür (ve LRU için erişim zamanını güncelle)"""
+    filepath = os.path.join(output_dir, filename)
+    try:
+        # Sadece atime güncellenir: mtime, servis edilen ETag/Last-Modified'ın kaynağıdır
+        os.utime(filepath, (time.time(), os.stat(filepath).st_mtime))
+    except OSError:
+        metrics.count("pdf_cache_misses")
+        return None
+    metrics.count("pdf_cache_hits")
+    return filepath
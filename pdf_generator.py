@@ -9,38 +9,205 @@ from pdf_layout import (
     HEADER_TABLE_CELL_HEIGHT,
     BAND_HEIGHT,
     WORKS_TITLE_HEIGHT, WORKS_ROW_HEIGHT, WORKS_MAX_ROWS,
-    PHOTO_GRID_COLS, PHOTO_GRID_ROWS, PHOTOS_PER_PAGE, PHOTO_LABEL_HEIGHT,
+    PHOTO_GRID_COLS, PHOTO_GRID_ROWS, PHOTOS_PER_PAGE, PHOTO_LABEL_HEIGHT, PHOTO_TARGET_DPI,
     FONT_SIZE_TITLE, FONT_SIZE_HEADER, FONT_SIZE_NORMAL, FONT_SIZE_SMALL,
-    setup_fonts, draw_box, draw_text, draw_text_multiline, draw_image_fit,
-    calculate_text_height
+    setup_fonts, draw_box, draw_text, draw_text_multiline,
+    prepare_images, probe_images, draw_prepared_image, target_pixel_size, fit_size, track_release,
+    estimate_photo_memory, source_memory_bytes, PHOTO_WORKERS,
+    prepare_logo, draw_logo, compile_skeleton, draw_skeleton,
+    wrap_text, fit_font_size
 )
 import os
-import tempfile
-import shutil
 import uuid
 import re
+import pdf_cache
+import retention
+import metrics
+import admission
+from photo_cache import photo_digest
 
 # Base dizin
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(BASE_DIR, "generated_pdfs")
 LOGO_FILE = os.path.join(BASE_DIR, "Resim1.png")
+# Projeye özel logolar: logos/<proje>.png (ör. logos/arap-camii.png); yoksa LOGO_FILE kullanılır
+LOGO_DIR = os.path.join(BASE_DIR, "logos")
+LOGO_EXTENSIONS = (".png", ".jpg", ".jpeg")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None):
+# Bir raporda kabul edilen en fazla fotoğraf sayısı. Fotoğraflar sayfa sayfa
+# hazırlanıp bırakıldığı için bellek kullanımı bu sınırla büyümez.
+MAX_PHOTOS = int(os.environ.get("MAX_PHOTOS", 60))
+
+# Linearize (fast web view) çıktı: ilk sayfa (header ve YAPILAN İŞLER) fotoğraf
+# sayfaları inmeye devam ederken görüntülenebilir. ReportLab linearize edemediği için
+# PDF kaydedildikten sonra qpdf (pikepdf) ile yeniden yazılır; pikepdf yoksa atlanır.
+PDF_LINEARIZE = os.environ.get("PDF_LINEARIZE", "1") == "1"
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+    if PDF_LINEARIZE:
+        print("pikepdf bulunamadı: PDF'ler linearize edilmeden kaydedilecek")
+
+def linearize_enabled(linearize=None):
+    """Linearize modu açık ve kullanılabilir mi"""
+    if linearize is None:
+        linearize = PDF_LINEARIZE
+    return bool(linearize) and pikepdf is not None
+
+def linearize_pdf(pdf_filepath):
+    """PDF'i yerinde linearize et (fast web view); başarısız olursa orijinal kalır"""
+    temp_filepath = f"{pdf_filepath}.lin.tmp"
+    try:
+        with pikepdf.open(pdf_filepath) as pdf:
+            pdf.save(temp_filepath, linearize=True)
+        os.replace(temp_filepath, pdf_filepath)
+        return True
+    except Exception as e:
+        print(f"PDF linearize edilemedi: {e}")
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        return False
+
+def project_logo(proje):
+    """Projenin logosunu (logos/<proje>.png) döndür; yoksa varsayılan logo"""
+    if proje:
+        slug = re.sub(r"[^\w]+", "-", proje.lower()).strip("-")
+        for extension in LOGO_EXTENSIONS:
+            logo_path = os.path.join(LOGO_DIR, slug + extension)
+            if os.path.isfile(logo_path):
+                return logo_path
+    return LOGO_FILE
+
+# Logo kutusunun header sol kolonu içindeki boşluğu (çok az padding)
+LOGO_PADDING = 0.1*cm
+
+def logo_box():
+    """Header'daki logo kutusunun (genişlik, yükseklik) değerleri"""
+    header_col1_width = (PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT) * 0.25
+    return header_col1_width - 2*LOGO_PADDING, HEADER_HEIGHT - 2*LOGO_PADDING
+
+def prepare_project_logos():
+    """
+    Varsayılan logoyu ve logos/ altındaki proje logolarını header kutusu boyutunda
+    önceden hazırla (ısınma için; ilk rapor logo hazırlama maliyetini ödemez).
+    
+    Returns:
+        int - Hazırlanan logo sayısı
+    """
+    logo_paths = [LOGO_FILE]
+    if os.path.isdir(LOGO_DIR):
+        logo_paths += [os.path.join(LOGO_DIR, name) for name in sorted(os.listdir(LOGO_DIR))
+                       if name.lower().endswith(LOGO_EXTENSIONS)]
+    logo_width, logo_height = logo_box()
+    return sum(prepare_logo(path, logo_width, logo_height) is not None
+               for path in logo_paths if os.path.isfile(path))
+
+def logo_version(logo_path):
+    """Logo dosyasının sürümü (önbellek anahtarı için): dosya değişirse PDF'ler yeniden üretilir"""
+    try:
+        stat = os.stat(logo_path)
+    except OSError:
+        return None
+    return f"{os.path.basename(logo_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+# Fotoğrafın hücre içindeki kenar boşluğu (çok az padding)
+PHOTO_PADDING = 0.05*cm
+
+def photo_grid_geometry(top_y):
+    """
+    Verilen üst y koordinatından sayfa altına kadar uzanan fotoğraf grid'inin ölçülerini hesapla.
+    
+    Returns:
+        (hücre genişliği, hücre yüksekliği, görsel kutusu genişliği, görsel kutusu yüksekliği)
+    """
+    available_width = PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT  # Header ile hizalı
+    available_height = top_y - MARGIN_BOTTOM
+    photo_cell_width = available_width / PHOTO_GRID_COLS
+    photo_cell_height = (available_height - PHOTO_LABEL_HEIGHT * PHOTO_GRID_ROWS) / PHOTO_GRID_ROWS
+    photo_image_height = photo_cell_height - PHOTO_LABEL_HEIGHT
+    return (photo_cell_width, photo_cell_height,
+            photo_cell_width - 2*PHOTO_PADDING, photo_image_height - 2*PHOTO_PADDING)
+
+# ============================================================
+# SAYFA İSKELETLERİ
+# Değişmeyen çizimler süreç başına bir kez derlenir (bkz. compile_skeleton).
+# Koordinatlar bloğun sol alt köşesine göredir.
+# ============================================================
+
+def draw_header_skeleton(c, width, height):
+    """Header kutuları ve 2x2 bilgi tablosu, "GÜNLÜK FAALİYET RAPORU" bandı ve "YAPILAN İŞLER:" başlık kutusu"""
+    col1_width = width * 0.25
+    col2_width = width * 0.50
+    col3_width = width * 0.25
+    header_y = height - HEADER_HEIGHT
+    
+    draw_box(c, 0, header_y, col1_width, HEADER_HEIGHT)
+    draw_box(c, col1_width, header_y, col2_width, HEADER_HEIGHT)
+    col3_x = col1_width + col2_width
+    draw_box(c, col3_x, header_y, col3_width, HEADER_HEIGHT,
+            fill_color=colors.HexColor('#F5F5F5'))
+    
+    # Bilgi tablosunun iç çizgileri
+    cell_width = col3_width / 2
+    c.setStrokeColor(colors.black)
+    c.setLineWidth(0.5)
+    c.line(col3_x + cell_width, header_y, col3_x + cell_width, header_y + HEADER_HEIGHT)
+    c.line(col3_x, header_y + HEADER_TABLE_CELL_HEIGHT, col3_x + col3_width, header_y + HEADER_TABLE_CELL_HEIGHT)
+    
+    draw_box(c, 0, header_y - BAND_HEIGHT, width, BAND_HEIGHT,
+            fill_color=colors.HexColor('#D3D3D3'))
+    draw_box(c, 0, 0, width, WORKS_TITLE_HEIGHT,
+            fill_color=colors.HexColor('#F5F5F5'))
+
+def draw_works_tail_skeleton(c, width, height, empty_rows, row_height):
+    """Boş (altı çizgili) iş satırları ve altındaki "İMALAT FOTOĞRAFLARI" bandı"""
+    for i in range(empty_rows):
+        row_y = height - (i + 1) * row_height
+        draw_box(c, 0, row_y, width, row_height)
+        c.setStrokeColor(colors.grey)
+        c.setLineWidth(0.3)
+        line_y = row_y + row_height / 2
+        c.line(0.1*cm, line_y, width - 0.1*cm, line_y)
+    
+    draw_box(c, 0, 0, width, BAND_HEIGHT,
+            fill_color=colors.HexColor('#D3D3D3'))
+
+def draw_photo_grid_skeleton(c, width, height, cell_count, cell_width, cell_height):
+    """Sayfadaki ilk cell_count fotoğraf hücresi ve etiket kutuları (soldan sağa, yukarıdan aşağıya)"""
+    for index in range(cell_count):
+        row, col = divmod(index, PHOTO_GRID_COLS)
+        cell_x = col * cell_width
+        cell_y = height - (row + 1) * cell_height
+        draw_box(c, cell_x, cell_y, cell_width, cell_height)
+        draw_box(c, cell_x, cell_y, cell_width, PHOTO_LABEL_HEIGHT)
+
+def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None, target_dpi=None,
+                 photo_digests=None, linearize=None, photo_levels=None, stats=None):
     """
     Canvas ile manuel koordinatlarla PDF oluşturur.
     
     Args:
-        data: Dict - {"tarih": "...", "rapor_no": "...", "yapilan_isler": [...], "proje_basligi": "..."}
-        photo_files: List[str] - Fotoğraf dosya yolları
+        data: Dict - {"tarih": "...", "rapor_no": "...", "yapilan_isler": [...], "proje_basligi": "...", "proje": "..."}
+        photo_files: List - Fotoğraf kaynakları (dosya yolu, bayt dizisi veya stream)
         pdf_filepath: str - Çıktı PDF yolu
-        logo_path: str - Logo dosya yolu (opsiyonel)
+        logo_path: str - Logo dosya yolu (opsiyonel, varsayılan projenin logosu)
         base_dir: str - Proje base dizini (font yükleme için)
+        target_dpi: int - Fotoğrafların gömüleceği çözünürlük (varsayılan PHOTO_TARGET_DPI)
+        photo_digests: List[str] - Fotoğrafların SHA-256 özetleri (opsiyonel, türev önbelleği için)
+        linearize: bool - Linearize (fast web view) çıktı (varsayılan PDF_LINEARIZE)
+        photo_levels: List[(kalite, dpi)] - Fotoğraf başına JPEG kalitesi ve çözünürlük
+                      (opsiyonel, boyut bütçesi için; verilirse target_dpi yerine kullanılır)
+        stats: Dict - Verilirse gömülen fotoğraf baytları "photo_bytes" olarak yazılır
     
     Returns:
         bool - Başarılı ise True
     """
+    # Aşama süreleri (Server-Timing ve /metrics için)
+    stages = metrics.StageTimer()
     try:
         if base_dir is None:
             base_dir = BASE_DIR
@@ -49,7 +216,7 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
         font_regular, font_bold = setup_fonts(base_dir)
         
         if logo_path is None:
-            logo_path = LOGO_FILE
+            logo_path = project_logo(data.get("proje"))
         
         # Canvas oluştur
         c = canvas.Canvas(pdf_filepath, pagesize=A4)
@@ -59,6 +226,7 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
         photo_index = 0
         total_photos = len(photo_files)
         page_num = 0
+        photo_bytes = 0
         
         # ============================================================
         # İLK SAYFA: HEADER VE İÇERİK
@@ -73,47 +241,38 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
         header_col2_width = header_total_width * 0.50
         header_col3_width = header_total_width * 0.25
         
+        # Kutular, bilgi tablosu çizgileri, gri bant ve YAPILAN İŞLER başlık kutusu:
+        # tek bir önceden derlenmiş form
+        header_block_height = HEADER_HEIGHT + BAND_HEIGHT + WORKS_TITLE_HEIGHT
+        header_skeleton = compile_skeleton(draw_header_skeleton, header_total_width, header_block_height)
+        draw_skeleton(c, header_x, header_y - header_block_height, header_skeleton)
+        
         # Sol kolon: Logo
         col1_x = header_x
         col1_y = header_y - HEADER_HEIGHT
-        draw_box(c, col1_x, col1_y, header_col1_width, HEADER_HEIGHT)
         
         if logo_path and os.path.exists(logo_path):
             # Logo ortalanmış - alanı daha iyi kullan, fotoğraftaki gibi büyük
-            logo_padding = 0.1*cm  # Çok az padding
-            logo_width = header_col1_width - 2*logo_padding
-            logo_height = HEADER_HEIGHT - 2*logo_padding
-            logo_x = col1_x + logo_padding
-            logo_y = col1_y + logo_padding
-            draw_image_fit(c, logo_x, logo_y, logo_width, logo_height, logo_path)
+            logo_width, logo_height = logo_box()
+            logo_x = col1_x + LOGO_PADDING
+            logo_y = col1_y + LOGO_PADDING
+            # Logo süreç başına bir kez hazırlanır; her raporda yalnızca hazır akışlar gömülür
+            logo = prepare_logo(logo_path, logo_width, logo_height)
+            if logo is not None:
+                draw_logo(c, logo_x, logo_y, logo_width, logo_height, logo)
         
         # Orta kolon: Proje başlığı
         col2_x = col1_x + header_col1_width
         col2_y = col1_y
-        draw_box(c, col2_x, col2_y, header_col2_width, HEADER_HEIGHT)
         
         project_title = data.get("proje_basligi", "FETİHTEPE MERKEZ CAMİ'İ GÜÇLENDİRME VE YENİLEME PROJESİ")
         # Metni orta kolon genişliğine sığdır ve ortala
         title_max_width = header_col2_width - 0.3*cm
         
-        # Metni kelimelere böl ve satırlara ayır
-        words = project_title.split()
-        lines = []
-        current_line = ""
-        
-        for word in words:
-            test_line = current_line + (" " if current_line else "") + word
-            if c.stringWidth(test_line, font_bold, FONT_SIZE_TITLE) <= title_max_width:
-                current_line = test_line
-            else:
-                if current_line:
-                    lines.append(current_line)
-                current_line = word
-        if current_line:
-            lines.append(current_line)
+        # Metni satırlara ayır (sonuç önbellekten gelir)
+        lines, total_text_height = wrap_text(project_title, font_bold, FONT_SIZE_TITLE, title_max_width, 1.3)
         
         # Metni dikey olarak ortala
-        total_text_height = len(lines) * FONT_SIZE_TITLE * 1.3
         start_y = col2_y + HEADER_HEIGHT / 2 + total_text_height / 2 - FONT_SIZE_TITLE * 1.3
         
         # Her satırı ortala ve çiz
@@ -122,20 +281,10 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
             draw_text(c, col2_x + header_col2_width / 2, line_y, line, font_bold, FONT_SIZE_TITLE,
                      alignment='center', bold=True)
         
-        # Sağ kolon: Rapor bilgileri (2x2 tablo) - açık gri arka plan
+        # Sağ kolon: Rapor bilgileri (2x2 tablo) - kutu ve çizgiler iskelette
         col3_x = col2_x + header_col2_width
         col3_y = col1_y
-        draw_box(c, col3_x, col3_y, header_col3_width, HEADER_HEIGHT,
-                fill_color=colors.HexColor('#F5F5F5'))
-        
-        # İç tablo çizgileri
         cell_width = header_col3_width / 2
-        # Dikey çizgi - sağdan taşmaması için header_col3_width kullan
-        c.setStrokeColor(colors.black)
-        c.setLineWidth(0.5)
-        c.line(col3_x + cell_width, col3_y, col3_x + cell_width, col3_y + HEADER_HEIGHT)
-        # Yatay çizgi - sağdan taşmaması için header_col3_width kullan
-        c.line(col3_x, col3_y + HEADER_TABLE_CELL_HEIGHT, col3_x + header_col3_width, col3_y + HEADER_TABLE_CELL_HEIGHT)
         
         # Hücre içerikleri - küçük fontlar kullan, değerler sağdaki karşıdaki kutucuklarda
         cell_padding = 0.08*cm
@@ -156,8 +305,9 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
         tarih_text = data.get("tarih", "")
         tarih_font_size = header_small_font
         tarih_cell_width = cell_width - 2*cell_padding
-        while c.stringWidth(tarih_text, font_regular, tarih_font_size) > tarih_cell_width and tarih_font_size > 3:
-            tarih_font_size -= 0.5
+        # Sığan en büyük boyut (0.5 adımlarla, en az 3) tek ölçümle hesaplanır
+        tarih_font_size = fit_font_size(tarih_text, font_regular, tarih_cell_width, tarih_font_size,
+                                        min_size=3, step=0.5)
         draw_text(c, col3_x + cell_width + cell_width/2, col3_y + HEADER_TABLE_CELL_HEIGHT/2 - tarih_font_size/3,
                  tarih_text, font_regular, tarih_font_size, alignment='center')
         
@@ -172,8 +322,6 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
         # Gri band header ile sağdan hizalı olmalı (aynı genişlikte)
         header_right_edge = col3_x + header_col3_width
         band_width = header_total_width
-        draw_box(c, MARGIN_LEFT, band_y, band_width, BAND_HEIGHT,
-                fill_color=colors.HexColor('#D3D3D3'))
         # Metni gri bandın ortasına yerleştir
         band_center_x = MARGIN_LEFT + band_width / 2
         draw_text(c, band_center_x, band_y + BAND_HEIGHT / 2 - FONT_SIZE_HEADER / 3,
@@ -187,8 +335,6 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
         # ============================================================
         # Başlık - açık gri arka plan
         works_title_y = current_y - WORKS_TITLE_HEIGHT
-        draw_box(c, MARGIN_LEFT, works_title_y, band_width, WORKS_TITLE_HEIGHT,
-                fill_color=colors.HexColor('#F5F5F5'))
         draw_text(c, MARGIN_LEFT + 0.1*cm, works_title_y + WORKS_TITLE_HEIGHT / 2 - FONT_SIZE_NORMAL / 3,
                  "YAPILAN İŞLER:", font_bold, FONT_SIZE_NORMAL, bold=True, alignment='left')
         current_y = works_title_y  # Bitişik, boşluk yok
@@ -221,8 +367,9 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
             # Hücre içi padding (üst ve alt)
             cell_padding_vertical = 0.15*cm  # Üst ve alttan boşluk
             
-            # Metnin yüksekliğini hesapla (padding olmadan)
-            text_height = calculate_text_height(c, full_text, font_regular, FONT_SIZE_NORMAL, works_text_width)
+            # Satırları ve metnin yüksekliğini tek geçişte hesapla (padding olmadan)
+            # Çok uzun kelimeler karakter karakter bölünür; yükseklik çizilen satırlarla birebir aynıdır
+            wrapped_lines, text_height = wrap_text(full_text, font_regular, FONT_SIZE_NORMAL, works_text_width)
             # Hücre yüksekliği = metin yüksekliği + üst padding + alt padding
             row_height = max(text_height + 2*cell_padding_vertical, min_row_height)
             
@@ -235,43 +382,8 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
             draw_box(c, MARGIN_LEFT, row_y, band_width, row_height)
             
             # Metni word wrap ile hücrenin içine çiz
-            # Metnin gerçek yüksekliğini hesapla (satır sayısı * satır yüksekliği)
             line_height = FONT_SIZE_NORMAL * 1.2
             
-            # Gelişmiş satır bölme: Çok uzun kelimeleri de karakter karakter böler
-            def get_wrapped_lines(text, font, size, width):
-                words = text.split(' ')
-                lines = []
-                current_line = ''
-                for word in words:
-                    # Kelime tek başına genişlikten büyükse karakter karakter böl
-                    if c.stringWidth(word, font, size) > width:
-                        if current_line:
-                            lines.append(current_line)
-                            current_line = ''
-                        
-                        temp_word = ''
-                        for char in word:
-                            if c.stringWidth(temp_word + char, font, size) <= width:
-                                temp_word += char
-                            else:
-                                lines.append(temp_word)
-                                temp_word = char
-                        current_line = temp_word
-                    else:
-                        test_line = (current_line + ' ' + word).strip()
-                        if c.stringWidth(test_line, font, size) <= width:
-                            current_line = test_line
-                        else:
-                            if current_line:
-                                lines.append(current_line)
-                            current_line = word
-                if current_line:
-                    lines.append(current_line)
-                return lines
-
-            wrapped_lines = get_wrapped_lines(full_text, font_regular, FONT_SIZE_NORMAL, works_text_width)
-            
             # Metni hücrenin üstünden padding ile başlat
             # ReportLab'de y pozisyonu baseline'dır, bu yüzden font boyutunun bir kısmını ekliyoruz
             text_start_y = row_y + row_height - cell_padding_vertical - (FONT_SIZE_NORMAL * 0.3)
@@ -285,23 +397,11 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
             current_works_y = row_y
             total_used_height += row_height
         
-        # Boş satırları çiz (kalan alan için)
+        # Boş satırlar (altı çizgili, kalan alan için) ve "İMALAT FOTOĞRAFLARI" bandı:
+        # boş satır sayısı başına bir kez derlenen form
         remaining_height = max_total_height - total_used_height
         empty_rows_count = int(remaining_height / min_row_height)
-        
-        for i in range(empty_rows_count):
-            row_y = current_works_y - min_row_height
-            draw_box(c, MARGIN_LEFT, row_y, band_width, min_row_height)
-            
-            # Boş satır - altı çizgili görünüm (sadece boş hücrelerde)
-            c.setStrokeColor(colors.grey)
-            c.setLineWidth(0.3)
-            line_y = row_y + min_row_height / 2
-            c.line(works_text_x, line_y, 
-                   MARGIN_LEFT + band_width - 0.1*cm, line_y)
-            
-            current_works_y = row_y
-        
+        current_works_y -= empty_rows_count * min_row_height
         current_y = current_works_y  # Bitişik, boşluk yok
         
         # ============================================================
@@ -309,28 +409,53 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
         # Header ile aynı genişlikte olmalı
         # ============================================================
         photos_band_y = current_y - BAND_HEIGHT
-        draw_box(c, MARGIN_LEFT, photos_band_y, band_width, BAND_HEIGHT,
-                fill_color=colors.HexColor('#D3D3D3'))
+        tail_skeleton = compile_skeleton(draw_works_tail_skeleton, band_width,
+                                         empty_rows_count * min_row_height + BAND_HEIGHT,
+                                         empty_rows_count, min_row_height)
+        draw_skeleton(c, MARGIN_LEFT, photos_band_y, tail_skeleton)
         photos_band_center_x = MARGIN_LEFT + band_width / 2
         draw_text(c, photos_band_center_x, photos_band_y + BAND_HEIGHT / 2 - FONT_SIZE_HEADER / 3,
                  "İMALAT FOTOĞRAFLARI", font_bold, FONT_SIZE_HEADER,
                  alignment='center', bold=True)
         current_y = photos_band_y  # Bitişik, boşluk yok
+        stages.lap("layout")
         
         # ============================================================
         # FOTOĞRAF GRID (2x4) - Tüm sayfalar için
         # Header ile aynı genişlikte olmalı
+        # Fotoğraflar sayfa sayfa hazırlanır: yalnızca o sayfanın (en fazla
+        # PHOTOS_PER_PAGE) görselleri paralel decode/resize/encode edilir, çizilir ve
+        # bırakılır. Böylece bellekteki hazır görsel sayısı fotoğraf sayısından bağımsızdır.
+        # Her fotoğraf, yerleşeceği hücrenin hedef DPI'daki piksel boyutuna küçültülür.
         # ============================================================
         while photo_index < total_photos:
-            available_width = band_width  # Header ile hizalı
-            available_height = current_y - MARGIN_BOTTOM
-            photo_cell_width = available_width / PHOTO_GRID_COLS
-            photo_cell_height = (available_height - PHOTO_LABEL_HEIGHT * PHOTO_GRID_ROWS) / PHOTO_GRID_ROWS
-            photo_image_height = photo_cell_height - PHOTO_LABEL_HEIGHT
+            photo_cell_width, photo_cell_height, image_width, image_height = photo_grid_geometry(current_y)
+            
+            page_start = photo_index
+            page_end = min(page_start + PHOTOS_PER_PAGE, total_photos)
+            if photo_levels is None:
+                page_targets = [target_pixel_size(image_width, image_height, dpi=target_dpi)] * (page_end - page_start)
+                page_qualities = None
+            else:
+                page_levels = photo_levels[page_start:page_end]
+                page_targets = [target_pixel_size(image_width, image_height, dpi=dpi) for _, dpi in page_levels]
+                page_qualities = [quality for quality, _ in page_levels]
+            prepared_photos = prepare_images(
+                photo_files[page_start:page_end],
+                page_targets,
+                photo_digests[page_start:page_end] if photo_digests is not None else None,
+                page_qualities)
+            stages.lap("photos")
             
             grid_start_y = current_y
             photos_on_this_page = 0
             
+            # Hücre ve etiket kutuları: aynı geometri ve hücre sayısındaki sayfalar aynı formu paylaşır
+            grid_skeleton = compile_skeleton(draw_photo_grid_skeleton,
+                                             PHOTO_GRID_COLS * photo_cell_width, PHOTO_GRID_ROWS * photo_cell_height,
+                                             page_end - page_start, photo_cell_width, photo_cell_height)
+            draw_skeleton(c, MARGIN_LEFT, grid_start_y - grid_skeleton.height, grid_skeleton)
+            
             for row in range(PHOTO_GRID_ROWS):
                 for col in range(PHOTO_GRID_COLS):
                     if photo_index >= total_photos:
@@ -339,22 +464,25 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
                     cell_x = MARGIN_LEFT + col * photo_cell_width
                     cell_y = grid_start_y - (row + 1) * photo_cell_height
                     
-                    # Hücre kenarlığı
-                    draw_box(c, cell_x, cell_y, photo_cell_width, photo_cell_height)
-                    
                     # Fotoğraf - çok az padding ekle (yukarı ve aşağıdan)
-                    photo_path = photo_files[photo_index]
-                    photo_padding = 0.05*cm  # Çok az padding
-                    image_y = cell_y + PHOTO_LABEL_HEIGHT + photo_padding
-                    image_height = photo_image_height - 2*photo_padding
-                    if os.path.exists(photo_path):
-                        draw_image_fit(c, cell_x + photo_padding, image_y, photo_cell_width - 2*photo_padding, image_height, photo_path)
+                    prepared = prepared_photos[photo_index - page_start]
+                    image_y = cell_y + PHOTO_LABEL_HEIGHT + PHOTO_PADDING
+                    if prepared is not None:
+                        draw_prepared_image(c, cell_x + PHOTO_PADDING, image_y, image_width, image_height, prepared)
+                        # Canvas JPEG baytlarını kopyaladı; referansı hemen bırak
+                        prepared_photos[photo_index - page_start] = None
+                        photo_bytes += len(prepared.jpeg_bytes)
+                        track_release(len(prepared.jpeg_bytes))
+                    else:
+                        # İşlenemeyen (bozuk veya bütçeyi aşan) fotoğraf için bilgi notu
+                        metrics.count("photos_failed")
+                        draw_text(c, cell_x + photo_cell_width / 2, image_y + image_height / 2,
+                                 "Fotoğraf işlenemedi", font_regular, FONT_SIZE_SMALL,
+                                 color=colors.grey, alignment='center')
                     
-                    # Fotoğraf etiketi - üstünde çizgi ile kutunun içindeymiş gibi
+                    # Fotoğraf etiketi - kutusu iskelette, üstünde çizgi ile kutunun içindeymiş gibi
                     label_y = cell_y
                     label_box_height = PHOTO_LABEL_HEIGHT
-                    # Etiket kutusu çiz
-                    draw_box(c, cell_x, label_y, photo_cell_width, label_box_height)
                     # Etiket metni
                     label_text = f"FOTO-{photo_index + 1}"
                     draw_text(c, cell_x + photo_cell_width / 2, label_y + label_box_height / 2 - FONT_SIZE_SMALL / 3,
@@ -369,6 +497,7 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
             # Sayfayı bitir
             c.showPage()
             page_num += 1
+            stages.lap("draw")
             
             # Eğer daha fazla fotoğraf varsa yeni sayfa başlat
             if photo_index < total_photos:
@@ -378,9 +507,21 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
         
         # PDF'i kaydet
         c.save()
+        stages.lap("save")
+        
+        if linearize_enabled(linearize):
+            linearize_pdf(pdf_filepath)
+            stages.lap("linearize")
+        
+        if stats is not None:
+            stats["photo_bytes"] = photo_bytes
         
         if os.path.exists(pdf_filepath) and os.path.getsize(pdf_filepath) > 0:
             print(f"PDF başarıyla oluşturuldu: {pdf_filepath}")
+            metrics.count("photos", total_photos)
+            # Fotoğrafsız raporda showPage çağrılmaz; save() ilk sayfayı kendisi kapatır
+            metrics.count("pages", max(page_num, 1))
+            metrics.count("output_bytes", os.path.getsize(pdf_filepath))
             return True
         return False
         
@@ -389,59 +530,290 @@ def generate_pdf(data, photo_files, pdf_filepath, logo_path=None, base_dir=None)
         import traceback
         traceback.print_exc()
         return False
+    finally:
+        stages.close()
+
+# ============================================================
+# BOYUT BÜTÇESİ
+# ============================================================
+# E-posta eklerinin boyut sınırı için: istenen en büyük PDF boyutuna göre her
+# fotoğrafın JPEG kalitesi ve çözünürlüğü seçilir. Önce normal ayarlarla render
+# edilir; sığmazsa fotoğraflar küçük kopyaları üzerinden bir kez ölçülür, fotoğraf
+# başına bayt tavanı ikili aramayla bulunur ve yeniden render edilir. Sade
+# fotoğraflar yüksek kalitede kalırken yalnızca detaylı olanlar küçültülür.
+
+# Varsayılan boyut bütçesi (KB, 0 = kapalı); istekte max_boyut_kb ile verilebilir
+PDF_SIZE_BUDGET_KB = int(os.environ.get("PDF_SIZE_BUDGET_KB", 0))
+# Fotoğraf başına (JPEG kalitesi, hedef DPI oranı) basamakları, en iyiden en küçüğe
+BUDGET_LEVELS = ((75, 1.0), (65, 1.0), (55, 0.85), (45, 0.7), (40, 0.6), (35, 0.5), (30, 0.4))
+# Ölçüm kopyasının çözünürlüğü (hedef DPI'ya oranı)
+BUDGET_PROBE_SCALE = 0.5
+# Bütçeye sığdırmak için en fazla render sayısı (ilk normal render dahil)
+BUDGET_MAX_PASSES = 3
 
-def generate_report(data, photos):
+def estimate_photo_bytes(probes, dpi, exponent=1.0):
     """
-    Form'dan gelen data ve fotoğrafları kullanarak PDF oluşturur.
+    Fotoğrafların her basamaktaki JPEG boyutunu ölçümlerinden (bkz. probe_image) tahmin et.
+    Boyut piksel sayısının kuvveti olarak modellenir: bpp * P * (N / P) ** exponent
+    (P: ölçülen kopyanın, N: basamağın piksel sayısı). Üs fotoğrafların detay yapısına
+    bağlıdır; ilk render'da gerçekten gömülen baytlardan kestirilir (bkz. fit_size_exponent).
+    Tahmin tam sayfa grid hücresine göre yapılır; ölçülemeyen fotoğraflar 0 sayılır.
+    
+    Returns:
+        List[List[float]] - fotoğraf başına, BUDGET_LEVELS sırasıyla tahmini bayt
+    """
+    _, _, image_width, image_height = photo_grid_geometry(PAGE_HEIGHT - MARGIN_TOP)
+    estimates = []
+    for probe in probes:
+        if probe is None:
+            estimates.append([0] * len(BUDGET_LEVELS))
+            continue
+        (source_width, source_height), (probe_width, probe_height), bytes_per_pixel = probe
+        probe_pixels = probe_width * probe_height
+        sizes = []
+        for quality, scale in BUDGET_LEVELS:
+            width, height = fit_size(source_width, source_height,
+                                     *target_pixel_size(image_width, image_height, dpi=dpi * scale))
+            size = bytes_per_pixel[quality] * probe_pixels * (width * height / probe_pixels) ** exponent
+            # Basamaklar küçülen sırada kalmalı (ikili arama buna dayanır)
+            sizes.append(min(size, sizes[-1]) if sizes else size)
+        estimates.append(sizes)
+    return estimates
+
+def fit_size_exponent(probes, dpi, photo_bytes, low=0.5, high=1.5):
+    """Tahmini ilk basamak toplamını gerçekten gömülen baytlara eşitleyen üssü ikiye bölmeyle bul"""
+    for _ in range(20):
+        exponent = (low + high) / 2
+        if sum(sizes[0] for sizes in estimate_photo_bytes(probes, dpi, exponent)) < photo_bytes:
+            low = exponent
+        else:
+            high = exponent
+    return (low + high) / 2
+
+def plan_photo_levels(estimates, photo_budget):
+    """
+    Fotoğraf başına bayt tavanını ikili aramayla bul: her fotoğraf tahmini tavanı
+    aşmayan en iyi basamağı alır; tavan, toplam tahminin bütçeye sığdığı en büyük değerdir.
+    Kalan pay fotoğrafları tek tek bir basamak iyileştirmeye harcanır.
+    
+    Args:
+        estimates: List[List[float]] - estimate_photo_bytes sonucu
+        photo_budget: float - Fotoğraflara ayrılan toplam bayt
+    
+    Returns:
+        List[int] - fotoğraf başına BUDGET_LEVELS indeksi
+    """
+    def levels_for(cap):
+        return [next((i for i, size in enumerate(sizes) if size <= cap), len(sizes) - 1)
+                for sizes in estimates]
+    
+    caps = sorted({size for sizes in estimates for size in sizes})
+    best = levels_for(-1)  # Hiçbir tavan sığmazsa: hepsi en küçük basamakta
+    low, high = 0, len(caps) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        levels = levels_for(caps[mid])
+        if sum(sizes[level] for sizes, level in zip(estimates, levels)) <= photo_budget:
+            best = levels
+            low = mid + 1
+        else:
+            high = mid - 1
+    
+    # Benzer fotoğraflar basamak değiştirirken birlikte atlar; kalan pay en çok
+    # küçültülmüş fotoğraflardan başlayarak birer basamak iyileştirmeye harcanır
+    spare = photo_budget - sum(sizes[level] for sizes, level in zip(estimates, best))
+    improved = True
+    while improved:
+        improved = False
+        for index in sorted(range(len(best)), key=lambda i: -best[i]):
+            level = best[index]
+            if level > 0 and estimates[index][level - 1] - estimates[index][level] <= spare:
+                spare -= estimates[index][level - 1] - estimates[index][level]
+                best[index] = level - 1
+                improved = True
+    return best
+
+def generate_pdf_within_budget(data, photo_files, pdf_filepath, max_bytes, target_dpi=None,
+                               photo_digests=None, linearize=None):
+    """
+    PDF'i en fazla max_bytes boyutunda üret (bkz. BOYUT BÜTÇESİ).
+    Fotoğraflar en küçük basamakta bile sığmıyorsa en küçük hali üretilir.
+    
+    Returns:
+        int - Elde edilen PDF boyutu (bayt), başarısızsa None
+    """
+    stats = {}
+    if not generate_pdf(data, photo_files, pdf_filepath, target_dpi=target_dpi,
+                        photo_digests=photo_digests, linearize=linearize, stats=stats):
+        return None
+    size = os.path.getsize(pdf_filepath)
+    passes = 1
+    
+    if size > max_bytes and photo_files:
+        stages = metrics.StageTimer()
+        dpi = target_dpi or PHOTO_TARGET_DPI
+        _, _, image_width, image_height = photo_grid_geometry(PAGE_HEIGHT - MARGIN_TOP)
+        probe_target = target_pixel_size(image_width, image_height, dpi=dpi * BUDGET_PROBE_SCALE)
+        qualities = sorted({quality for quality, _ in BUDGET_LEVELS}, reverse=True)
+        probes = probe_images(photo_files, [probe_target] * len(photo_files), qualities)
+        estimates = estimate_photo_bytes(probes, dpi, fit_size_exponent(probes, dpi, stats["photo_bytes"]))
+        stages.lap("budget")
+        stages.close()
+        levels = [0] * len(photo_files)
+        while size > max_bytes and passes < BUDGET_MAX_PASSES:
+            # Metin, font ve sayfa yapısının payı fotoğraflardan bağımsızdır; kalan tahmin
+            # hatası son render'da gerçekten gömülen fotoğraf baytlarıyla düzeltilir
+            overhead = size - stats["photo_bytes"]
+            planned = sum(sizes[level] for sizes, level in zip(estimates, levels))
+            calibration = stats["photo_bytes"] / planned if planned and stats["photo_bytes"] else 1.0
+            new_levels = plan_photo_levels(estimates, (max_bytes - overhead) / calibration)
+            if passes == BUDGET_MAX_PASSES - 1:
+                # Son izinli render: sığmadıysa en küçük ayarlar denenmiş olsun
+                new_levels = [len(BUDGET_LEVELS) - 1] * len(levels)
+            if new_levels == levels:
+                # Tahmin yetersiz kaldı: her fotoğrafı bir basamak küçült
+                new_levels = [min(level + 1, len(BUDGET_LEVELS) - 1) for level in levels]
+                if new_levels == levels:
+                    break
+            levels = new_levels
+            photo_levels = [(BUDGET_LEVELS[level][0], dpi * BUDGET_LEVELS[level][1]) for level in levels]
+            stats = {}
+            if not generate_pdf(data, photo_files, pdf_filepath, photo_digests=photo_digests,
+                                linearize=linearize, photo_levels=photo_levels, stats=stats):
+                return None
+            size = os.path.getsize(pdf_filepath)
+            passes += 1
+            metrics.count("budget_rerenders")
+    
+    if size <= max_bytes:
+        status = "sığdı"
+    elif photo_files and levels != [len(BUDGET_LEVELS) - 1] * len(photo_files):
+        status = "render sınırına ulaşıldı, aşıldı"
+    else:
+        status = "en küçük ayarlarla bile aşıldı"
+    print(f"Boyut bütçesi {max_bytes / 1024:.0f} KB: {size / 1024:.0f} KB ({status}, {passes} render)")
+    return size
+
+# ============================================================
+# RENDER BELLEK TAHMİNİ (KABUL KONTROLÜ İÇİN)
+# ============================================================
+
+# Render başına sabit bellek payı (canvas, PDF tamponu, yazı ve sayfa nesneleri)
+REPORT_BASE_MEMORY = int(os.environ.get("REPORT_BASE_MEMORY_MB", 16)) * 1024 * 1024
+
+def estimate_report_memory(photo_sources, target_dpi=None):
+    """
+    Render'ın tepe bellek maliyetini upload boyutları ve görsel header'larından tahmin et
+    (pikseller decode edilmez). Fotoğraflar sayfa sayfa, PHOTO_WORKERS thread'le
+    hazırlandığı için aynı anda en fazla o kadar bitmap bellektedir; en pahalıları sayılır.
+    
+    Returns:
+        int - Tahmini bayt
+    """
+    _, _, image_width, image_height = photo_grid_geometry(PAGE_HEIGHT - MARGIN_TOP)
+    target = target_pixel_size(image_width, image_height, dpi=target_dpi)
+    photo_costs = sorted((estimate_photo_memory(source, target) for source in photo_sources), reverse=True)
+    concurrent = min(PHOTO_WORKERS, PHOTOS_PER_PAGE)
+    return (REPORT_BASE_MEMORY
+            + sum(source_memory_bytes(source) for source in photo_sources)
+            + sum(photo_costs[:concurrent]))
+
+def render_report(data, photo_sources, max_bytes=None, background=False):
+    """
+    Rapor verisi ve fotoğraf kaynaklarından OUTPUT_DIR altında PDF oluşturur.
+    Aynı veri ve fotoğraflarla daha önce oluşturulmuş PDF varsa yeniden render edilmez.
     
     Args:
         data: Dict - {"tarih": "...", "rapor_no": "...", "yapilan_isler": [...]}
-        photos: Flask FileStorage listesi (fotoğraflar)
+        photo_sources: List - Fotoğraf kaynakları (dosya yolu, bayt dizisi veya stream)
+        max_bytes: int - En büyük PDF boyutu (opsiyonel, bkz. BOYUT BÜTÇESİ;
+                   varsayılan PDF_SIZE_BUDGET_KB)
+        background: bool - Asenkron iş / toplu render: bellek bütçesi için daha uzun bekler
     
     Returns:
         PDF dosyasının yolu
+    
+    Raises:
+        admission.AdmissionRejected: Bellek bütçesi dolu (bkz. admission)
     """
-    safe_date = re.sub(r"[^\d.]", "", data["tarih"])
+    if max_bytes is None and PDF_SIZE_BUDGET_KB > 0:
+        max_bytes = PDF_SIZE_BUDGET_KB * 1024
+    stages = metrics.StageTimer()
+    # Fotoğraf özetleri bir kez hesaplanır: PDF önbellek anahtarı ve türev önbelleği için
+    photo_digests = [photo_digest(source) for source in photo_sources]
+    # Bütçe yalnızca verildiğinde anahtara girer (bütçesiz raporların anahtarı değişmez)
+    budget_option = {"max_bytes": max_bytes} if max_bytes else {}
+    cache_key = pdf_cache.report_cache_key(data, photo_digests, linearize=linearize_enabled(),
+                                           logo=logo_version(project_logo(data.get("proje"))),
+                                           **budget_option)
+    pdf_filename = pdf_cache.cached_filename(data, cache_key)
+    
+    cached_path = pdf_cache.lookup(OUTPUT_DIR, pdf_filename)
+    stages.lap("digest")
+    stages.close()
+    metrics.count("reports")
+    if cached_path:
+        print(f"PDF önbellekten döndürüldü: {cached_path}")
+        metrics.count("cache_hits")
+        metrics.flush()
+        return cached_path
+    
+    pdf_filepath = os.path.join(OUTPUT_DIR, pdf_filename)
+    # Önce geçici ada yaz, bitince atomik olarak taşı (yarım dosya servis edilmesin)
+    temp_filepath = f"{pdf_filepath}.{uuid.uuid4().hex[:8]}.tmp"
     
-    # Geçici dizin oluştur
-    temp_dir = tempfile.mkdtemp()
+    print(f"PDF oluşturma başlıyor: {pdf_filepath}")
     
     try:
-        # Fotoğrafları geçici dizine kaydet
-        photo_files = []
-        for i, photo in enumerate(photos[:8]):
-            if photo and photo.filename:
-                # Dosya uzantısını al veya varsayılan .jpg kullan
-                ext = os.path.splitext(photo.filename)[1].lower()
-                if ext not in ['.jpg', '.jpeg', '.png', '.webp']:
-                    ext = '.jpg'
-                
-                temp_photo_path = os.path.join(temp_dir, f"photo_{i+1}{ext}")
-                
-                # Dosyayı kaydet ve hemen kapat (memory için)
-                photo.save(temp_photo_path)
-                photo.close() # Flask FileStorage nesnesini kapat
-                
-                photo_files.append(temp_photo_path)
-
-        # PDF oluştur
-        pdf_filename = f"rapor-{safe_date}-{uuid.uuid4().hex[:8]}.pdf"
-        pdf_filepath = os.path.join(OUTPUT_DIR, pdf_filename)
-        
-        print(f"PDF oluşturma başlıyor: {pdf_filepath}")
-        
-        pdf_created = generate_pdf(data, photo_files, pdf_filepath)
+        # Render tahmini belleği bütçeye sığana kadar bekler (önbellek isabetleri beklemez)
+        with admission.admitted(estimate_report_memory(photo_sources), background=background):
+            if max_bytes:
+                pdf_created = generate_pdf_within_budget(data, photo_sources, temp_filepath, max_bytes,
+                                                         photo_digests=photo_digests) is not None
+            else:
+                pdf_created = generate_pdf(data, photo_sources, temp_filepath, photo_digests=photo_digests)
         
         if not pdf_created:
             raise Exception("PDF oluşturulamadı.")
-
-        return pdf_filepath
-
+        
+        os.replace(temp_filepath, pdf_filepath)
     finally:
-        # Geçici dizini ve içindeki her şeyi temizle
-        try:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-        except Exception as e:
-            print(f"Geçici dizin temizleme hatası: {e}")
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+    
+    # Saklama sınırlarını yazım anında kontrol et (az önce yazılan dosya hariç)
+    retention.enforce(OUTPUT_DIR, keep=pdf_filepath)
+    metrics.flush()
+    return pdf_filepath
 
+def generate_report(data, photos, max_bytes=None):
+    """
+    Form'dan gelen data ve fotoğrafları kullanarak PDF oluşturur.
+    Fotoğraflar diske kopyalanmaz; upload stream'leri doğrudan decode edilir.
+    
+    Args:
+        data: Dict - {"tarih": "...", "rapor_no": "...", "yapilan_isler": [...]}
+        photos: Flask FileStorage listesi (fotoğraflar)
+        max_bytes: int - En büyük PDF boyutu (opsiyonel, bkz. render_report)
+    
+    Returns:
+        PDF dosyasının yolu
+    """
+    # Upload stream'lerini doğrudan kaynak olarak kullan (geçici dosya yok)
+    uploads = [photo for photo in photos if photo and photo.filename]
+    if len(uploads) > MAX_PHOTOS:
+        print(f"Uyarı: {len(uploads)} fotoğraftan yalnızca ilk {MAX_PHOTOS} tanesi kullanılacak")
+        for photo in uploads[MAX_PHOTOS:]:
+            photo.close()
+        uploads = uploads[:MAX_PHOTOS]
+    photo_sources = [photo.stream for photo in uploads]
+    
+    try:
+        return render_report(data, photo_sources, max_bytes=max_bytes)
+    finally:
+        # Upload nesnelerini kapat (memory için)
+        for photo in uploads:
+            try:
+                photo.close()
+            except Exception as e:
+                print(f"Upload kapatma hatası: {e}")
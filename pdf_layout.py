@@ -4,15 +4,31 @@ from reportlab.lib import colors
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfdoc import PDFImageXObject, PDFStream, PDFName, PDFArray
+from reportlab.pdfgen.canvas import Canvas
+from reportlab import rl_config
 from PIL import Image as PILImage
-from PIL import ImageOps
+import io
+import math
 import os
-import tempfile
 import gc
+import hashlib
+import threading
+import zlib
+import time
+from collections import namedtuple
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import photo_cache
+import metrics
 
 # A4 boyutları
 PAGE_WIDTH, PAGE_HEIGHT = A4
 
+# PDF akışları ASCII85 ile sarılmaz: ikili akışları %25 büyütür (fotoğraf JPEG'leri dahil)
+# ve linearize (qpdf) bu katmanı DCT akışlarından kaldırmaz
+rl_config.useA85 = 0
+
 # ============================================================
 # LAYOUT SABİTLERİ
 # ============================================================
@@ -50,6 +66,16 @@ PHOTO_GRID_ROWS = 4
 PHOTOS_PER_PAGE = PHOTO_GRID_COLS * PHOTO_GRID_ROWS
 PHOTO_LABEL_HEIGHT = 0.4 * cm
 
+# Fotoğrafların gömüleceği çözünürlük (150: ekran, 300: baskı)
+# Piksel boyutu hücre geometrisinden bu DPI ile hesaplanır
+PHOTO_TARGET_DPI = int(os.environ.get("PHOTO_TARGET_DPI", 150))
+
+# Fotoğraf başına decode bütçesi (512MB RAM'de worker'ın OOM ile öldürülmemesi için)
+# PHOTO_MAX_PIXELS: kabul edilen en büyük kaynak çözünürlük (header'dan, draft sonrası)
+# PHOTO_MAX_DECODE_MB: decode edilen bitmap'in kaplayabileceği en fazla bellek
+PHOTO_MAX_PIXELS = int(os.environ.get("PHOTO_MAX_PIXELS", 60_000_000))
+PHOTO_MAX_DECODE_BYTES = int(os.environ.get("PHOTO_MAX_DECODE_MB", 64)) * 1024 * 1024
+
 # Font boyutları (tüm fontlar küçültüldü)
 FONT_SIZE_TITLE = 7  # Orta başlık
 FONT_SIZE_HEADER = 8  # Gri bant başlıkları
@@ -60,23 +86,144 @@ FONT_SIZE_SMALL = 6  # Küçük metin
 # FONT YÜKLEME
 # ============================================================
 
+def current_rss_kb():
+    """Sürecin o anki RSS değerini KB olarak döndür (Linux dışında tepe değer)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * (os.sysconf("SC_PAGE_SIZE") // 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# Süreç genelinde font kaydı: her font yüzü süreç başına bir kez parse edilir.
+# gunicorn --preload ile fork'tan önce yüklenirse worker'lar bu sayfaları
+# copy-on-write olarak paylaşır.
+_FONT_REGISTRY = {}  # font adı -> TTFont
+_FONT_STATS = {}  # font adı -> {"path", "load_ms", "memory_kb"}
+_font_lock = threading.Lock()
+
+# Glif ilerleme tabloları: font adı -> kod noktasıyla indekslenen düz genişlik dizisi
+# (1000 birimlik em). Font yüklenirken bir kez kurulur; ölçüm dizi okuma + toplamdır.
+# BMP dışındaki nadir karakterler fontun charWidths sözlüğünden okunur.
+_ADVANCE_TABLES = {}
+ADVANCE_TABLE_SIZE = 0x10000
+
+def _build_advance_table(font):
+    """Fontun BMP karakter genişliklerini düz bir listeye aç"""
+    # array('f') her okumada yeni float üretir; hazır float nesneli liste daha hızlı
+    face = font.face
+    table = [face.defaultWidth] * ADVANCE_TABLE_SIZE
+    for code, width in face.charWidths.items():
+        if code < ADVANCE_TABLE_SIZE:
+            table[code] = width
+    return table
+
+def register_font(font_name, font_path):
+    """Fontu süreç başına bir kez yükle ve kaydet, TTFont nesnesini döndür"""
+    font = _FONT_REGISTRY.get(font_name)
+    if font is not None:
+        return font
+
+    with _font_lock:
+        font = _FONT_REGISTRY.get(font_name)
+        if font is not None:
+            return font
+
+        if not os.path.exists(font_path):
+            raise FileNotFoundError(f"{os.path.basename(font_path)} bulunamadı!")
+
+        # Parse süresini ve RSS artışını ölç (tracemalloc parse'ı çok yavaşlatır)
+        rss_before = current_rss_kb()
+        start = time.perf_counter()
+
+        font = TTFont(font_name, font_path)
+        pdfmetrics.registerFont(font)
+        _ADVANCE_TABLES[font_name] = _build_advance_table(font)
+
+        load_ms = (time.perf_counter() - start) * 1000
+        memory_kb = max(current_rss_kb() - rss_before, 0)
+
+        _FONT_STATS[font_name] = {
+            "path": font_path,
+            "load_ms": round(load_ms, 2),
+            "memory_kb": round(memory_kb, 1),
+        }
+        _FONT_REGISTRY[font_name] = font
+        print(f"Font yüklendi: {font_name} ({load_ms:.1f} ms, {memory_kb:.0f} KB)")
+        return font
+
 def setup_fonts(base_dir):
-    """DejaVuSans fontlarını yükle"""
-    dejavu_regular = os.path.join(base_dir, "DejaVuSans.ttf")
-    dejavu_bold = os.path.join(base_dir, "DejaVuSans-Bold.ttf")
-    
-    if os.path.exists(dejavu_regular):
-        pdfmetrics.registerFont(TTFont('DejaVuSans', dejavu_regular))
-    else:
-        raise FileNotFoundError("DejaVuSans.ttf bulunamadı!")
-    
-    if os.path.exists(dejavu_bold):
-        pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', dejavu_bold))
-    else:
-        raise FileNotFoundError("DejaVuSans-Bold.ttf bulunamadı!")
-    
+    """DejaVuSans fontlarını yükle (süreç başına bir kez)"""
+    register_font('DejaVuSans', os.path.join(base_dir, "DejaVuSans.ttf"))
+    register_font('DejaVuSans-Bold', os.path.join(base_dir, "DejaVuSans-Bold.ttf"))
+    # Canvas'ın varsayılan fontu (Helvetica) ve kodlaması ilk kullanımda ReportLab'in
+    # global kaydına eklenir; burada önceden yüklenir ki istek sırasında (gthread
+    # worker'larında eşzamanlı) global kayıt değişmesin. Kayıtlıysa yalnızca sözlük okumasıdır.
+    pdfmetrics.getFont(rl_config.canvas_basefontname)
     return 'DejaVuSans', 'DejaVuSans-Bold'
 
+def get_font_metrics(font_name):
+    """Kayıtlı fontun metriklerini döndür (1000 birimlik em üzerinden)"""
+    font = _FONT_REGISTRY.get(font_name)
+    if font is None:
+        raise KeyError(f"Font kayıtlı değil: {font_name}")
+    face = font.face
+    return {
+        "ascent": face.ascent,
+        "descent": face.descent,
+        "cap_height": face.capHeight,
+        "default_width": face.defaultWidth,
+        "char_widths": face.charWidths,
+    }
+
+def font_setup_stats():
+    """Font yükleme maliyetlerini döndür (süre ve bellek)"""
+    stats = {name: dict(values) for name, values in _FONT_STATS.items()}
+    return {
+        "fonts": stats,
+        "total_load_ms": round(sum(s["load_ms"] for s in stats.values()), 2),
+        "total_memory_kb": round(sum(s["memory_kb"] for s in stats.values()), 1),
+    }
+
+def _advance_units(text, font_name):
+    """Metnin toplam ilerleme genişliği (1000 birim/em); tablo yoksa None"""
+    table = _ADVANCE_TABLES.get(font_name)
+    if table is None:
+        return None
+    try:
+        return sum(map(table.__getitem__, map(ord, text)))
+    except IndexError:
+        face = _FONT_REGISTRY[font_name].face
+        return sum(face.charWidths.get(code, face.defaultWidth) for code in map(ord, text))
+
+def string_width(text, font_name, font_size):
+    """Metin genişliği (pt) - canvas.stringWidth ile aynı sonuç, tablo okumasıyla"""
+    units = _advance_units(text, font_name)
+    if units is None:
+        # register_font ile yüklenmemiş fontlar (ör. Helvetica) için ReportLab'e düş
+        return pdfmetrics.stringWidth(text, font_name, font_size)
+    return units * 0.001 * font_size
+
+def fit_font_size(text, font_name, max_width, max_size, min_size=3, step=0.5):
+    """
+    Metnin max_width'e sığdığı en büyük font boyutunu doğrudan hesapla.
+    
+    Boyutlar max_size'dan step adımlarıyla iner ve min_size'ın altına düşmez
+    (sığmasa bile min_size döner). Genişlik boyutla doğrusal olduğu için deneme
+    döngüsü yerine tek ölçüm yeterlidir.
+    """
+    units = _advance_units(text, font_name)
+    if units is None:
+        units = pdfmetrics.stringWidth(text, font_name, 1000)
+    if units * 0.001 * max_size <= max_width:
+        return max_size
+    exact_size = max_width * 1000 / units
+    size = max_size - step * math.ceil((max_size - exact_size) / step)
+    # Kayan nokta yuvarlaması sınırdaki boyutu bir adım büyük bırakabilir
+    if units * 0.001 * size > max_width:
+        size -= step
+    return max(size, min_size)
+
 # ============================================================
 # HELPER FONKSİYONLAR
 # ============================================================
@@ -113,6 +260,62 @@ def draw_text(canvas, x, y, text, font_name, font_size, color=colors.black,
     else:  # left
         canvas.drawString(x, y, text)
 
+# Satır kırma sonuçları (metin, font, boyut, genişlik) anahtarıyla süreç içinde saklanır;
+# aynı iş maddeleri ve proje başlıkları her raporda tekrar ölçülmez
+WRAP_CACHE_SIZE = int(os.environ.get("WRAP_CACHE_SIZE", 4096))
+
+@lru_cache(maxsize=WRAP_CACHE_SIZE)
+def wrap_text(text, font_name, font_size, max_width, leading=1.2):
+    """
+    Metni tek geçişte satırlara böl ve yüksekliğini hesapla.
+    
+    Satır genişliği kelime kelime toplanarak ilerler (her kelime glif tablosundan bir kez ölçülür);
+    tek başına max_width'ten geniş kelimeler karakter karakter bölünür.
+    
+    Returns:
+        (satırlar tuple'ı, toplam yükseklik = satır sayısı * font_size * leading)
+    """
+    space_width = string_width(' ', font_name, font_size)
+    lines = []
+    current_line = ''
+    current_width = 0.0
+
+    for word in text.split(' '):
+        if not word:
+            continue
+        word_width = string_width(word, font_name, font_size)
+
+        if word_width > max_width:
+            # Kelime tek başına sığmıyor: karakter karakter böl
+            if current_line:
+                lines.append(current_line)
+            piece = ''
+            piece_width = 0.0
+            for char in word:
+                char_width = string_width(char, font_name, font_size)
+                if piece and piece_width + char_width > max_width:
+                    lines.append(piece)
+                    piece = ''
+                    piece_width = 0.0
+                piece += char
+                piece_width += char_width
+            current_line, current_width = piece, piece_width
+        elif not current_line:
+            current_line, current_width = word, word_width
+        elif current_width + space_width + word_width <= max_width:
+            current_line += ' ' + word
+            current_width += space_width + word_width
+        else:
+            lines.append(current_line)
+            current_line, current_width = word, word_width
+
+    if current_line:
+        lines.append(current_line)
+
+    # Boş metin de bir satır yer kaplar
+    line_count = max(len(lines), 1)
+    return tuple(lines), line_count * font_size * leading
+
 def draw_text_multiline(canvas, x, y, text, font_name, font_size, color=colors.black, 
                         line_height=None, max_width=None, alignment='left'):
     """Çok satırlı metin çiz ve gerçek yüksekliği döndür"""
@@ -122,57 +325,281 @@ def draw_text_multiline(canvas, x, y, text, font_name, font_size, color=colors.b
     if not text:
         return y - line_height
     
-    lines = text.split('\n')
     current_y = y
     
-    for line in lines:
+    for paragraph in text.split('\n'):
         if max_width:
             # Metni max_width'e sığdır (word wrap)
-            words = line.split(' ')
-            current_line = ''
-            for word in words:
-                test_line = current_line + (' ' if current_line else '') + word
-                if canvas.stringWidth(test_line, font_name, font_size) <= max_width:
-                    current_line = test_line
-                else:
-                    if current_line:
-                        draw_text(canvas, x, current_y, current_line, font_name, font_size, color, alignment)
-                        current_y -= line_height
-                    current_line = word
-            if current_line:
-                draw_text(canvas, x, current_y, current_line, font_name, font_size, color, alignment)
-                current_y -= line_height
+            lines = wrap_text(paragraph, font_name, font_size, max_width)[0] or ('',)
         else:
+            lines = (paragraph,)
+        for line in lines:
             draw_text(canvas, x, current_y, line, font_name, font_size, color, alignment)
             current_y -= line_height
     
     return current_y  # Son satırın altındaki y pozisyonu
 
-def draw_image_fit(canvas, x, y, width, height, image_path):
-    """Görseli oranı koruyarak sığdır (contain) - Memory optimize edilmiş"""
+# Encode tamponu: her thread kendi BytesIO'sunu yeniden kullanır (geçici dosya yok)
+_encode_buffers = threading.local()
+
+def _get_encode_buffer():
+    """Thread'e ait yeniden kullanılabilir encode tamponunu boşaltıp döndür"""
+    buffer = getattr(_encode_buffers, "buffer", None)
+    if buffer is None:
+        buffer = io.BytesIO()
+        _encode_buffers.buffer = buffer
+    buffer.seek(0)
+    buffer.truncate()
+    return buffer
+
+class _BorrowedStream:
+    """
+    Çağıranın stream'i: Pillow görseli kapatırken stream'i de kapatır (ör. PNG),
+    ama aynı upload bir sonraki geçişte (boyut bütçesi ölçümü ve yeniden render)
+    tekrar okunur. Kapatma yok sayılır; stream'in sahibi çağırandır.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def close(self):
+        pass
+
+def _open_image_source(image_source):
+    """Dosya yolu, bayt dizisi veya dosya benzeri nesneden PIL görseli aç"""
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        return PILImage.open(io.BytesIO(image_source))
+    if hasattr(image_source, "read"):
+        # Upload stream'i (FileStorage.stream vb.) doğrudan decode edilir
+        if hasattr(image_source, "seek"):
+            image_source.seek(0)
+        return PILImage.open(_BorrowedStream(image_source))
+    return PILImage.open(image_source)
+
+def describe_image_source(image_source):
+    """Log mesajları için görsel kaynağını kısaca tanımla"""
+    if isinstance(image_source, (str, os.PathLike)):
+        return os.fspath(image_source)
+    name = getattr(image_source, "name", None) or getattr(image_source, "filename", None)
+    if isinstance(name, str):
+        return name
+    return f"<{type(image_source).__name__}>"
+
+def source_memory_bytes(image_source):
+    """Kaynağın bellekte tuttuğu bayt (dosya yolları ve diske taşan stream'ler için 0)"""
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        return len(image_source)
+    if isinstance(image_source, io.BytesIO):
+        return image_source.getbuffer().nbytes
+    return 0
+
+class JpegBufferReader(ImageReader):
+    """
+    Bellekteki hazır JPEG baytlarını canvas'a veren ImageReader.
+    ReportLab JPEG akışını olduğu gibi (DCTDecode) gömer; görsel tekrar decode edilmez.
+    """
+
+    def __init__(self, jpeg_bytes, size, name="jpeg-buffer"):
+        self.fileName = name
+        self._ident = None
+        self._image = None
+        self._transparent = None
+        self._data = None
+        self._dataA = None
+        self._width, self._height = size
+        self._jpeg_bytes = jpeg_bytes
+        self.fp = io.BytesIO(jpeg_bytes)
+
+    def jpeg_fh(self):
+        self.fp.seek(0)
+        return self.fp
+
+    def getSize(self):
+        return self._width, self._height
+
+    def getRGBData(self):
+        # drawImage bunu yalnızca XObject imzası (digest) için çağırır;
+        # piksel yerine encode edilmiş baytları vermek yeterli ve decode gerektirmez.
+        return self._jpeg_bytes
+
+def target_pixel_size(width, height, dpi=None):
+    """Nokta (pt) cinsinden kutunun hedef DPI'da kaç piksel gerektirdiğini hesapla"""
+    if dpi is None:
+        dpi = PHOTO_TARGET_DPI
+    return (max(1, math.ceil(width / 72 * dpi)),
+            max(1, math.ceil(height / 72 * dpi)))
+
+def fit_size(img_width, img_height, box_width, box_height):
+    """Oranı koruyarak kutuya sığan boyutu hesapla (asla büyütmez)"""
+    scale = min(box_width / img_width, box_height / img_height, 1.0)
+    return (max(1, round(img_width * scale)), max(1, round(img_height * scale)))
+
+# ============================================================
+# BELLEK MUHASEBESİ
+# ============================================================
+
+# Her görselden sonra tam gc.collect() yerine: bırakılan bitmap/tampon baytları sayılır,
+# son toplamadan beri bu eşik aşıldığında tek bir toplama yapılır.
+GC_THRESHOLD_BYTES = int(os.environ.get("GC_THRESHOLD_MB", 256)) * 1024 * 1024
+
+_memory_lock = threading.Lock()
+# Son gc.collect()'ten beri bırakılan bayt (sayaçlar /metrics'tedir: released_*, gc_collections)
+_memory_state = {"bytes_since_collect": 0}
+
+def track_release(nbytes, images=0):
+    """Bırakılan belleği kaydet; eşik aşıldıysa bir gc.collect() tetikle"""
+    metrics.count("released_bytes", nbytes)
+    metrics.count("released_images", images)
+    with _memory_lock:
+        _memory_state["bytes_since_collect"] += nbytes
+        should_collect = _memory_state["bytes_since_collect"] >= GC_THRESHOLD_BYTES
+        if should_collect:
+            _memory_state["bytes_since_collect"] = 0
+    
+    if should_collect:
+        start = time.perf_counter()
+        gc.collect()
+        metrics.count("gc_collections")
+        # Toplama süresi "gc_collect" aşaması histogramına (istek zamanlamasına girmez)
+        metrics.observe("gc_collect", time.perf_counter() - start, request=False)
+
+def _release_image(pil_img):
+    """PIL görselini kapat ve bitmap boyutunu bellek muhasebesine yaz"""
+    nbytes = estimate_decode_bytes(pil_img) if pil_img.im is not None else 0
+    pil_img.close()
+    track_release(nbytes, images=1)
+
+class PhotoBudgetError(ValueError):
+    """Görsel, yapılandırılmış piksel/bellek bütçesini aşıyor"""
+
+# EXIF orientation değerine karşılık gelen transpose işlemi (ImageOps.exif_transpose ile aynı)
+_EXIF_TRANSPOSE = {
+    2: PILImage.Transpose.FLIP_LEFT_RIGHT,
+    3: PILImage.Transpose.ROTATE_180,
+    4: PILImage.Transpose.FLIP_TOP_BOTTOM,
+    5: PILImage.Transpose.TRANSPOSE,
+    6: PILImage.Transpose.ROTATE_270,
+    7: PILImage.Transpose.TRANSVERSE,
+    8: PILImage.Transpose.ROTATE_90,
+}
+
+def _replace_image(old_img, new_img):
+    """Yeni görsel üretildiyse eskisini hemen kapat (bitmap'i bırak)"""
+    if new_img is not old_img:
+        _release_image(old_img)
+    return new_img
+
+def estimate_decode_bytes(pil_img):
+    """Görselin decode edildiğinde kaplayacağı bitmap boyutunu tahmin et"""
+    width, height = pil_img.size
+    return width * height * len(pil_img.getbands())
+
+def check_photo_budget(pil_img):
+    """Decode'dan önce piksel ve bellek bütçesini kontrol et, aşılırsa PhotoBudgetError"""
+    width, height = pil_img.size
+    if width * height > PHOTO_MAX_PIXELS:
+        raise PhotoBudgetError(
+            f"Görsel çok büyük: {width}x{height} piksel (sınır {PHOTO_MAX_PIXELS})")
+    decode_bytes = estimate_decode_bytes(pil_img)
+    if decode_bytes > PHOTO_MAX_DECODE_BYTES:
+        raise PhotoBudgetError(
+            f"Görsel decode bütçesini aşıyor: {decode_bytes // (1024 * 1024)} MB "
+            f"(sınır {PHOTO_MAX_DECODE_BYTES // (1024 * 1024)} MB)")
+
+def _exif_orientation(pil_img):
+    """EXIF yön etiketini pikselleri decode etmeden oku"""
+    if pil_img.format == 'PNG':
+        # PNG'de getexif() IDAT'tan sonra gelebilecek eXIf chunk'ı için tüm görseli
+        # decode eder (bütçe kontrolünden önce); yalnızca header'daki EXIF okunur
+        exif_bytes = pil_img.info.get("exif")
+        if not exif_bytes:
+            return 1
+        exif = PILImage.Exif()
+        exif.load(exif_bytes)
+        return exif.get(0x0112, 1)
+    return pil_img.getexif().get(0x0112, 1)
+
+def estimate_photo_memory(image_source, target_size=(1000, 1000)):
+    """
+    Görselin hazırlanırken kaplayacağı tepe belleği yalnızca header'dan tahmin et:
+    decode edilen bitmap (JPEG'lerde DCT draft ölçeğinde), onunla bir an birlikte duran
+    reduce() kopyası (en fazla 1/4'ü) ve hedef boyuttaki kopya.
+    Okunamayan görseller 0 sayılır (hazırlanırken zaten atlanırlar).
+    """
+    try:
+        # with bloğu yalnızca Pillow'un kendi açtığı dosyayı kapatır; upload stream'i açık kalır
+        with _open_image_source(image_source) as pil_img:
+            box_width, box_height = target_size
+            if _exif_orientation(pil_img) in (5, 6, 7, 8):
+                box_width, box_height = box_height, box_width
+            if pil_img.format == 'JPEG':
+                # draft() yalnızca decoder ölçeğini ayarlar, piksel decode etmez
+                pil_img.draft(None, (box_width, box_height))
+            decode_bytes = estimate_decode_bytes(pil_img)
+            return decode_bytes + decode_bytes // 4 + target_size[0] * target_size[1] * len(pil_img.getbands())
+    except Exception:
+        return 0
+
+def decode_fitted(image_source, target_size=(1000, 1000)):
+    """
+    Görseli decode et, EXIF yönünü düzelt ve hedef piksel kutusuna küçült.
+    Tam çözünürlüklü bitmap hiç oluşturulmaz: JPEG'ler decode sırasında (DCT draft)
+    küçültülür, ardından reduce() ile tamsayı oranında daraltılır.
+    Dönen görseli çağıran _release_image ile bırakır.
+
+    Args:
+        target_size: (genişlik, yükseklik) - Görselin sığacağı piksel kutusu
+
+    Returns:
+        (PIL görseli RGB/L, kaynağın yönü düzeltilmiş (genişlik, yükseklik))
+
+    Raises:
+        PhotoBudgetError: Görsel piksel/bellek bütçesini aşıyorsa
+    """
     pil_img = None
-    temp_path = None
     try:
-        # Görseli aç
-        pil_img = PILImage.open(image_path)
+        # Görseli aç (sadece header okunur, pikseller henüz decode edilmez)
+        pil_img = _open_image_source(image_source)
+        
+        # EXIF orientation bilgisini oku; 90 derecelik dönüşlerde hedef kutu
+        # ham (dönmemiş) görsel için yer değiştirir
+        orientation = _exif_orientation(pil_img)
+        box_width, box_height = target_size
+        source_size = pil_img.size
+        if orientation in (5, 6, 7, 8):
+            box_width, box_height = box_height, box_width
+            source_size = source_size[::-1]
         
-        # EXIF orientation bilgisini düzelt (fotoğrafın doğru yönde görünmesi için)
-        # Bu işlem resize'den ÖNCE yapılmalı çünkü orientation düzeltmesi boyutları değiştirebilir
-        pil_img = ImageOps.exif_transpose(pil_img)
+        # JPEG: decoder'a 1/2, 1/4 veya 1/8 ölçekte decode etmesini söyle (DCT scaling)
+        # Sonuç her zaman hedef kutudan büyük veya eşit kalır
+        if pil_img.format == 'JPEG':
+            pil_img.draft(None, (box_width, box_height))
+        
+        # Decode'dan önce bütçe kontrolü (OOM yerine kontrollü hata)
+        check_photo_budget(pil_img)
+        pil_img.load()
+        
+        # Büyük oranlarda önce reduce() ile ucuz tamsayı küçültme yap
+        img_width, img_height = pil_img.size
+        factor = min(img_width // box_width, img_height // box_height)
+        if factor >= 2:
+            pil_img = _replace_image(pil_img, pil_img.reduce(factor))
+        
+        # EXIF orientation düzeltmesi (küçültülmüş görsel üzerinde, daha ucuz)
+        transpose = _EXIF_TRANSPOSE.get(orientation)
+        if transpose is not None:
+            pil_img = _replace_image(pil_img, pil_img.transpose(transpose))
         
         # Boyutları kontrol et (orientation düzeltmesinden sonra)
         img_width, img_height = pil_img.size
         
-        # Agresif resize optimizasyonu (512MB RAM için)
-        # PDF'de fotoğraflar küçük hücrelerde gösterildiği için 1000px yeterli
-        max_dimension = 1000  # 1200'den 1000'e düşürüldü
-        if img_width > max_dimension or img_height > max_dimension:
-            # Oranı koruyarak resize et (memory tasarrufu için erken resize)
-            if img_width > img_height:
-                new_size = (max_dimension, int(img_height * (max_dimension / img_width)))
-            else:
-                new_size = (int(img_width * (max_dimension / img_height)), max_dimension)
-            
+        # Hücrenin gerçekten ihtiyaç duyduğu piksel boyutuna küçült
+        # (hedef DPI'dan fazla piksel decode/resample/embed edilmez)
+        new_size = fit_size(img_width, img_height, *target_size)
+        if new_size != (img_width, img_height):
             # Resize işlemi (LANCZOS kaliteli ama yavaş, LINEAR daha hızlı)
             # Memory için LINEAR kullanıyoruz (hız ve memory dengesi)
             try:
@@ -186,93 +613,389 @@ def draw_image_fit(canvas, x, y, width, height, image_path):
                     # Çok eski versiyonlar veya fallback
                     resample_filter = 2 # 2, BILINEAR filtresinin sayısal değeridir
                 
-            pil_img = pil_img.resize(new_size, resample_filter)
-            img_width, img_height = pil_img.size
-        
-        # Oranları hesapla (resize sonrası)
-        scale_w = width / img_width
-        scale_h = height / img_height
-        scale = min(scale_w, scale_h)
-        
-        new_width = img_width * scale
-        new_height = img_height * scale
-        
-        # Ortala
-        offset_x = x + (width - new_width) / 2
-        offset_y = y + (height - new_height) / 2
-        
-        # Geçici dosyaya kaydet (memory tasarrufu için)
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-        temp_path = temp_file.name
-        temp_file.close()
+            pil_img = _replace_image(pil_img, pil_img.resize(new_size, resample_filter))
         
         # RGB'ye çevir (eğer RGBA ise)
         if pil_img.mode in ('RGBA', 'LA', 'P'):
             rgb_img = PILImage.new('RGB', pil_img.size, (255, 255, 255))
             if pil_img.mode == 'P':
-                pil_img = pil_img.convert('RGBA')
+                pil_img = _replace_image(pil_img, pil_img.convert('RGBA'))
             rgb_img.paste(pil_img, mask=pil_img.split()[-1] if pil_img.mode in ('RGBA', 'LA') else None)
             # Eski pil_img'i kapat
-            pil_img.close()
-            pil_img = rgb_img
-        
-        # JPEG olarak kaydet (daha küçük dosya boyutu ve daha hızlı işleme)
+            pil_img = _replace_image(pil_img, rgb_img)
+        elif pil_img.mode not in ('RGB', 'L'):
+            pil_img = _replace_image(pil_img, pil_img.convert('RGB'))
+        return pil_img, source_size
+    except BaseException:
+        # Hata durumunda yarım kalan görseli kapat (memory temizliği)
+        if pil_img:
+            try:
+                _release_image(pil_img)
+            except:
+                pass
+        raise
+
+def encode_image(image_source, target_size=(1000, 1000), quality=75):
+    """
+    Görseli hedef piksel kutusuna küçültüp (bkz. decode_fitted) JPEG olarak encode et.
+    Tamamen bellekte çalışır (geçici dosya kullanılmaz).
+
+    Returns:
+        (bytes, (genişlik, yükseklik)) - JPEG baytları ve piksel boyutu
+
+    Raises:
+        PhotoBudgetError: Görsel piksel/bellek bütçesini aşıyorsa
+    """
+    pil_img, _ = decode_fitted(image_source, target_size)
+    try:
+        # JPEG olarak yeniden kullanılan bellek tamponuna kaydet
         # Quality 75: görsel kalite hala iyi, dosya boyutu ve işleme hızı daha iyi
-        pil_img.save(temp_path, 'JPEG', quality=75, optimize=True)
-        
-        # ReportLab ImageReader kullan
-        img_reader = ImageReader(temp_path)
-        canvas.drawImage(img_reader, offset_x, offset_y, width=new_width, height=new_height)
-        
-        return True
-    except Exception as e:
-        print(f"Görsel yüklenemedi {image_path}: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+        buffer = _get_encode_buffer()
+        pil_img.save(buffer, 'JPEG', quality=quality, optimize=True)
+        return buffer.getvalue(), pil_img.size
     finally:
         # PIL görselini kapat (memory temizliği)
+        try:
+            _release_image(pil_img)
+        except:
+            pass
+
+def probe_image(image_source, target_size, qualities):
+    """
+    Boyut bütçesi için görselin JPEG sıkıştırılabilirliğini ölç: hedef kutuya küçültülmüş
+    kopya her kalitede bir kez encode edilir. Piksel başına bayt, başka çözünürlüklerdeki
+    boyutu tahmin etmek için kullanılır.
+
+    Returns:
+        (kaynağın yönü düzeltilmiş boyutu, ölçülen kopyanın boyutu, {kalite: piksel başına bayt})
+        veya hata olursa None
+    """
+    name = describe_image_source(image_source)
+    pil_img = None
+    try:
+        if isinstance(image_source, str) and not os.path.exists(image_source):
+            return None
+        pil_img, source_size = decode_fitted(image_source, target_size)
+        pixels = pil_img.size[0] * pil_img.size[1]
+        bytes_per_pixel = {}
+        for quality in qualities:
+            buffer = _get_encode_buffer()
+            pil_img.save(buffer, 'JPEG', quality=quality, optimize=True)
+            bytes_per_pixel[quality] = buffer.tell() / pixels
+        return source_size, pil_img.size, bytes_per_pixel
+    except Exception as e:
+        print(f"Görsel ölçülemedi {name}: {e}")
+        return None
+    finally:
         if pil_img:
             try:
-                pil_img.close()
+                _release_image(pil_img)
             except:
                 pass
+
+# Fotoğraf ön işleme (decode/resize/encode) için thread havuzu boyutu.
+# Pillow bu işlerin çoğunda GIL'i bırakır, bu yüzden thread'ler gerçekten paralel çalışır.
+PHOTO_WORKERS = max(1, int(os.environ.get("PHOTO_WORKERS", min(4, os.cpu_count() or 1))))
+
+# Hazırlanmış görsel: canvas'a doğrudan yerleştirilebilir JPEG baytları
+PreparedImage = namedtuple("PreparedImage", ["jpeg_bytes", "size", "name"])
+
+_photo_executor = None
+_photo_executor_lock = threading.Lock()
+
+def _get_photo_executor():
+    """Paylaşılan sınırlı thread havuzunu (ilk kullanımda) oluştur"""
+    global _photo_executor
+    # Havuz tembel oluşturulur: gunicorn --preload fork'undan önce thread açılmasın
+    if _photo_executor is None:
+        with _photo_executor_lock:
+            if _photo_executor is None:
+                _photo_executor = ThreadPoolExecutor(max_workers=PHOTO_WORKERS,
+                                                     thread_name_prefix="photo")
+    return _photo_executor
+
+def prepare_image(image_source, target_size=(1000, 1000), digest=None, quality=75):
+    """
+    Tek bir görseli hedef piksel kutusuna göre çizime hazırla, hata olursa None döndür.
+    Aynı kaynak aynı boyut/kalitede daha önce işlendiyse türev önbelleğinden alınır.
+    """
+    name = describe_image_source(image_source)
+    try:
+        if isinstance(image_source, str) and not os.path.exists(image_source):
+            print(f"Görsel bulunamadı: {name}")
+            return None
         
-        # Geçici dosyayı sil
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
+        cache_key = None
+        if photo_cache.is_enabled():
+            if digest is None:
+                digest = photo_cache.photo_digest(image_source)
+            cache_key = photo_cache.derivative_key(digest, target_size, quality)
+            cached = photo_cache.get(cache_key)
+            if cached is not None:
+                return PreparedImage(cached[0], cached[1], name)
         
-        # Garbage collection'ı tetikle
-        gc.collect()
+        # Tek fotoğrafın decode/resize/encode süresi (yalnızca histograma; istekte "photos" aşaması var)
+        start = time.perf_counter()
+        jpeg_bytes, size = encode_image(image_source, target_size, quality)
+        metrics.observe("photo_encode", time.perf_counter() - start, request=False)
+        if cache_key is not None:
+            photo_cache.put(cache_key, jpeg_bytes)
+        return PreparedImage(jpeg_bytes, size, name)
+    except PhotoBudgetError as e:
+        print(f"Görsel atlandı {name}: {e}")
+        return None
+    except Exception as e:
+        print(f"Görsel yüklenemedi {name}: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
 
-def calculate_text_height(canvas, text, font_name, font_size, max_width):
-    """Metnin yüksekliğini hesapla (çok satırlı, word wrap ile)"""
-    if not text:
-        return font_size * 1.2
+def prepare_images(image_sources, target_sizes, digests=None, qualities=None):
+    """
+    Görselleri paylaşılan thread havuzunda paralel olarak hazırla.
+    target_sizes her görsel için piksel kutusudur (bkz. target_pixel_size).
+    digests verilirse kaynakların SHA-256 özetleri yeniden hesaplanmaz.
+    qualities verilirse her görselin JPEG kalitesidir (varsayılan 75).
+    Sonuç listesi kaynaklarla aynı sıradadır; başarısız görseller None olur.
+    """
+    image_sources = list(image_sources)
+    target_sizes = list(target_sizes)
+    digests = list(digests) if digests is not None else [None] * len(image_sources)
+    qualities = list(qualities) if qualities is not None else [75] * len(image_sources)
+    if len(image_sources) <= 1 or PHOTO_WORKERS == 1:
+        return [prepare_image(source, size, digest, quality)
+                for source, size, digest, quality in zip(image_sources, target_sizes, digests, qualities)]
+    return list(_get_photo_executor().map(prepare_image, image_sources, target_sizes, digests, qualities))
+
+def probe_images(image_sources, target_sizes, qualities):
+    """Görselleri (bkz. probe_image) paylaşılan thread havuzunda paralel ölç"""
+    image_sources = list(image_sources)
+    target_sizes = list(target_sizes)
+    if len(image_sources) <= 1 or PHOTO_WORKERS == 1:
+        return [probe_image(source, size, qualities) for source, size in zip(image_sources, target_sizes)]
+    return list(_get_photo_executor().map(probe_image, image_sources, target_sizes,
+                                          [qualities] * len(image_sources)))
+
+def draw_prepared_image(canvas, x, y, width, height, prepared):
+    """Hazırlanmış görseli oranı koruyarak kutuya sığdır (contain) ve ortala"""
+    img_width, img_height = prepared.size
     
-    line_height = font_size * 1.2
-    words = text.split(' ')
-    lines = []
-    current_line = ''
+    # Oranları hesapla (resize sonrası)
+    scale_w = width / img_width
+    scale_h = height / img_height
+    scale = min(scale_w, scale_h)
     
-    for word in words:
-        test_line = current_line + (' ' if current_line else '') + word
-        if canvas.stringWidth(test_line, font_name, font_size) <= max_width:
-            current_line = test_line
-        else:
-            if current_line:
-                lines.append(current_line)
-            current_line = word
+    new_width = img_width * scale
+    new_height = img_height * scale
     
-    if current_line:
-        lines.append(current_line)
+    # Ortala
+    offset_x = x + (width - new_width) / 2
+    offset_y = y + (height - new_height) / 2
     
-    # Eğer hiç satır yoksa (çok kısa metin), en az bir satır say
-    if not lines:
-        lines = [text]
+    # Bellekteki JPEG'i doğrudan canvas'a ver
+    img_reader = JpegBufferReader(prepared.jpeg_bytes, prepared.size, prepared.name)
+    canvas.drawImage(img_reader, offset_x, offset_y, width=new_width, height=new_height)
+
+def draw_image_fit(canvas, x, y, width, height, image_source):
+    """Görseli oranı koruyarak sığdır (contain) - Memory optimize edilmiş"""
+    prepared = prepare_image(image_source, target_pixel_size(width, height))
+    if prepared is None:
+        return False
+    draw_prepared_image(canvas, x, y, width, height, prepared)
+    # JPEG baytları canvas'a kopyalandı; tamponu muhasebeye yazıp bırak
+    track_release(len(prepared.jpeg_bytes))
+    return True
+
+# ============================================================
+# LOGO (SABİT MARKA GÖRSELLERİ)
+# ============================================================
+# Logo her raporda aynıdır: süreç başına bir kez decode edilir, header kutusunun
+# LOGO_TARGET_DPI'daki boyutuna küçültülür (asla büyütülmez) ve PDF'e gömülecek son
+# biçimde (Flate sıkıştırılmış RGB + alfa kanalı SMask olarak) saklanır. Her canvas'a
+# yalnızca hazır akışlar kopyalanır; JPEG'e yeniden sıkıştırılmadığı için kayıpsızdır.
+
+LOGO_TARGET_DPI = int(os.environ.get("LOGO_TARGET_DPI", 300))
+
+# Gömülmeye hazır logo: Flate akışları, piksel boyutu ve XObject adı.
+# Akışlar ASCII85 ile sarılmaz: linearize (qpdf) ASCII85 katmanını kaldırırken
+# Flate'i de açıp yeniden sıkıştırır; salt Flate akışlar ise olduğu gibi kopyalanır.
+PreparedLogo = namedtuple("PreparedLogo", ["rgb_stream", "alpha_stream", "size", "name"])
+
+_LOGO_CACHE = {}  # (yol, mtime, boyut, kutu) -> PreparedLogo
+_logo_lock = threading.Lock()
+
+
+def prepare_logo(logo_path, box_width, box_height, dpi=None):
+    """
+    Logoyu kutunun hedef DPI'daki piksel boyutuna göre bir kez hazırla (süreç içinde önbelleklenir).
+    Dosya değişirse (mtime/boyut) yeniden hazırlanır; hata olursa None döndürür.
+    """
+    try:
+        stat = os.stat(logo_path)
+    except OSError:
+        print(f"Logo bulunamadı: {logo_path}")
+        return None
+    target_size = target_pixel_size(box_width, box_height, dpi=dpi or LOGO_TARGET_DPI)
+    key = (logo_path, stat.st_mtime_ns, stat.st_size, target_size)
+    logo = _LOGO_CACHE.get(key)
+    if logo is not None:
+        return logo
     
-    return len(lines) * line_height
+    with _logo_lock:
+        logo = _LOGO_CACHE.get(key)
+        if logo is not None:
+            return logo
+        try:
+            with PILImage.open(logo_path) as pil_img:
+                transpose = _EXIF_TRANSPOSE.get(_exif_orientation(pil_img))
+                rgba = pil_img.convert('RGBA')
+            if transpose is not None:
+                rgba = rgba.transpose(transpose)
+            new_size = fit_size(*rgba.size, *target_size)
+            if new_size != rgba.size:
+                rgba = rgba.resize(new_size, PILImage.Resampling.LANCZOS)
+            
+            name = "logo-" + hashlib.sha256(rgba.tobytes()).hexdigest()[:16]
+            alpha = rgba.getchannel('A')
+            rgb_stream = zlib.compress(rgba.convert('RGB').tobytes(), 9)
+            # Tamamen opak logoda maske gömülmez
+            alpha_stream = None
+            if alpha.getextrema()[0] < 255:
+                alpha_stream = zlib.compress(alpha.tobytes(), 9)
+            logo = PreparedLogo(rgb_stream, alpha_stream, rgba.size, name)
+        except Exception as e:
+            print(f"Logo yüklenemedi {logo_path}: {e}")
+            return None
+        # Dosyanın eski sürümleri (değiştiyse) tutulmaz; logo başına tek girdi kalır
+        for stale_key in [k for k in _LOGO_CACHE if k[0] == logo_path]:
+            del _LOGO_CACHE[stale_key]
+        _LOGO_CACHE[key] = logo
+        return logo
 
+class _FlateImageXObject(PDFImageXObject):
+    """
+    Hazır Flate akışını olduğu gibi gömen görsel XObject.
+    Filter, ReportLab'in tek elemanlı dizisi yerine ad olarak yazılır: linearize
+    sırasında qpdf dizideki Flate akışlarını açıp yeniden sıkıştırıyor, adı ise kopyalıyor.
+    """
+
+    def __init__(self, name, size, stream, color_space, decode=None):
+        self.name = name
+        self.width, self.height = size
+        self.colorSpace = color_space
+        self.streamContent = stream
+        self.decode = decode
+        self.smask = None
+
+    def format(self, document):
+        S = PDFStream(content=self.streamContent)
+        dict = S.dictionary
+        dict["Type"] = PDFName("XObject")
+        dict["Subtype"] = PDFName("Image")
+        dict["Width"] = self.width
+        dict["Height"] = self.height
+        dict["BitsPerComponent"] = 8
+        dict["ColorSpace"] = PDFName(self.colorSpace)
+        dict["Filter"] = PDFName("FlateDecode")
+        dict["Length"] = len(self.streamContent)
+        if self.decode:
+            dict["Decode"] = PDFArray(self.decode)
+        if self.smask:
+            dict["SMask"] = self.smask
+        return S.format(document)
+
+def draw_logo(canvas, x, y, width, height, logo):
+    """Hazırlanmış logoyu oranı koruyarak kutuya sığdır (contain) ve ortala"""
+    if not canvas.hasForm(logo.name):
+        # canvas.drawImage ile aynı kayıt; yalnızca akışlar yeniden üretilmez
+        # Nesneler kaydedilirken değiştirildiği için her canvas'a yenisi verilir (akışlar paylaşılır)
+        document = canvas._doc
+        image = _FlateImageXObject(logo.name, logo.size, logo.rgb_stream, 'DeviceRGB')
+        if logo.alpha_stream is not None:
+            mask_name = logo.name + "-mask"
+            mask = _FlateImageXObject(mask_name, logo.size, logo.alpha_stream, 'DeviceGray', decode=[0, 1])
+            image.smask = document.Reference(mask, document.getXObjectName(mask_name))
+        document.addForm(logo.name, image)
+    
+    img_width, img_height = logo.size
+    scale = min(width / img_width, height / img_height)
+    new_width = img_width * scale
+    new_height = img_height * scale
+    
+    canvas.saveState()
+    canvas.translate(x + (width - new_width) / 2, y + (height - new_height) / 2)
+    canvas.scale(new_width, new_height)
+    canvas.doForm(logo.name)
+    canvas.restoreState()
+
+# ============================================================
+# SABİT SAYFA İSKELETİ (FORM XOBJECT)
+# ============================================================
+# Her raporda aynı kalan çizimler (kutular, dolgulu bantlar, boş satır çizgileri,
+# fotoğraf hücreleri) süreç başına bir kez PDF operatörlerine derlenir. Her PDF'te
+# bir form XObject olarak bir kez saklanır ve doForm ile yerleştirilir; rapor yalnızca
+# değişken içeriği (metin, görseller) çizer. Form adı operatörlerin özetidir, bu yüzden
+# aynı iskelet aynı belgede (ör. fotoğraf sayfaları) tekrar kullanılır.
+# Metin iskelete konmaz: TrueType alt küme kodlaması her belgede farklıdır.
+
+SKELETON_CACHE_SIZE = int(os.environ.get("SKELETON_CACHE_SIZE", 256))
+
+# Derlenmiş iskelet: form adı, Flate sıkıştırılmış PDF operatörleri ve yerel koordinatlardaki boyut
+Skeleton = namedtuple("Skeleton", ["name", "stream", "width", "height"])
+
+# Aynısı tekrar yazılmayan durum operatörleri (çizgi rengi, dolgu rengi, çizgi kalınlığı)
+_STATE_OPERATORS = ("RG", "rg", "w")
+
+@lru_cache(maxsize=SKELETON_CACHE_SIZE)
+def compile_skeleton(draw, width, height, *args):
+    """
+    draw(canvas, width, height, *args) çizimini bir kez operatörlere derle.
+    Çizim (0, 0)-(width, height) yerel koordinatlarında yapılmalı ve yalnızca
+    vektör çizimi (metin/görsel olmadan) içermelidir.
+    """
+    scratch = Canvas(io.BytesIO())
+    draw(scratch, width, height, *args)
+    
+    # draw_box her kutuda rengi ve kalınlığı yeniden yazar; değişmeyenler atlanır
+    code = []
+    state = {}
+    for op in scratch._code:
+        operator = op.rsplit(" ", 1)[-1]
+        if operator in ("q", "Q"):
+            state.clear()
+        elif operator in _STATE_OPERATORS:
+            if state.get(operator) == op:
+                continue
+            state[operator] = op
+        code.append(op)
+    code = "\n".join(code).encode("latin-1")
+    
+    name = "iskelet-" + hashlib.sha256(b"%r:%r\n%s" % (width, height, code)).hexdigest()[:16]
+    return Skeleton(name, zlib.compress(code, 9), width, height)
+
+class _SkeletonForm(PDFStream):
+    """İskeletin form XObject'i; kaynak (font/görsel) kullanmadığı için Resources yazılmaz"""
+
+    def __init__(self, skeleton):
+        super().__init__(content=skeleton.stream)
+        dict = self.dictionary
+        dict["Type"] = PDFName("XObject")
+        dict["Subtype"] = PDFName("Form")
+        # Kenar çizgileri kutunun yarım çizgi kalınlığı kadar dışına taşar; BBox kırpmasın
+        dict["BBox"] = PDFArray([-1, -1, skeleton.width + 1, skeleton.height + 1])
+        # Filter dizi değil ad: linearize (qpdf) akışı yeniden sıkıştırmadan kopyalar
+        dict["Filter"] = PDFName("FlateDecode")
+        dict["Length"] = len(skeleton.stream)
+
+def draw_skeleton(canvas, x, y, skeleton):
+    """Derlenmiş iskeleti (x, y) sol alt köşesine yerleştir; form belgede yoksa bir kez tanımlanır"""
+    if not canvas.hasForm(skeleton.name):
+        canvas._doc.addForm(skeleton.name, _SkeletonForm(skeleton))
+    canvas.saveState()
+    canvas.translate(x, y)
+    canvas.doForm(skeleton.name)
+    canvas.restoreState()
+
+def calculate_text_height(canvas, text, font_name, font_size, max_width):
+    """Metnin yüksekliğini hesapla (çok satırlı, word wrap ile)"""
+    return wrap_text(text, font_name, font_size, max_width)[1]
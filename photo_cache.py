@@ -0,0 +1,169 @@
+from contextlib import contextmanager
+from PIL import Image as PILImage
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+import metrics
+
+# ============================================================
+# İŞLENMİŞ FOTOĞRAF ÖNBELLEĞİ (disk tabanlı LRU)
+# ============================================================
+# 3 günlük ve aralık raporları çoğunlukla günlük raporlarda kullanılmış fotoğrafları
+# tekrar içerir. Decode/transpose/resize/encode sonucu (JPEG türevi), kaynak içeriğin
+# hash'i + hedef boyut + kalite anahtarıyla diskte saklanır; aynı fotoğraf tekrar
+# geldiğinde doğrudan önbellekten gömülür.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PHOTO_CACHE_DIR = os.environ.get("PHOTO_CACHE_DIR", os.path.join(BASE_DIR, "photo_cache"))
+# 0 verilirse önbellek kapalıdır
+PHOTO_CACHE_MAX_BYTES = int(os.environ.get("PHOTO_CACHE_MAX_MB", 100)) * 1024 * 1024
+# Dizine birden çok süreç (gunicorn worker'ları, toplu render süreçleri) yazar; her
+# süreç yalnızca kendi yazdıklarını sayar. Toplam bu aralıkla diskten yeniden okunur
+# (saniye), böylece sınır en fazla bu süre içinde yazılanlar kadar aşılabilir.
+PHOTO_CACHE_RESCAN_SECONDS = float(os.environ.get("PHOTO_CACHE_RESCAN_SECONDS", 30))
+
+_cache_lock = threading.Lock()
+_cache_state = {"enabled": None, "total_bytes": None, "scanned_at": 0.0}
+_bypass = threading.local()
+
+def photo_digest(photo_source):
+    """Fotoğraf kaynağının (yol, bayt veya stream) SHA-256 özetini hesapla"""
+    digest = hashlib.sha256()
+    if isinstance(photo_source, (bytes, bytearray, memoryview)):
+        digest.update(photo_source)
+    elif hasattr(photo_source, "read"):
+        # Stream'i parça parça oku ve başa sar (decode aşaması tekrar okuyacak)
+        photo_source.seek(0)
+        for chunk in iter(lambda: photo_source.read(1024 * 1024), b""):
+            digest.update(chunk)
+        photo_source.seek(0)
+    else:
+        with open(photo_source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+@contextmanager
+def bypassed():
+    """
+    Blok süresince bu thread'de önbellek kapalı sayılır (okunmaz, yazılmaz, dizini
+    oluşturulmaz). Isınma render'ı için; tek fotoğraflı render aynı thread'de kalır.
+    """
+    _bypass.active = True
+    try:
+        yield
+    finally:
+        _bypass.active = False
+
+def is_enabled():
+    """Önbellek açık ve dizini yazılabilir mi (salt okunur dosya sisteminde kapanır)"""
+    if getattr(_bypass, "active", False):
+        return False
+    if _cache_state["enabled"] is None:
+        with _cache_lock:
+            if _cache_state["enabled"] is None:
+                enabled = PHOTO_CACHE_MAX_BYTES > 0
+                if enabled:
+                    try:
+                        os.makedirs(PHOTO_CACHE_DIR, exist_ok=True)
+                        enabled = os.access(PHOTO_CACHE_DIR, os.W_OK)
+                    except OSError as e:
+                        print(f"Fotoğraf önbelleği kapatıldı: {e}")
+                        enabled = False
+                _cache_state["enabled"] = enabled
+    return _cache_state["enabled"]
+
+def derivative_key(digest, target_size, quality):
+    """Kaynak özeti, hedef piksel kutusu ve JPEG kalitesinden türev anahtarı üret"""
+    return f"{digest}-{target_size[0]}x{target_size[1]}-q{quality}"
+
+def _entry_path(key):
+    return os.path.join(PHOTO_CACHE_DIR, f"{key}.jpg")
+
+def get(key):
+    """Önbellekteki türevi (jpeg_bytes, (genişlik, yükseklik)) olarak döndür, yoksa None"""
+    path = _entry_path(key)
+    try:
+        with open(path, "rb") as f:
+            jpeg_bytes = f.read()
+        # Sadece header okunur; boyut için decode gerekmez
+        with PILImage.open(io.BytesIO(jpeg_bytes)) as img:
+            size = img.size
+        os.utime(path)  # LRU: son kullanım zamanı
+    except OSError:
+        metrics.count("photo_cache_misses")
+        return None
+    metrics.count("photo_cache_hits")
+    return jpeg_bytes, size
+
+def put(key, jpeg_bytes):
+    """Türevi önbelleğe atomik olarak yaz, gerekirse eski girdileri sil"""
+    path = _entry_path(key)
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(jpeg_bytes)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Fotoğraf önbelleğine yazılamadı: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return
+    
+    metrics.count("photo_cache_stores")
+    with _cache_lock:
+        if _cache_state["total_bytes"] is not None:
+            _cache_state["total_bytes"] += len(jpeg_bytes)
+        needs_eviction = (_cache_state["total_bytes"] is None
+                          or _cache_state["total_bytes"] > PHOTO_CACHE_MAX_BYTES
+                          or time.monotonic() - _cache_state["scanned_at"] > PHOTO_CACHE_RESCAN_SECONDS)
+    if needs_eviction:
+        evict()
+
+def evict():
+    """
+    Dizini tarayıp toplamı diskten yeniden hesapla (diğer süreçlerin yazdıkları
+    dahil); sınır aşıldıysa en az yakın kullanılan türevleri sil
+    """
+    entries = []
+    total_bytes = 0
+    try:
+        for entry in os.scandir(PHOTO_CACHE_DIR):
+            if not entry.name.endswith(".jpg"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_bytes += stat.st_size
+    except OSError:
+        return
+    
+    # Sınır aşıldığında %90'a kadar boşalt (her yazmada tarama yapılmasın)
+    evictions = 0
+    evicted_bytes = 0
+    if total_bytes > PHOTO_CACHE_MAX_BYTES:
+        entries.sort()
+        for _, size, path in entries:
+            if total_bytes <= PHOTO_CACHE_MAX_BYTES * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            evictions += 1
+            evicted_bytes += size
+    
+    with _cache_lock:
+        _cache_state["total_bytes"] = total_bytes
+        _cache_state["scanned_at"] = time.monotonic()
+    if evictions:
+        metrics.count("photo_cache_evictions", evictions)
+        metrics.count("photo_cache_evicted_bytes", evicted_bytes)
@@ -0,0 +1,31 @@
+import os
+
+# ============================================================
+# SÜREÇ KİMLİĞİ
+# ============================================================
+# Diskteki kayıtlar (iş durumları, metrik anlık görüntüleri) onları yazan süreci
+# PID ve başlama zamanıyla tanır: gunicorn worker'ı yeniden başlatıldığında PID
+# tekrar kullanılabilir, ancak başlama zamanı farklı olur.
+
+def process_start(pid):
+    """Sürecin başlama zamanı (Linux /proc, saat tıkı); okunamazsa None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+def process_alive(pid, start=None):
+    """
+    PID'li süreç hâlâ çalışıyor mu. start verilmişse başlama zamanı da eşleşmeli
+    (PID başka bir sürece geçmişse False). POSIX dışında bilinemez, True döner.
+    """
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return start is None or process_start(pid) == start
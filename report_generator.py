@@ -5,9 +5,10 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from pdf_layout import register_font
 from datetime import datetime
+from functools import lru_cache
+import io
 import os
 import re
 import tempfile
@@ -32,9 +33,10 @@ def setup_font():
     # DejaVu Sans daha iyi ama yüklü olmayabilir
     try:
         # DejaVu Sans font dosyası varsa kullan
+        # Süreç genelindeki font kaydını kullan (her çağrıda yeniden parse etme)
         dejavu_path = os.path.join(BASE_DIR, "DejaVuSans.ttf")
         if os.path.exists(dejavu_path):
-            pdfmetrics.registerFont(TTFont('DejaVuSans', dejavu_path))
+            register_font('DejaVuSans', dejavu_path)
             return 'DejaVuSans'
     except:
         pass
@@ -42,6 +44,39 @@ def setup_font():
     # Helvetica kullan (Türkçe karakterler çoğu zaman çalışır)
     return 'Helvetica'
 
+# -------------------------------------------------
+# PARAGRAF STİLLERİ
+# -------------------------------------------------
+@lru_cache(maxsize=None)
+def report_styles(font_name):
+    """
+    Rapordaki paragraf stillerini font başına bir kez oluştur.
+    Stiller yalnızca okunur; aynı süreçteki tüm istek thread'leri paylaşır.
+    """
+    normal = getSampleStyleSheet()['Normal']
+    bold_font = f'{font_name}-Bold'
+    return {
+        "logo": ParagraphStyle('Logo', parent=normal, fontSize=8, fontName=font_name),
+        "project": ParagraphStyle('ProjectTitle', parent=normal, fontSize=12, fontName=bold_font,
+                                  textColor=colors.black, alignment=TA_CENTER),
+        "header": ParagraphStyle('Header', parent=normal, fontSize=9, fontName=font_name,
+                                 alignment=TA_RIGHT),
+        "daily_report": ParagraphStyle('DailyReport', parent=normal, fontSize=12, fontName=bold_font,
+                                       textColor=colors.white, alignment=TA_CENTER),
+        "works_title": ParagraphStyle('WorksTitle', parent=normal, fontSize=11, fontName=bold_font,
+                                      alignment=TA_LEFT),
+        "work_item": ParagraphStyle('WorkItem', parent=normal, fontSize=9, fontName=font_name,
+                                    alignment=TA_LEFT, leftIndent=0.3*cm, leading=11),
+        "empty_line": ParagraphStyle('EmptyLine', parent=normal, fontSize=8, fontName=font_name,
+                                     textColor=colors.grey),
+        "photos_title": ParagraphStyle('PhotosTitle', parent=normal, fontSize=11, fontName=bold_font,
+                                       alignment=TA_CENTER),
+        "photo_label": ParagraphStyle('PhotoLabel', parent=normal, fontSize=8, alignment=TA_CENTER,
+                                      fontName=font_name),
+        "footer": ParagraphStyle('Footer', parent=normal, fontSize=7, fontName=font_name,
+                                 textColor=colors.HexColor('#666666'), alignment=TA_LEFT),
+    }
+
 # -------------------------------------------------
 # TÜRKÇE NORMALIZE
 # -------------------------------------------------
@@ -83,7 +118,8 @@ def create_pdf_with_reportlab(data, photo_files, pdf_filepath, logo_path=None):
         if logo_path is None:
             logo_path = LOGO_FILE
         
-        styles = getSampleStyleSheet()
+        # Stiller süreç içinde önbellekten gelir (her raporda yeniden oluşturulmaz)
+        styles = report_styles(font_name)
         
         # Excel'deki gibi sütun genişlikleri (16 sütun: A-P)
         # Toplam genişlik: A4 genişliği - margin'ler = ~19cm
@@ -122,33 +158,17 @@ def create_pdf_with_reportlab(data, photo_files, pdf_filepath, logo_path=None):
                 row2[0] = logo_img  # A sütunu
             except Exception as e:
                 print(f"Logo yüklenemedi: {e}")
-                row2[0] = Paragraph("LOGO", ParagraphStyle('Logo', parent=styles['Normal'], 
-                                                          fontSize=8, fontName=font_name))
+                row2[0] = Paragraph("LOGO", styles["logo"])
         else:
-            row2[0] = Paragraph("LOGO", ParagraphStyle('Logo', parent=styles['Normal'], 
-                                                      fontSize=8, fontName=font_name))
+            row2[0] = Paragraph("LOGO", styles["logo"])
         
         # Proje başlığı - D2-M2 (birleştirilmiş görünüm için D2'ye koy)
         project_title = data.get("proje_basligi", "FETİHTEPE MERKEZ CAMİ'İ GÜÇLENDİRME VE YENİLEME PROJESİ")
-        project_style = ParagraphStyle(
-            'ProjectTitle',
-            parent=styles['Normal'],
-            fontSize=12,
-            fontName=f'{font_name}-Bold',
-            textColor=colors.black,
-            alignment=TA_CENTER
-        )
-        row2[3] = Paragraph(project_title, project_style)  # D sütunu
+        row2[3] = Paragraph(project_title, styles["project"])  # D sütunu
         
         # Rapor No - N2
         rapor_no_text = f"<b>Günlük Rapor No:</b><br/>{data.get('rapor_no', '')}"
-        header_style = ParagraphStyle(
-            'Header',
-            parent=styles['Normal'],
-            fontSize=9,
-            fontName=font_name,
-            alignment=TA_RIGHT
-        )
+        header_style = styles["header"]
         row2[13] = Paragraph(rapor_no_text, header_style)  # N sütunu
         
         table_data.append(row2)
@@ -164,15 +184,7 @@ def create_pdf_with_reportlab(data, photo_files, pdf_filepath, logo_path=None):
         
         # Satır 5: "GÜNLÜK FAALİYET RAPORU" gri bar (B5-P5)
         row5 = [''] * 16
-        daily_report_style = ParagraphStyle(
-            'DailyReport',
-            parent=styles['Normal'],
-            fontSize=12,
-            fontName=f'{font_name}-Bold',
-            textColor=colors.white,
-            alignment=TA_CENTER
-        )
-        row5[1] = Paragraph("GÜNLÜK FAALİYET RAPORU", daily_report_style)  # B sütunu
+        row5[1] = Paragraph("GÜNLÜK FAALİYET RAPORU", styles["daily_report"])  # B sütunu
         table_data.append(row5)
         
         # Satır 6: Boş
@@ -180,26 +192,11 @@ def create_pdf_with_reportlab(data, photo_files, pdf_filepath, logo_path=None):
         
         # Satır 7: "YAPILAN İŞLER:" başlığı (B7)
         row7 = [''] * 16
-        works_title_style = ParagraphStyle(
-            'WorksTitle',
-            parent=styles['Normal'],
-            fontSize=11,
-            fontName=f'{font_name}-Bold',
-            alignment=TA_LEFT
-        )
-        row7[1] = Paragraph("YAPILAN İŞLER:", works_title_style)  # B sütunu
+        row7[1] = Paragraph("YAPILAN İŞLER:", styles["works_title"])  # B sütunu
         table_data.append(row7)
         
         # Satır 8-13: Yapılan işler listesi (B8-B13)
-        work_item_style = ParagraphStyle(
-            'WorkItem',
-            parent=styles['Normal'],
-            fontSize=9,
-            fontName=font_name,
-            alignment=TA_LEFT,
-            leftIndent=0.3*cm,
-            leading=11
-        )
+        work_item_style = styles["work_item"]
         yapilan_isler = data.get("yapilan_isler", [])
         for i in range(6):
             row = [''] * 16
@@ -207,29 +204,18 @@ def create_pdf_with_reportlab(data, photo_files, pdf_filepath, logo_path=None):
                 row[1] = Paragraph(f"• {yapilan_isler[i]}", work_item_style)  # B sütunu
             else:
                 # Boş satır - altı çizgili görünüm için
-                row[1] = Paragraph("_", ParagraphStyle('EmptyLine', parent=styles['Normal'], 
-                                                      fontSize=8, fontName=font_name, 
-                                                      textColor=colors.grey))
+                row[1] = Paragraph("_", styles["empty_line"])
             table_data.append(row)
         
         # Satır 14-27: Boş satırlar (altı çizgili görünüm için)
         for _ in range(14):
             row = [''] * 16
-            row[1] = Paragraph("_", ParagraphStyle('EmptyLine', parent=styles['Normal'], 
-                                                  fontSize=8, fontName=font_name, 
-                                                  textColor=colors.grey))
+            row[1] = Paragraph("_", styles["empty_line"])
             table_data.append(row)
         
         # Satır 28: "İMALAT FOTOĞRAFLARI" başlığı (B28-P28)
         row28 = [''] * 16
-        photos_title_style = ParagraphStyle(
-            'PhotosTitle',
-            parent=styles['Normal'],
-            fontSize=11,
-            fontName=f'{font_name}-Bold',
-            alignment=TA_CENTER
-        )
-        row28[1] = Paragraph("İMALAT FOTOĞRAFLARI", photos_title_style)  # B sütunu
+        row28[1] = Paragraph("İMALAT FOTOĞRAFLARI", styles["photos_title"])  # B sütunu
         table_data.append(row28)
         
         # Fotoğraflar için satır sayısı hesapla
@@ -257,25 +243,24 @@ def create_pdf_with_reportlab(data, photo_files, pdf_filepath, logo_path=None):
                 photo_path = photo_files[photo_idx]
                 try:
                     # Fotoğrafı yükle ve boyutlandır
-                    pil_img = PILImage.open(photo_path)
-                    pil_img.thumbnail((int(photo_box_width*2), int(photo_box_height*2)), 
-                                    PILImage.Resampling.LANCZOS)
-                    
-                    # Geçici dosyaya kaydet
-                    temp_photo = os.path.join(os.path.dirname(photo_path), 
-                                             f"_pdf_temp_{os.path.basename(photo_path)}")
-                    pil_img.save(temp_photo)
+                    with PILImage.open(photo_path) as pil_img:
+                        pil_img.thumbnail((int(photo_box_width*2), int(photo_box_height*2)), 
+                                        PILImage.Resampling.LANCZOS)
+                        
+                        # Küçültülmüş kopya bellekte tutulur: kaynağın yanına geçici dosya
+                        # yazılmaz, aynı fotoğrafı işleyen eşzamanlı istekler çakışmaz
+                        photo_buffer = io.BytesIO()
+                        pil_img.save(photo_buffer, "JPEG" if pil_img.mode in ("RGB", "L") else "PNG")
+                    photo_buffer.seek(0)
                     
                     # ReportLab Image oluştur
-                    img = ReportLabImage(temp_photo, width=photo_box_width, 
+                    img = ReportLabImage(photo_buffer, width=photo_box_width, 
                                        height=photo_box_height, kind='proportional')
                     
                     # Fotoğraf ve etiket için iç tablo
                     photo_cell_data = [
                         [img],
-                        [Paragraph(f"FOTO-{photo_idx + 1}", 
-                                  ParagraphStyle('PhotoLabel', parent=styles['Normal'], 
-                                               fontSize=8, alignment=TA_CENTER, fontName=font_name))]
+                        [Paragraph(f"FOTO-{photo_idx + 1}", styles["photo_label"])]
                     ]
                     photo_cell = Table(photo_cell_data, 
                                      colWidths=[photo_box_width], 
@@ -329,32 +314,14 @@ def create_pdf_with_reportlab(data, photo_files, pdf_filepath, logo_path=None):
         
         # Footer
         story.append(Spacer(1, 0.2*cm))
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=7,
-            fontName=font_name,
-            textColor=colors.HexColor('#666666'),
-            alignment=TA_LEFT
-        )
         story.append(Paragraph(
             "İşbu dokümanda HASSAS bilgi bulunmamaktadır. / This document does not contain SENSITIVE information.",
-            footer_style
+            styles["footer"]
         ))
         
         # PDF'i oluştur
         doc.build(story)
         
-        # Geçici dosyaları temizle
-        for photo_path in photo_files:
-            temp_photo = os.path.join(os.path.dirname(photo_path), 
-                                     f"_pdf_temp_{os.path.basename(photo_path)}")
-            if os.path.exists(temp_photo):
-                try:
-                    os.remove(temp_photo)
-                except:
-                    pass
-        
         if os.path.exists(pdf_filepath) and os.path.getsize(pdf_filepath) > 0:
             print(f"PDF başarıyla oluşturuldu: {pdf_filepath}")
             return True
@@ -369,10 +336,12 @@ def create_pdf_with_reportlab(data, photo_files, pdf_filepath, logo_path=None):
 # -------------------------------------------------
 # METİN PARSE ET
 # -------------------------------------------------
-def parse_text(text):
+def parse_text(text, default_date=True):
     """
     Form'dan gelen metni parse eder.
     Terminal script'indeki mantıkla aynı.
+    default_date=False ise tarih yoksa bugünün tarihi yazılmaz, boş kalır
+    (toplu render eksik tarihi hata sayar).
     """
     lines = text.strip().split("\n")
     
@@ -398,7 +367,7 @@ def parse_text(text):
         elif mode == "yapilan_isler" and raw.startswith("-"):
             data["yapilan_isler"].append(raw[1:].strip())
 
-    if not data["tarih"]:
+    if not data["tarih"] and default_date:
         data["tarih"] = datetime.now().strftime("%d.%m.%Y")
 
     return data
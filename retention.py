@@ -0,0 +1,162 @@
+from contextlib import contextmanager
+import os
+import threading
+import time
+import uuid
+import metrics
+
+# ============================================================
+# generated_pdfs SAKLAMA POLİTİKASI
+# ============================================================
+# OUTPUT_DIR sınırsız büyümesin diye PDF'ler yaş, toplam boyut ve dosya sayısı
+# sınırlarına göre silinir. Kontrol hem her PDF yazımından sonra (on-write) hem de
+# arka planda periyodik çalışan bir süpürücü (sweeper) ile yapılır.
+
+# En fazla saklama süresi (saat)
+PDF_RETENTION_MAX_AGE = float(os.environ.get("PDF_RETENTION_MAX_AGE_HOURS", 7 * 24)) * 3600
+# Toplam disk kullanımı sınırı (eski PDF_CACHE_MAX_MB değişkeni de kabul edilir)
+PDF_RETENTION_MAX_BYTES = int(os.environ.get(
+    "PDF_RETENTION_MAX_MB", os.environ.get("PDF_CACHE_MAX_MB", 200))) * 1024 * 1024
+# En fazla PDF sayısı
+PDF_RETENTION_MAX_FILES = int(os.environ.get("PDF_RETENTION_MAX_FILES", 500))
+# Arka plan süpürücüsünün çalışma aralığı (saniye, 0 = kapalı)
+PDF_RETENTION_SWEEP_INTERVAL = int(os.environ.get("PDF_RETENTION_SWEEP_SECONDS", 600))
+# Yarım kalmış render'lardan kalan .tmp dosyaları bu süreden sonra silinir
+TEMP_FILE_MAX_AGE = 3600
+# Süren toplu işlerin işaret dosyaları; biri varken PDF silinmez (bkz. hold)
+HOLD_PREFIX = ".hold-"
+
+_retention_lock = threading.Lock()
+_sweeper_state = {"pid": None, "thread": None}
+def _remove(path, size):
+    try:
+        os.remove(path)
+    except OSError:
+        return False
+    metrics.count("retention_evictions")
+    metrics.count("retention_evicted_bytes", size)
+    return True
+
+@contextmanager
+def hold(output_dir):
+    """
+    Blok süresince output_dir'deki PDF'leri silinmeye karşı koru.
+    Toplu render'ın ilk PDF'leri, son raporlar yazılırken (render süreçlerindeki
+    on-write kontrolüyle) ZIP'e/birleştirmeye okunmadan silinmesin diye kullanılır.
+    Koruma süreçler arası bir işaret dosyasıyla yapılır; refresh() ile tazelenmeyen
+    işaret TEMP_FILE_MAX_AGE sonra (çökmüş süreçten kalmış sayılıp) yok sayılır.
+    Ertelenen silme kontrolü blok bittikten sonra enforce() ile çağıranca yapılır.
+
+    Yields:
+        refresh - İlerleme oldukça çağrılan, işareti tazeleyen fonksiyon
+    """
+    marker = os.path.join(output_dir, f"{HOLD_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    with open(marker, "w"):
+        pass
+
+    def refresh():
+        try:
+            os.utime(marker)
+        except OSError:
+            pass
+
+    try:
+        yield refresh
+    finally:
+        try:
+            os.remove(marker)
+        except OSError:
+            pass
+
+def _is_held(scanned, now):
+    """Taze bir hold() işareti var mı; bayatlamış işaretleri temizle"""
+    held = False
+    for entry in scanned:
+        if not entry.name.startswith(HOLD_PREFIX):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        if now - stat.st_mtime > TEMP_FILE_MAX_AGE:
+            _remove(entry.path, stat.st_size)
+        else:
+            held = True
+    return held
+
+def enforce(output_dir, keep=None):
+    """
+    Saklama sınırlarını uygula: önce süresi dolanları, sonra sayı ve boyut
+    sınırı aşılıyorsa en az yakın kullanılanları sil. Süren bir hold() varken
+    PDF silinmez (yalnızca eski .tmp dosyaları temizlenir).
+    keep: Silinmemesi gereken dosya yolu (az önce oluşturulan PDF)
+    """
+    now = time.time()
+    entries = []
+    try:
+        scanned = list(os.scandir(output_dir))
+    except OSError:
+        return
+    
+    held = _is_held(scanned, now)
+    for entry in scanned:
+        if not entry.is_file() or entry.name.startswith(HOLD_PREFIX):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        age = now - stat.st_mtime
+        if entry.name.endswith(".tmp"):
+            # Çökmüş render'lardan kalan geçici dosyalar
+            if age > TEMP_FILE_MAX_AGE:
+                _remove(entry.path, stat.st_size)
+            continue
+        if not entry.name.endswith(".pdf"):
+            continue
+        if not held and entry.path != keep and age > PDF_RETENTION_MAX_AGE:
+            _remove(entry.path, stat.st_size)
+            continue
+        # Son kullanım: önbellek isabetleri atime'ı günceller (mtime = oluşturulma)
+        entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entry.path))
+    
+    # En eski son kullanım = en az yakın kullanılan
+    entries.sort()
+    total_bytes = sum(size for _, size, _ in entries)
+    file_count = len(entries)
+    for _, size, path in entries:
+        if held or (file_count <= PDF_RETENTION_MAX_FILES and total_bytes <= PDF_RETENTION_MAX_BYTES):
+            break
+        if path == keep:
+            continue
+        if _remove(path, size):
+            file_count -= 1
+            total_bytes -= size
+
+def _sweep_loop(output_dir):
+    while True:
+        time.sleep(PDF_RETENTION_SWEEP_INTERVAL)
+        try:
+            enforce(output_dir)
+            metrics.count("retention_sweeps")
+        except Exception as e:
+            print(f"Saklama süpürücüsü hatası: {e}")
+
+def start_sweeper(output_dir):
+    """
+    Arka plan süpürücüsünü bu süreçte (henüz çalışmıyorsa) başlat.
+    gunicorn fork'undan sonra her worker kendi süpürücüsünü başlatır.
+    """
+    if PDF_RETENTION_SWEEP_INTERVAL <= 0:
+        return
+    pid = os.getpid()
+    if _sweeper_state["pid"] == pid:
+        return
+    with _retention_lock:
+        if _sweeper_state["pid"] == pid:
+            return
+        thread = threading.Thread(target=_sweep_loop, args=(output_dir,),
+                                  name="pdf-retention", daemon=True)
+        thread.start()
+        _sweeper_state["pid"] = pid
+        _sweeper_state["thread"] = thread
@@ -0,0 +1,68 @@
+import io
+import os
+import random
+import sys
+
+import pikepdf
+from PIL import Image as PILImage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_generator import generate_pdf_within_budget
+import pdf_generator
+import photo_cache
+
+def _noisy_photo(fmt, seed):
+    """Sıkıştırılması zor (bütçeyi aşan) bir fotoğraf: upload gibi açık bir stream"""
+    rng = random.Random(seed)
+    img = PILImage.frombytes("RGB", (1200, 900), bytes(rng.getrandbits(8) for _ in range(1200 * 900 * 3)))
+    buffer = io.BytesIO()
+    img.save(buffer, fmt)
+    buffer.seek(0)
+    return buffer
+
+def _photo_count(pdf_filepath):
+    """Gömülen fotoğraflar: JPEG (DCT) görseller; logo kayıpsız gömülür"""
+    with pikepdf.open(pdf_filepath) as pdf:
+        return sum(1 for page in pdf.pages
+                   for xobject in page.Resources.get("/XObject", {}).values()
+                   if xobject.get("/Subtype") == "/Image" and "/DCTDecode" in str(xobject.get("/Filter")))
+
+def test_budget_mode_keeps_png_photos(tmp_path, monkeypatch):
+    # Türev önbelleği ikinci geçişte stream'i okumadan sonuç döndürmesin
+    monkeypatch.setattr(photo_cache, "is_enabled", lambda: False)
+    photos = [_noisy_photo("PNG", 1), _noisy_photo("JPEG", 2), _noisy_photo("JPEG", 3)]
+    data = {"tarih": "12.01.2026", "rapor_no": "1", "yapilan_isler": ["Bütçe testi"]}
+    pdf_filepath = str(tmp_path / "rapor.pdf")
+
+    size = generate_pdf_within_budget(data, photos, pdf_filepath, 60 * 1024)
+
+    assert size is not None
+    # Yeniden render'da (ölçüm ve düşük basamaklar) PNG fotoğraf da gömülmeli
+    assert _photo_count(pdf_filepath) == 3
+    assert not photos[0].closed
+
+def test_budget_mode_last_pass_uses_smallest_levels(tmp_path, monkeypatch):
+    monkeypatch.setattr(photo_cache, "is_enabled", lambda: False)
+    monkeypatch.setattr(pdf_generator, "BUDGET_MAX_PASSES", 2)
+    calls = []
+    original = pdf_generator.generate_pdf
+
+    def recording_generate_pdf(*args, **kwargs):
+        calls.append(kwargs.get("photo_levels"))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(pdf_generator, "generate_pdf", recording_generate_pdf)
+    data = {"tarih": "12.01.2026", "rapor_no": "1", "yapilan_isler": ["Bütçe testi"]}
+    first = tmp_path / "ilk.pdf"
+    assert original(data, [_noisy_photo("JPEG", seed) for seed in range(4)], str(first))
+    photos = [_noisy_photo("JPEG", seed) for seed in range(4)]
+
+    # Bütçe ilk render'ın hemen altında: plan hafif bir küçültme seçerdi, ancak
+    # izin verilen tek yeniden render en küçük ayarlarla yapılmalı
+    generate_pdf_within_budget(data, photos, str(tmp_path / "rapor.pdf"), first.stat().st_size - 1024)
+
+    smallest_quality, smallest_scale = pdf_generator.BUDGET_LEVELS[-1]
+    dpi = pdf_generator.PHOTO_TARGET_DPI
+    assert len(calls) == 2
+    assert calls[-1] == [(smallest_quality, dpi * smallest_scale)] * len(photos)
@@ -0,0 +1,250 @@
+"""
+Soğuk başlangıç ısınması ve ölçümü.
+
+Uyuyan (scale-to-zero) instance uyandığında ilk rapor; Flask, ReportLab, Pillow ve
+pikepdf import'larını, font parse'ını, logo hazırlamayı, Pillow codec eklentilerini,
+sayfa iskeletlerinin derlenmesini ve şablon derlemeyi öder. warm_up() bunların
+hepsini port açılmadan önce yapar (gunicorn.conf.py on_starting kancası, --preload
+ile fork'tan önce; worker'lar sonucu copy-on-write paylaşır). GET /ready ısınma
+başarıyla bitene kadar 503 döner ve platformun trafik yönlendirmesini bekletir.
+
+Ölçüm modu (her adım ayrı, soğuk bir süreçte):
+    python warmup.py                # modül başına import süresi + ilk PDF süresi (ısınmalı/ısınmasız)
+    python warmup.py --top 30       # en yavaş 30 paket/modül
+"""
+from PIL import Image as PILImage
+from pdf_generator import generate_pdf, prepare_project_logos, BASE_DIR
+from pdf_layout import setup_fonts, font_setup_stats
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import metrics
+import photo_cache
+
+# ============================================================
+# ISINMA
+# ============================================================
+# Isınma fork'tan önce (gunicorn master'ında) çalışabildiği için thread başlatmamalı:
+# örnek rapor tek fotoğraflıdır (fotoğraf havuzu kurulmaz). Render generate_pdf ile
+# geçici dosyaya yapılır (PDF önbelleği ve kabul kontrolü defteri kullanılmaz);
+# fotoğraf türev önbelleği bu thread için kapatılır (photo_cache.bypassed).
+
+WARMUP_REPORT = {
+    "tarih": "01.01.2026",
+    "rapor_no": "0",
+    "yapilan_isler": ["Isınma raporu"],
+}
+
+_warmup_lock = threading.Lock()
+_STARTUP = {"started": False, "done": False, "steps": {}, "errors": {},
+            "import_seconds": None, "warmup_seconds": None}
+
+def _sample_photo():
+    """Isınma raporu için küçük bir JPEG (JPEG decode/encode yolunu ısıtır)"""
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (64, 48), (128, 128, 128)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+def _render_sample():
+    """Örnek raporu geçici dosyaya render et: iskeletler, metin ölçümü, ReportLab/pikepdf yolları"""
+    fd, pdf_filepath = tempfile.mkstemp(suffix=".pdf", prefix="isinma-")
+    os.close(fd)
+    try:
+        with photo_cache.bypassed():
+            if not generate_pdf(dict(WARMUP_REPORT), [_sample_photo()], pdf_filepath):
+                raise RuntimeError("örnek rapor oluşturulamadı")
+    finally:
+        os.remove(pdf_filepath)
+
+def warm_up(flask_app=None, import_seconds=None):
+    """
+    İlk raporun ihtiyaç duyduğu her şeyi önceden yükle (süreç başına bir kez).
+    Başarısız adım servisi durdurmaz (eksik kalan ilk istekte yapılır) ama
+    errors'a yazılır ve süreç hazır sayılmaz (bkz. is_ready).
+
+    Args:
+        flask_app: Flask - Verilirse şablonları da derlenir
+        import_seconds: float - Uygulama import süresi (biliniyorsa, raporlanır)
+
+    Returns:
+        Dict - Adım süreleri ve hatalar (bkz. startup_stats)
+    """
+    if _STARTUP["done"]:
+        return startup_stats()
+    with _warmup_lock:
+        if _STARTUP["done"]:
+            return startup_stats()
+        _STARTUP["started"] = True
+        steps = {}
+        errors = {}
+        start = time.perf_counter()
+
+        def step(name, function):
+            step_start = time.perf_counter()
+            try:
+                function()
+            except Exception as e:
+                print(f"Isınma adımı başarısız ({name}): {e}")
+                errors[name] = str(e)
+            steps[name] = round(time.perf_counter() - step_start, 4)
+
+        step("fonts", lambda: setup_fonts(BASE_DIR))
+        # Tüm codec eklentilerini kaydet (ilk tanınmayan formatta import edilmesinler)
+        step("pillow", PILImage.init)
+        step("logos", prepare_project_logos)
+        if flask_app is not None:
+            step("templates", lambda: [flask_app.jinja_env.get_template(name)
+                                       for name in flask_app.jinja_env.list_templates()])
+        step("render", _render_sample)
+        # Isınma render'ı /metrics sayaçlarına girmesin (worker'lar fork ile devralır)
+        metrics.reset()
+
+        _STARTUP["steps"] = steps
+        _STARTUP["errors"] = errors
+        _STARTUP["import_seconds"] = import_seconds
+        _STARTUP["warmup_seconds"] = round(time.perf_counter() - start, 4)
+        _STARTUP["done"] = True
+    stats = startup_stats()
+    print(f"Isınma {'tamamlandı' if stats['ready'] else 'hatalarla bitti'}: "
+          f"{stats['warmup_seconds'] * 1000:.0f} ms "
+          f"({', '.join(f'{name}={seconds * 1000:.0f}ms' for name, seconds in steps.items())})")
+    print(f"Font kurulum maliyeti: {font_setup_stats()}")
+    return stats
+
+def warm_up_in_background(flask_app=None):
+    """
+    Isınma bu süreçte hiç başlamadıysa (gunicorn kancası dışında çalışan sunucu)
+    ayrı bir thread'de başlat; çağıran (GET /ready) beklemez.
+    """
+    if _STARTUP["started"]:
+        return
+    _STARTUP["started"] = True
+    threading.Thread(target=warm_up, args=(flask_app,), name="warmup", daemon=True).start()
+
+def is_ready():
+    """Isınma bitti ve tüm adımları başarılı"""
+    return _STARTUP["done"] and not _STARTUP["errors"]
+
+def startup_stats():
+    """Isınma durumu, adım süreleri (saniye) ve başarısız adımların hataları"""
+    return {
+        "ready": is_ready(),
+        "warming": _STARTUP["started"] and not _STARTUP["done"],
+        "import_seconds": _STARTUP["import_seconds"],
+        "warmup_seconds": _STARTUP["warmup_seconds"],
+        "steps": dict(_STARTUP["steps"]),
+        "errors": dict(_STARTUP["errors"]),
+    }
+
+# ============================================================
+# ÖLÇÜM MODU
+# ============================================================
+
+# Soğuk süreçte: app import'u, (istenirse) ısınma ve iki ardışık rapor isteği
+_FIRST_PDF_SCRIPT = """
+import io, json, os, sys, time
+start = time.perf_counter()
+import app as web
+imported = time.perf_counter()
+import warmup
+if sys.argv[1] == "1":
+    warmup.warm_up(web.app)
+warmed = time.perf_counter()
+from PIL import Image
+photo = io.BytesIO()
+Image.new("RGB", (2000, 1500), (90, 120, 150)).save(photo, "JPEG")
+client = web.app.test_client()
+requests = []
+for rapor_no in ("ilk", "ikinci"):
+    request_start = time.perf_counter()
+    response = client.post("/generator-test", content_type="multipart/form-data", data={
+        "tarih": "2026-01-12", "rapor_no": f"soguk-{rapor_no}-{os.getpid()}", "yapilan_isler": "Ölçüm",
+        "photos": [(io.BytesIO(photo.getvalue()), "foto.jpg")]})
+    requests.append(time.perf_counter() - request_start)
+    assert response.status_code == 302, response.status_code
+    os.remove(os.path.join(web.OUTPUT_DIR, response.headers["Location"].split("/")[-1].split("?")[0]))
+print(json.dumps({"import": imported - start, "warmup": warmed - imported,
+                  "first": requests[0], "second": requests[1]}))
+"""
+
+def import_times(top=15):
+    """
+    `import app` için modül başına import süreleri (python -X importtime, soğuk süreç).
+
+    Returns:
+        (toplam saniye, [(modül, kendi süresi, kümülatif süre), ...] kendi süresine göre sıralı,
+         {üst paket: kendi sürelerinin toplamı})
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                            cwd=BASE_DIR, capture_output=True, text=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Girinti import derinliğidir; alt modüller üst modülden önce yazılır
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+
+    # Yalnızca app'in import ağacı (yorumlayıcı başlangıcındaki site/encodings hariç)
+    app_index = next((i for i, entry in enumerate(entries) if entry[0] == "app"), None)
+    if app_index is None:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import app başarısız")
+    first = app_index
+    while first > 0 and entries[first - 1][3] > 0:
+        first -= 1
+    tree = entries[first:app_index + 1]
+
+    # Paket başına kendi sürelerinin toplamı (iç içe import'lar iki kez sayılmaz)
+    packages = {}
+    for name, own, _, _ in tree:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + own
+    slowest = sorted(((name, own, cumulative) for name, own, cumulative, _ in tree),
+                     key=lambda entry: entry[1], reverse=True)[:top]
+    return (entries[app_index][2], slowest,
+            dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)))
+
+def first_pdf_times(warm):
+    """Soğuk süreçte import, ısınma ve ilk iki raporun süreleri (saniye)"""
+    result = subprocess.run([sys.executable, "-c", _FIRST_PDF_SCRIPT, "1" if warm else "0"],
+                            cwd=BASE_DIR, capture_output=True, text=True,
+                            env=dict(os.environ, PHOTO_CACHE_MAX_MB="0",
+                                     METRICS_DIR=tempfile.mkdtemp(prefix="warmup-metrics-")))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "ölçüm başarısız")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soğuk başlangıç ölçümü")
+    parser.add_argument("--top", type=int, default=15, help="Listelenecek en yavaş paket ve modül sayısı")
+    parser.add_argument("--repeat", type=int, default=3, help="İlk PDF ölçümü tekrarı (medyan alınır)")
+    args = parser.parse_args(argv)
+
+    total, slowest, packages = import_times(args.top)
+    print(f"`import app`: {total * 1000:.0f} ms\n")
+    print(f"{'Paket':<28} {'Toplam(ms)':>11}")
+    for package, seconds in list(packages.items())[:args.top]:
+        print(f"{package:<28} {seconds * 1000:>11.1f}")
+    print(f"\n{'Modül (en yavaş kendi süresi)':<40} {'Kendi(ms)':>10} {'Kümülatif(ms)':>14}")
+    for name, own, cumulative in slowest:
+        print(f"{name:<40} {own * 1000:>10.1f} {cumulative * 1000:>14.1f}")
+
+    # Isınma port açılmadan yapıldığı için kullanıcının beklediği süre "İlk PDF" sütunudur
+    print(f"\n{'Mod':<10} {'Import':>8} {'Isınma':>8} {'İlk PDF':>8} {'İkinci':>8}  (ms, medyan)")
+    for warm in (False, True):
+        runs = [first_pdf_times(warm) for _ in range(max(1, args.repeat))]
+        median = {key: sorted(run[key] for run in runs)[len(runs) // 2] for key in runs[0]}
+        print(f"{'ısınmalı' if warm else 'ısınmasız':<10} {median['import'] * 1000:>8.0f} "
+              f"{median['warmup'] * 1000:>8.0f} {median['first'] * 1000:>8.0f} "
+              f"{median['second'] * 1000:>8.0f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Gunicorn worker modeli yük testi: thread'ler (gthread) ve süreçler (sync) karşılaştırması.
+
+Her model için gunicorn gunicorn.conf.py ile ayrı bir portta başlatılır, aynı
+sentetik raporlar (benchmark.py fotoğrafları) N eşzamanlı istemciyle
+POST /generator-test üzerinden render edilir. Ölçülenler:
+  - throughput (rapor/s) ve gecikme (p50/p95),
+  - master + worker süreçlerinin toplam tepe RSS ve PSS değeri. RSS, --preload ile
+    copy-on-write paylaşılan sayfaları her süreçte yeniden sayar; PSS paylaşılan
+    sayfayı paylaşan süreçlere böler ve gerçek bellek kullanımına daha yakındır.
+
+Her istek farklı rapor_no taşır (PDF önbelleği isabet etmez); fotoğraf türev
+önbelleği kapatılır, metrikler ve kabul kontrolü defteri geçici dizine yazılır.
+
+Kullanım:
+    python worker_benchmark.py                                  # sync:4x1 ve gthread:1x4
+    python worker_benchmark.py -c 8 -n 48 --photos 8
+    python worker_benchmark.py --modes sync:2x1,gthread:1x2,gthread:2x4
+"""
+from concurrent.futures import ThreadPoolExecutor
+from benchmark import make_photo, make_work_items, REPORT_PHOTO_MP
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODES = "sync:4x1,gthread:1x4"
+READY_TIMEOUT = 60
+RSS_SAMPLE_INTERVAL = 0.1
+
+# ============================================================
+# SÜREÇ BELLEĞİ
+# ============================================================
+
+def server_pids(master_pid):
+    """Gunicorn master'ı ve (ppid ile bulunan) worker süreçleri"""
+    pids = [master_pid]
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == master_pid:
+            pids.append(int(name))
+    return pids
+
+def process_memory_kb(pid):
+    """(RSS, PSS) KB; PSS okunamazsa None"""
+    rss = pss = None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+                    break
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+                    break
+    except OSError:
+        pass
+    return rss or 0, pss
+
+class MemorySampler(threading.Thread):
+    """Sunucu süreçlerinin toplam RSS/PSS değerini periyodik örnekleyip tepeyi tutar"""
+
+    def __init__(self, master_pid):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.peak_rss_kb = 0
+        self.peak_pss_kb = None
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        pids = server_pids(self.master_pid)
+        values = [process_memory_kb(pid) for pid in pids]
+        self.peak_rss_kb = max(self.peak_rss_kb, sum(rss for rss, _ in values))
+        if all(pss is not None for _, pss in values):
+            total_pss = sum(pss for _, pss in values)
+            self.peak_pss_kb = max(self.peak_pss_kb or 0, total_pss)
+        return len(pids)
+
+    def run(self):
+        while not self._stop_event.wait(RSS_SAMPLE_INTERVAL):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+# ============================================================
+# İSTEKLER
+# ============================================================
+
+def encode_multipart(fields, files):
+    """Form alanları ve (alan, dosya adı, içerik) dosyalarından multipart gövdesi üret"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                     f'{value}\r\n'.encode("utf-8"))
+    for name, filename, content in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: image/jpeg\r\n\r\n'.encode("utf-8"))
+        parts.append(content)
+        parts.append(b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+def post_report(port, rapor_no, work_items, photos):
+    """Tek rapor isteği; (başarılı mı, süre saniye, durum kodu)"""
+    fields = {"proje": "Fetihtepe", "tarih": "2026-01-12", "tarih_tipi": "gunluk",
+              "rapor_no": rapor_no, "yapilan_isler": "\n".join(work_items)}
+    files = [("photos", f"foto-{i}.jpg", content) for i, content in enumerate(photos)]
+    body, content_type = encode_multipart(fields, files)
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+    try:
+        connection.request("POST", "/generator-test", body=body, headers={"Content-Type": content_type})
+        response = connection.getresponse()
+        response.read()
+        status = response.status
+    except OSError:
+        status = 0
+    finally:
+        connection.close()
+    # Başarılı render görüntüleme sayfasına yönlendirir
+    return status == 302, time.perf_counter() - start, status
+
+def wait_until_ready(port, process):
+    """GET /ready 200 dönene kadar bekle (ısınma port açılmadan biter)"""
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn başlatılamadı (çıkış kodu {process.returncode})")
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        try:
+            connection.request("GET", "/ready")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            connection.close()
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn zamanında hazır olmadı")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# ============================================================
+# ÖLÇÜM
+# ============================================================
+
+def parse_mode(spec):
+    """'gthread:1x4' -> ("gthread", 1 süreç, 4 thread)"""
+    worker_class, _, shape = spec.partition(":")
+    workers, _, threads = shape.partition("x")
+    return worker_class, int(workers or 1), int(threads or 1)
+
+def run_mode(spec, concurrency, total_requests, work_items, photos, scratch_dir):
+    worker_class, workers, threads = parse_mode(spec)
+    port = free_port()
+    env = dict(os.environ,
+               GUNICORN_WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads),
+               GUNICORN_BIND=f"127.0.0.1:{port}",
+               PHOTO_CACHE_MAX_MB="0",
+               METRICS_DIR=os.path.join(scratch_dir, f"metrics-{port}"),
+               ADMISSION_LEDGER=os.path.join(scratch_dir, f"admission-{port}.json"))
+    env.pop("PORT", None)
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+                               cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sampler = MemorySampler(process.pid)
+    try:
+        wait_until_ready(port, process)
+        run_id = uuid.uuid4().hex[:8]
+        # Isınma: her worker/thread bir rapor render etsin (ilk istek maliyetleri ölçüme girmesin)
+        with ThreadPoolExecutor(max_workers=workers * threads) as warmup:
+            list(warmup.map(lambda i: post_report(port, f"isinma-{run_id}-{i}", work_items, photos),
+                            range(workers * threads)))
+        sampler.sample()
+        idle_rss_kb, idle_pss_kb = sampler.peak_rss_kb, sampler.peak_pss_kb
+        process_count = sampler.sample()
+        sampler.start()
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            results = list(clients.map(lambda i: post_report(port, f"bench-{run_id}-{i}", work_items, photos),
+                                       range(total_requests)))
+        wall_seconds = time.perf_counter() - wall_start
+        sampler.stop()
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    latencies = sorted(seconds for ok, seconds, _ in results if ok)
+    failures = [status for ok, _, status in results if not ok]
+    return {
+        "worker_class": worker_class,
+        "workers": workers,
+        "threads": threads,
+        "processes": process_count,
+        "requests": total_requests,
+        "failed": len(failures),
+        "failed_statuses": sorted(set(failures)),
+        "throughput_rps": round(len(latencies) / wall_seconds, 3),
+        "latency_p50": round(statistics.median(latencies), 3) if latencies else None,
+        "latency_p95": round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else None,
+        "idle_rss_kb": idle_rss_kb,
+        "idle_pss_kb": idle_pss_kb,
+        "peak_rss_kb": sampler.peak_rss_kb,
+        "peak_pss_kb": sampler.peak_pss_kb,
+    }
+
+def format_mb(kb):
+    return "-" if kb is None else f"{kb / 1024:.0f}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="gunicorn worker modeli (thread / süreç) yük testi")
+    parser.add_argument("--modes", default=DEFAULT_MODES,
+                        help="Virgülle ayrılmış sınıf:süreçxthread listesi (ör. sync:4x1,gthread:1x4)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Eşzamanlı istemci sayısı")
+    parser.add_argument("-n", "--requests", type=int, default=24, help="Model başına toplam istek")
+    parser.add_argument("--photos", type=int, default=4, help="Rapor başına fotoğraf")
+    parser.add_argument("--output", help="Sonuçları ayrıca bu JSON dosyasına yaz")
+    args = parser.parse_args(argv)
+
+    photos = []
+    for seed in range(args.photos):
+        with open(make_photo(REPORT_PHOTO_MP, "jpeg", seed), "rb") as f:
+            photos.append(f.read())
+    work_items = make_work_items(8, 200)
+    scratch_dir = tempfile.mkdtemp(prefix="worker-bench-")
+
+    results = {}
+    for spec in args.modes.split(","):
+        spec = spec.strip()
+        result = run_mode(spec, args.concurrency, args.requests, work_items, photos, scratch_dir)
+        results[spec] = result
+        print(f"{spec}: {result['throughput_rps']:.2f} rapor/s, p50 {result['latency_p50']}s, "
+              f"p95 {result['latency_p95']}s, tepe RSS {format_mb(result['peak_rss_kb'])} MB, "
+              f"tepe PSS {format_mb(result['peak_pss_kb'])} MB, hata {result['failed']}", flush=True)
+
+    print(f"\n{args.concurrency} eşzamanlı istemci, model başına {args.requests} rapor, "
+          f"rapor başına {args.photos} x {REPORT_PHOTO_MP} MP fotoğraf, {os.cpu_count()} CPU")
+    print(f"{'Model':<14} {'Süreç':>5} {'Rapor/s':>8} {'p50(s)':>7} {'p95(s)':>7} "
+          f"{'Boşta RSS':>10} {'Tepe RSS':>9} {'Boşta PSS':>10} {'Tepe PSS':>9}")
+    for spec, result in results.items():
+        print(f"{spec:<14} {result['processes']:>5} {result['throughput_rps']:>8.2f} "
+              f"{result['latency_p50'] or 0:>7.2f} {result['latency_p95'] or 0:>7.2f} "
+              f"{format_mb(result['idle_rss_kb']):>10} {format_mb(result['peak_rss_kb']):>9} "
+              f"{format_mb(result['idle_pss_kb']):>10} {format_mb(result['peak_pss_kb']):>9}")
+    print("(bellek MB; master + worker süreçleri toplamı)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"concurrency": args.concurrency, "photos": args.photos,
+                       "cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+    return 1 if any(result["failed"] for result in results.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())